@@ -0,0 +1,60 @@
+"""chat read states
+
+Revision ID: 4abf4d21cd97
+Revises: 8ae9be4baa58
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4abf4d21cd97'
+down_revision: Union[str, None] = '8ae9be4baa58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Таблицу уже мог создать init_db (create_all), если приложение запускалось до миграции
+    if not sa.inspect(op.get_bind()).has_table('chat_read_states'):
+        op.create_table(
+            'chat_read_states',
+            sa.Column('chat_id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('last_read_at', sa.DateTime(), nullable=False),
+            sa.Column('last_read_message_id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['chat_id'], ['chats.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('chat_id', 'user_id'),
+        )
+
+    # Отметка каждого участника - самое новое из прочитанных им сообщений чата.
+    # Уже существующие отметки только сдвигаются вперед, поэтому повторный запуск безопасен
+    op.execute(
+        """
+        INSERT INTO chat_read_states (chat_id, user_id, last_read_at, last_read_message_id, updated_at)
+        SELECT DISTINCT ON (m.chat_id, r.user_id)
+               m.chat_id, r.user_id, m.timestamp, m.id, r.read_at
+        FROM message_reads r
+        JOIN messages m ON m.id = r.message_id
+        ORDER BY m.chat_id, r.user_id, m.timestamp DESC, m.id DESC
+        ON CONFLICT (chat_id, user_id) DO UPDATE
+        SET last_read_at = excluded.last_read_at,
+            last_read_message_id = excluded.last_read_message_id,
+            updated_at = excluded.updated_at
+        WHERE (chat_read_states.last_read_at, chat_read_states.last_read_message_id)
+              < (excluded.last_read_at, excluded.last_read_message_id)
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('chat_read_states')
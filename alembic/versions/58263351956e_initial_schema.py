@@ -0,0 +1,98 @@
+"""initial schema
+
+Revision ID: 58263351956e
+Revises: 
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '58263351956e'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'users',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('password', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+    )
+    op.create_table(
+        'chats',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('type', sa.Enum('PERSONAL', 'GROUP', name='chattype'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'groups',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('chat_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('creator_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.ForeignKeyConstraint(['chat_id'], ['chats.id']),
+        sa.ForeignKeyConstraint(['creator_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('chat_id'),
+    )
+    op.create_table(
+        'chat_members',
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('chat_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.ForeignKeyConstraint(['chat_id'], ['chats.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+    )
+    op.create_table(
+        'group_members',
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('group_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.ForeignKeyConstraint(['group_id'], ['groups.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+    )
+    op.create_table(
+        'messages',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('chat_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('sender_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('text', sa.TEXT(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('is_read', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['chat_id'], ['chats.id']),
+        sa.ForeignKeyConstraint(['sender_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'message_reads',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('message_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('read_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['message_id'], ['messages.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('message_reads')
+    op.drop_table('messages')
+    op.drop_table('group_members')
+    op.drop_table('chat_members')
+    op.drop_table('groups')
+    op.drop_table('chats')
+    op.drop_table('users')
+    sa.Enum(name='chattype').drop(op.get_bind(), checkfirst=True)
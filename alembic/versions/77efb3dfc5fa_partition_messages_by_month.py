@@ -0,0 +1,122 @@
+"""partition messages by month
+
+Revision ID: 77efb3dfc5fa
+Revises: a9b20428fd5b
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '77efb3dfc5fa'
+down_revision: Union[str, None] = 'a9b20428fd5b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Сколько месяцев вперед создать секции; дальше их создает приложение
+MONTHS_AHEAD = 3
+COLUMNS = 'id, chat_id, sender_id, text, timestamp, is_read'
+
+
+def _month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def _add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _message_columns():
+    return [
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('chat_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('sender_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('text', sa.TEXT(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('is_read', sa.Boolean(), nullable=False),
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('russian', text)", persisted=True),
+        ),
+        sa.ForeignKeyConstraint(['chat_id'], ['chats.id']),
+        sa.ForeignKeyConstraint(['sender_id'], ['users.id']),
+    ]
+
+
+def _create_message_indexes() -> None:
+    op.create_index('ix_messages_chat_id_timestamp_id', 'messages', ['chat_id', 'timestamp', 'id'])
+    op.create_index('ix_messages_sender_id', 'messages', ['sender_id'])
+    op.create_index('ix_messages_search_vector', 'messages', ['search_vector'], postgresql_using='gin')
+
+
+def _drop_message_indexes(table: str) -> None:
+    for name in ('ix_messages_chat_id_timestamp_id', 'ix_messages_sender_id', 'ix_messages_search_vector'):
+        op.drop_index(name, table_name=table, if_exists=True)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Внешний ключ на messages(id) невозможен: в первичный ключ секционированной
+    # таблицы входит timestamp. message_reads - устаревшая таблица, ключ снимается
+    op.drop_constraint('message_reads_message_id_fkey', 'message_reads', type_='foreignkey')
+
+    # Старая таблица остается источником данных; имена ее индексов освобождаются
+    op.rename_table('messages', 'messages_legacy')
+    op.execute('ALTER INDEX messages_pkey RENAME TO messages_legacy_pkey')
+    _drop_message_indexes('messages_legacy')
+
+    op.create_table(
+        'messages',
+        *_message_columns(),
+        sa.PrimaryKeyConstraint('id', 'timestamp', name='messages_pkey'),
+        postgresql_partition_by='RANGE ("timestamp")',
+    )
+
+    # Секции от месяца самого старого сообщения до MONTHS_AHEAD месяцев вперед
+    oldest = op.get_bind().execute(sa.text('SELECT min(timestamp) FROM messages_legacy')).scalar()
+    current = _month_start(datetime.utcnow())
+    month = _month_start(oldest) if oldest is not None and oldest < current else current
+    while month <= _add_months(current, MONTHS_AHEAD):
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE messages_y{month.year:04d}m{month.month:02d} PARTITION OF messages "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+    op.execute('CREATE TABLE messages_default PARTITION OF messages DEFAULT')
+
+    # Индексы строятся после копирования: так перенос заметно быстрее;
+    # search_vector вычисляется базой заново при вставке
+    op.execute(f'INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_legacy')
+    _create_message_indexes()
+    op.drop_table('messages_legacy')
+    op.execute('ANALYZE messages')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.rename_table('messages', 'messages_partitioned')
+    op.execute('ALTER INDEX messages_pkey RENAME TO messages_partitioned_pkey')
+    _drop_message_indexes('messages_partitioned')
+
+    op.create_table(
+        'messages',
+        *_message_columns(),
+        sa.PrimaryKeyConstraint('id', name='messages_pkey'),
+    )
+    op.execute(f'INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_partitioned')
+    _create_message_indexes()
+    # Удаление родительской таблицы удаляет и все ее секции
+    op.drop_table('messages_partitioned')
+
+    # Отметки о прочтении заархивированных сообщений ссылаться больше не на что
+    op.execute('DELETE FROM message_reads WHERE message_id NOT IN (SELECT id FROM messages)')
+    op.create_foreign_key('message_reads_message_id_fkey', 'message_reads', 'messages', ['message_id'], ['id'])
@@ -0,0 +1,83 @@
+"""hot path indexes
+
+Revision ID: 8ae9be4baa58
+Revises: 58263351956e
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8ae9be4baa58'
+down_revision: Union[str, None] = '58263351956e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _deduplicate(table: str, columns: Sequence[str]) -> None:
+    # Удаляем повторяющиеся строки, оставляя по одной на каждую комбинацию ключей
+    condition = " AND ".join(f"a.{column} = b.{column}" for column in columns)
+    op.execute(f"DELETE FROM {table} a USING {table} b WHERE a.ctid > b.ctid AND {condition}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # История чата и постраничное чтение по курсору (timestamp, id)
+    op.create_index(
+        'ix_messages_chat_id_timestamp_id', 'messages',
+        ['chat_id', 'timestamp', 'id'], if_not_exists=True
+    )
+    op.create_index('ix_messages_sender_id', 'messages', ['sender_id'], if_not_exists=True)
+
+    # Отметки о прочтении: одна запись на пару (пользователь, сообщение)
+    _deduplicate('message_reads', ['user_id', 'message_id'])
+    op.create_index(
+        'ix_message_reads_user_id_message_id', 'message_reads',
+        ['user_id', 'message_id'], unique=True, if_not_exists=True
+    )
+    op.create_index('ix_message_reads_message_id', 'message_reads', ['message_id'], if_not_exists=True)
+
+    # Участники чатов: составной первичный ключ и обратный индекс
+    op.execute("DELETE FROM chat_members WHERE user_id IS NULL OR chat_id IS NULL")
+    _deduplicate('chat_members', ['user_id', 'chat_id'])
+    op.alter_column('chat_members', 'user_id', existing_type=sa.UUID(), nullable=False)
+    op.alter_column('chat_members', 'chat_id', existing_type=sa.UUID(), nullable=False)
+    op.create_primary_key('pk_chat_members', 'chat_members', ['user_id', 'chat_id'])
+    op.create_index(
+        'ix_chat_members_chat_id_user_id', 'chat_members',
+        ['chat_id', 'user_id'], if_not_exists=True
+    )
+
+    # Участники групп: составной первичный ключ и обратный индекс
+    op.execute("DELETE FROM group_members WHERE user_id IS NULL OR group_id IS NULL")
+    _deduplicate('group_members', ['user_id', 'group_id'])
+    op.alter_column('group_members', 'user_id', existing_type=sa.UUID(), nullable=False)
+    op.alter_column('group_members', 'group_id', existing_type=sa.UUID(), nullable=False)
+    op.create_primary_key('pk_group_members', 'group_members', ['user_id', 'group_id'])
+    op.create_index(
+        'ix_group_members_group_id_user_id', 'group_members',
+        ['group_id', 'user_id'], if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_group_members_group_id_user_id', table_name='group_members')
+    op.drop_constraint('pk_group_members', 'group_members', type_='primary')
+    op.alter_column('group_members', 'group_id', existing_type=sa.UUID(), nullable=True)
+    op.alter_column('group_members', 'user_id', existing_type=sa.UUID(), nullable=True)
+
+    op.drop_index('ix_chat_members_chat_id_user_id', table_name='chat_members')
+    op.drop_constraint('pk_chat_members', 'chat_members', type_='primary')
+    op.alter_column('chat_members', 'chat_id', existing_type=sa.UUID(), nullable=True)
+    op.alter_column('chat_members', 'user_id', existing_type=sa.UUID(), nullable=True)
+
+    op.drop_index('ix_message_reads_message_id', table_name='message_reads')
+    op.drop_index('ix_message_reads_user_id_message_id', table_name='message_reads')
+
+    op.drop_index('ix_messages_sender_id', table_name='messages')
+    op.drop_index('ix_messages_chat_id_timestamp_id', table_name='messages')
@@ -0,0 +1,43 @@
+"""message search vector
+
+Revision ID: a9b20428fd5b
+Revises: 4abf4d21cd97
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9b20428fd5b'
+down_revision: Union[str, None] = '4abf4d21cd97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Генерируемая колонка заполняется для существующих строк при добавлении
+    # и поддерживается базой при каждой вставке и изменении текста
+    op.add_column(
+        'messages',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('russian', text)", persisted=True),
+        ),
+    )
+    op.create_index(
+        'ix_messages_search_vector', 'messages', ['search_vector'],
+        postgresql_using='gin', if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_search_vector', table_name='messages', if_exists=True)
+    op.drop_column('messages', 'search_vector')
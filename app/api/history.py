@@ -5,8 +5,13 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.base import get_db
 from app.services.message_service import MessageService
-from app.schemas.message import ChatHistoryParams, MessageCreate, MessageResponse, ChatHistoryResponse
+from app.schemas.message import (
+    ChatHistoryParams, MessageCreate, MessageResponse, ChatHistoryResponse, ChatReadRequest, ChatReadResponse,
+    MessageSearchParams, MessageSearchResponse
+)
 from app.core.security import get_current_user
+from app.core.responses import FastJSONResponse
+from app.api.websockets import manager
 
 router = APIRouter()
 
@@ -23,7 +28,10 @@ async def get_chat_history(
         chat_id=chat_id,
         user_id=current_user.id,
         limit=params.limit,
-        offset=params.offset
+        offset=params.offset,
+        before=params.before,
+        after=params.after,
+        around=params.around
     )
     
     if "error" in result:
@@ -32,7 +40,7 @@ async def get_chat_history(
             detail=result["error"]
         )
     
-    return result
+    return FastJSONResponse(result)
 
 @router.post("/messages", response_model=MessageResponse)
 async def create_message(
@@ -44,7 +52,8 @@ async def create_message(
     service = MessageService(db)
     result = await service.create_message(
         sender_id=current_user.id,
-        message_data=message
+        message_data=message,
+        sender=current_user
     )
     
     if "error" in result:
@@ -53,6 +62,8 @@ async def create_message(
             detail=result["error"]
         )
     
+    # Сообщение доставляется участникам чата так же, как отправленное через WebSocket
+    await manager.broadcast_message(result, current_user.name)
     return result
 
 @router.post("/messages/{message_id}/read")
@@ -74,4 +85,76 @@ async def mark_message_as_read(
             detail=result["error"]
         )
     
-    return result 
\ No newline at end of file
+    return result
+
+@router.post("/{chat_id}/read", response_model=ChatReadResponse)
+async def mark_chat_as_read(
+    chat_id: UUID,
+    read_data: ChatReadRequest = ChatReadRequest(),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Пометить прочитанными все сообщения чата до указанного включительно"""
+    service = MessageService(db)
+    result = await service.mark_chat_as_read(
+        chat_id=chat_id,
+        user_id=current_user.id,
+        message_id=read_data.message_id
+    )
+    
+    if "error" in result:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=result["error"]
+        )
+    
+    return result
+
+# Маршрут объявлен раньше /{chat_id}/search, иначе "messages" был бы принят за chat_id
+@router.get("/messages/search", response_model=MessageSearchResponse)
+async def search_messages(
+    params: MessageSearchParams = Depends(),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Полнотекстовый поиск по сообщениям всех чатов пользователя"""
+    service = MessageService(db)
+    result = await service.search_messages(
+        user_id=current_user.id,
+        query=params.q,
+        cursor=params.cursor,
+        limit=params.limit
+    )
+    
+    if "error" in result:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=result["error"]
+        )
+    
+    return FastJSONResponse(result)
+
+@router.get("/{chat_id}/search", response_model=MessageSearchResponse)
+async def search_chat_messages(
+    chat_id: UUID,
+    params: MessageSearchParams = Depends(),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Полнотекстовый поиск по сообщениям чата"""
+    service = MessageService(db)
+    result = await service.search_messages(
+        user_id=current_user.id,
+        query=params.q,
+        chat_id=chat_id,
+        cursor=params.cursor,
+        limit=params.limit
+    )
+    
+    if "error" in result:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=result["error"]
+        )
+    
+    return FastJSONResponse(result)
@@ -1,129 +1,632 @@
-import json
-from typing import Dict, List, Any
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Optional, Set
 from uuid import UUID
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.base import get_db
+from app.core.config import settings
+from app.db.base import async_session
 from app.services.message_service import MessageService
 from app.services.chat_service import ChatService
+from app.services.membership import apply_member_changes, membership_cache
+from app.services.recent_messages import recent_messages
+from app.db.repositories import ChatRepository
 from app.schemas.message import MessageCreate
+from app.core.broker import Broker, InMemoryBroker, create_broker
+from app.core.encoding import Frame, json_codec, negotiate
+from app.core.pagination import encode_cursor
 from app.core.logging import log_info, log_error, log_warning
 
 router = APIRouter()
 
+# Исходящая очередь отдельного WebSocket соединения
+class Connection:
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager", user_id: UUID, chat_id: Optional[UUID] = None, start: bool = True, codec=json_codec):
+        self.websocket = websocket
+        self.manager = manager
+        self.user_id = user_id
+        # chat_id равен None для глобального соединения /ws/user
+        self.chat_id = chat_id
+        # Формат кадров, согласованный при подключении (JSON или MessagePack)
+        self.codec = codec
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self.dropped = 0
+        # Задача-писатель отправляет сообщения из очереди по одному; до ее запуска
+        # события копятся в backlog: получатель еще не медленный, он ждет повтора
+        self.writer: Optional[asyncio.Task] = None
+        self.backlog: List[Frame] = []
+        self.closed = False
+        # Чаты, на которые подписано глобальное соединение
+        self.chats: Set[UUID] = set()
+        if start:
+            self.start()
+
+    def start(self, prelude: Optional[Frame] = None):
+        """Запуск отправки; prelude уходит клиенту раньше накопленных событий"""
+        # Соединение могли закрыть или заменить, пока готовился prelude
+        if self.closed:
+            return
+        backlog, self.backlog = self.backlog, []
+        self.writer = asyncio.create_task(self._write(prelude, backlog))
+
+    def enqueue(self, frame: Frame) -> bool:
+        """Постановка готового кадра в очередь без ожидания отправки"""
+        if self.writer is None:
+            if len(self.backlog) < settings.WS_START_BACKLOG_SIZE:
+                self.backlog.append(frame)
+                return True
+            return self.manager._handle_overflow(self, frame)
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return self.manager._handle_overflow(self, frame)
+
+    def replace_oldest(self, frame: Frame):
+        """Замена самого старого неотправленного кадра новым"""
+        if self.writer is None:
+            self.backlog.pop(0)
+            self.backlog.append(frame)
+            return
+        self.queue.get_nowait()
+        self.queue.put_nowait(frame)
+
+    async def _write(self, prelude: Optional[Frame] = None, backlog: List[Frame] = ()):
+        try:
+            if prelude is not None:
+                await self.codec.send(self.websocket, prelude)
+            for frame in backlog:
+                await self.codec.send(self.websocket, frame)
+            while True:
+                frame = await self.queue.get()
+                await self.codec.send(self.websocket, frame)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            log_error(f"Error sending WebSocket message: {str(e)}")
+
+    def close(self):
+        self.closed = True
+        self.backlog.clear()
+        if self.writer is not None:
+            self.writer.cancel()
+
 # Хранение активных соединений WebSocket
 class ConnectionManager:
-    def __init__(self):
-        # Словарь для хранения соединений: {user_id: {chat_id: websocket}}
-        self.active_connections: Dict[UUID, Dict[UUID, WebSocket]] = {}
-        # Словарь для хранения глобальных соединений пользователей: {user_id: websocket}
-        self.user_connections: Dict[UUID, WebSocket] = {}
+    def __init__(self, broker: Optional[Broker] = None):
+        # Брокер доставляет события всем процессам приложения
+        self.broker = broker or InMemoryBroker()
+        self.broker.bind(self._handle_event)
+        # Пользователь может быть подключен с нескольких устройств одновременно,
+        # поэтому по каждому ключу хранится множество соединений.
+        # Соединения с чатами: {user_id: {chat_id: {connection}}}
+        self.active_connections: Dict[UUID, Dict[UUID, Set[Connection]]] = {}
+        # Обратный индекс соединений чатов: {chat_id: {connection}}
+        self.chat_connections: Dict[UUID, Set[Connection]] = {}
+        # Глобальные соединения пользователей: {user_id: {connection}}
+        self.user_connections: Dict[UUID, Set[Connection]] = {}
+        # Глобальные соединения, подписанные на чат: {chat_id: {connection}}
+        self.chat_subscribers: Dict[UUID, Set[Connection]] = {}
+        # Счетчики медленных получателей
+        self.dropped_messages = 0
+        self.evicted_connections = 0
+
+    async def start(self):
+        await self.broker.start()
+
+    async def stop(self):
+        await self.broker.stop()
+
+    async def _handle_event(self, event: Dict[str, Any]):
+        """Обработка события, полученного от брокера"""
+        event_type = event.get("type")
+        if event_type == "message":
+            # Записанное сообщение (в том числе другим процессом) попадает в буфер последних сообщений
+            if event.get("record"):
+                recent_messages.observe(UUID(event["chat_id"]), _parse_record(event["record"]))
+            skip_user_id = event.get("skip_user_id")
+            self._deliver_to_chat(
+                event["message"],
+                UUID(event["chat_id"]),
+                UUID(skip_user_id) if skip_user_id else None
+            )
+        elif event_type == "user":
+            frame = Frame(event["message"])
+            for connection in list(self.user_connections.get(UUID(event["user_id"]), ())):
+                connection.enqueue(frame)
+        elif event_type == "members_added":
+            user_ids = [UUID(user_id) for user_id in event["user_ids"]]
+            apply_member_changes(UUID(event["chat_id"]), added=user_ids)
+            self._add_chat_members(UUID(event["chat_id"]), user_ids)
+        elif event_type == "members_removed":
+            user_ids = [UUID(user_id) for user_id in event["user_ids"]]
+            apply_member_changes(UUID(event["chat_id"]), removed=user_ids)
+            self._remove_chat_members(UUID(event["chat_id"]), user_ids)
+        elif event_type == "resync":
+            # Брокер мог пропустить события других процессов, в том числе
+            # изменения состава чатов: индекс подписок перестраивается по базе
+            recent_messages.clear()
+            membership_cache.clear()
+            await self._reload_membership()
+        else:
+            log_warning(f"Unknown broker event type: {event_type}")
 
-    async def connect(self, websocket: WebSocket, user_id: UUID, chat_id: UUID):
+    async def connect(self, websocket: WebSocket, user_id: UUID, chat_id: UUID, start: bool = True, codec=json_codec) -> Connection:
         # await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = {}
-        self.active_connections[user_id][chat_id] = websocket
+        # При start=False события копятся, пока вызывающий код не запустит connection.start()
+        connection = Connection(websocket, self, user_id, chat_id, start=start, codec=codec)
+        self.active_connections.setdefault(user_id, {}).setdefault(chat_id, set()).add(connection)
+        self.chat_connections.setdefault(chat_id, set()).add(connection)
+        return connection
 
-    async def connect_user(self, websocket: WebSocket, user_id: UUID):
-        self.user_connections[user_id] = websocket
+    async def connect_user(self, websocket: WebSocket, user_id: UUID, chat_ids: Iterable[UUID] = (), start: bool = True, codec=json_codec) -> Connection:
+        # Соединения с других устройств пользователя остаются подключенными
+        connection = Connection(websocket, self, user_id, start=start, codec=codec)
+        self.user_connections.setdefault(user_id, set()).add(connection)
+        for chat_id in chat_ids:
+            self._subscribe(connection, chat_id)
+        return connection
 
-    def disconnect(self, user_id: UUID, chat_id: UUID):
-        if user_id in self.active_connections and chat_id in self.active_connections[user_id]:
-            del self.active_connections[user_id][chat_id]
-            if not self.active_connections[user_id]:
+    def disconnect(self, user_id: UUID, chat_id: UUID, websocket: WebSocket = None):
+        """Отключение соединений пользователя с чатом; с websocket - только этого сокета"""
+        chats = self.active_connections.get(user_id)
+        connections = chats.get(chat_id) if chats else None
+        if not connections:
+            return
+        for connection in list(connections):
+            if websocket is not None and connection.websocket is not websocket:
+                continue
+            connection.close()
+            connections.discard(connection)
+            sockets = self.chat_connections.get(chat_id)
+            if sockets is not None:
+                sockets.discard(connection)
+                if not sockets:
+                    del self.chat_connections[chat_id]
+        if not connections:
+            del chats[chat_id]
+            if not chats:
                 del self.active_connections[user_id]
 
-    def disconnect_user(self, user_id: UUID):
-        if user_id in self.user_connections:
+    def disconnect_user(self, user_id: UUID, websocket: WebSocket = None):
+        """Отключение глобальных соединений пользователя; с websocket - только этого сокета"""
+        connections = self.user_connections.get(user_id)
+        if not connections:
+            return
+        for connection in list(connections):
+            if websocket is not None and connection.websocket is not websocket:
+                continue
+            connection.close()
+            connections.discard(connection)
+            for chat_id in list(connection.chats):
+                self._unsubscribe(connection, chat_id)
+        if not connections:
             del self.user_connections[user_id]
 
-    async def send_personal_message(self, message: Dict[str, Any], user_id: UUID, chat_id: UUID):
-        if user_id in self.active_connections and chat_id in self.active_connections[user_id]:
-            await self.active_connections[user_id][chat_id].send_json(message)
+    def _subscribe(self, connection: Connection, chat_id: UUID):
+        connection.chats.add(chat_id)
+        self.chat_subscribers.setdefault(chat_id, set()).add(connection)
+
+    def _unsubscribe(self, connection: Connection, chat_id: UUID):
+        connection.chats.discard(chat_id)
+        subscribers = self.chat_subscribers.get(chat_id)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self.chat_subscribers[chat_id]
+
+    async def add_chat_members(self, chat_id: UUID, user_ids: Iterable[UUID]):
+        """Обновление индекса при добавлении участников в чат во всех процессах"""
+        await self.broker.publish({
+            "type": "members_added",
+            "chat_id": str(chat_id),
+            "user_ids": [str(user_id) for user_id in user_ids]
+        })
+
+    async def remove_chat_members(self, chat_id: UUID, user_ids: Iterable[UUID]):
+        """Обновление индекса при удалении участников из чата во всех процессах"""
+        await self.broker.publish({
+            "type": "members_removed",
+            "chat_id": str(chat_id),
+            "user_ids": [str(user_id) for user_id in user_ids]
+        })
+
+    def _add_chat_members(self, chat_id: UUID, user_ids: Iterable[UUID]):
+        for user_id in user_ids:
+            for connection in self.user_connections.get(user_id, ()):
+                self._subscribe(connection, chat_id)
+
+    def _remove_chat_members(self, chat_id: UUID, user_ids: Iterable[UUID]):
+        for user_id in user_ids:
+            self.unsubscribe_user(user_id, chat_id)
+            # Соединение с чатом, в котором пользователь больше не состоит, закрывается
+            for connection in list(self.active_connections.get(user_id, {}).get(chat_id, ())):
+                self.disconnect(user_id, chat_id, connection.websocket)
+                asyncio.create_task(self._close_websocket(connection.websocket, 1008))
+
+    async def _reload_membership(self):
+        """Сверка подписок локальных соединений с составом чатов в базе"""
+        user_ids = set(self.user_connections) | set(self.active_connections)
+        if not user_ids:
+            return
+        try:
+            async with async_session() as db:
+                memberships = await ChatRepository(db).get_chat_ids_for_users(user_ids)
+        except Exception as e:
+            log_error(f"Failed to reload chat membership after resync: {str(e)}")
+            return
+        # Соединения могли измениться за время запроса; новые уже подписаны по базе
+        for user_id, chat_ids in memberships.items():
+            for connection in list(self.user_connections.get(user_id, ())):
+                for chat_id in connection.chats - chat_ids:
+                    self._unsubscribe(connection, chat_id)
+                for chat_id in chat_ids - connection.chats:
+                    self._subscribe(connection, chat_id)
+            left = [chat_id for chat_id in self.active_connections.get(user_id, {}) if chat_id not in chat_ids]
+            for chat_id in left:
+                self._remove_chat_members(chat_id, [user_id])
+
+    def _handle_overflow(self, connection: Connection, frame: Frame) -> bool:
+        """Обработка переполнения очереди медленного получателя согласно политике"""
+        policy = settings.WS_SLOW_CONSUMER_POLICY
+        self.dropped_messages += 1
+        connection.dropped += 1
+        if policy == "drop_oldest":
+            connection.replace_oldest(frame)
+            return True
+        if policy == "disconnect":
+            self._evict(connection)
+        # drop_new: новое сообщение отбрасывается
+        return False
+
+    def _evict(self, connection: Connection):
+        """Отключение получателя, который не успевает забирать сообщения"""
+        self.evicted_connections += 1
+        if connection.chat_id is not None:
+            log_warning(f"Evicting slow consumer: user {connection.user_id} in chat {connection.chat_id}")
+            self.disconnect(connection.user_id, connection.chat_id, connection.websocket)
+        else:
+            log_warning(f"Evicting slow consumer: user {connection.user_id} global connection")
+            self.disconnect_user(connection.user_id, connection.websocket)
+        # Закрытие сокета завершит цикл приема в эндпоинте
+        asyncio.create_task(self._close_websocket(connection.websocket, 1013))
+
+    async def _close_websocket(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception as e:
+            log_error(f"Error closing WebSocket: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Глубина очередей и счетчики вытеснения"""
+        connections = [
+            connection
+            for chats in self.active_connections.values()
+            for sockets in chats.values()
+            for connection in sockets
+        ] + [
+            connection
+            for sockets in self.user_connections.values()
+            for connection in sockets
+        ]
+        depths = [connection.queue.qsize() + len(connection.backlog) for connection in connections]
+        return {
+            "connections": len(connections),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "queue_size": settings.WS_SEND_QUEUE_SIZE,
+            "slow_consumer_policy": settings.WS_SLOW_CONSUMER_POLICY,
+            "dropped_messages": self.dropped_messages,
+            "evicted_connections": self.evicted_connections,
+        }
+
+    def subscribe_user(self, user_id: UUID, chat_id: UUID):
+        """Подписка всех глобальных соединений пользователя на чат"""
+        for connection in self.user_connections.get(user_id, ()):
+            self._subscribe(connection, chat_id)
+
+    def unsubscribe_user(self, user_id: UUID, chat_id: UUID):
+        """Отписка всех глобальных соединений пользователя от чата"""
+        for connection in list(self.user_connections.get(user_id, ())):
+            self._unsubscribe(connection, chat_id)
+
+    def subscribe(self, connection: Connection, chat_id: UUID):
+        """Подписка одного глобального соединения на чат"""
+        if not connection.closed:
+            self._subscribe(connection, chat_id)
+
+    def unsubscribe(self, connection: Connection, chat_id: UUID):
+        """Отписка одного глобального соединения от чата"""
+        self._unsubscribe(connection, chat_id)
+
+    async def send_personal_message(self, message: Dict[str, Any], user_id: UUID, chat_id: Optional[UUID] = None):
+        # Без chat_id сообщение отправляется во все глобальные соединения пользователя.
+        # Ответ на кадр клиента ставится в очередь его собственного соединения (connection.enqueue)
+        if chat_id is None:
+            connections = self.user_connections.get(user_id, ())
+        else:
+            connections = self.active_connections.get(user_id, {}).get(chat_id, ())
+        frame = Frame(message)
+        for connection in list(connections):
+            connection.enqueue(frame)
 
     async def send_to_user(self, message: Dict[str, Any], user_id: UUID):
-        if user_id in self.user_connections:
-            await self.user_connections[user_id].send_json(message)
+        await self.broker.publish({"type": "user", "user_id": str(user_id), "message": message})
 
-    async def broadcast_to_chat(self, message: Dict[str, Any], chat_id: UUID, skip_user_id: UUID = None):
-        for user_id, chats in self.active_connections.items():
-            if skip_user_id and user_id == skip_user_id:
-                continue
-            if chat_id in chats:
-                await chats[chat_id].send_json(message)
+    async def broadcast_to_chat(self, message: Dict[str, Any], chat_id: UUID, skip_user_id: UUID = None, record: Optional[Dict[str, Any]] = None):
+        await self.broker.publish({
+            "type": "message",
+            "chat_id": str(chat_id),
+            "skip_user_id": str(skip_user_id) if skip_user_id else None,
+            "message": message,
+            "record": record
+        })
+
+    async def broadcast_message(self, result: Dict[str, Any], sender_name: str):
+        """Рассылка записанного сообщения; все записи проходят через брокер,
+        чтобы другие процессы добавили его в буферы последних сообщений"""
+        await self.broadcast_to_chat(_message_event(result, sender_name), result["chat_id"], record=_message_record(result))
+
+    def _deliver_to_chat(self, message: Dict[str, Any], chat_id: UUID, skip_user_id: Optional[UUID] = None):
+        """Доставка сообщения локальным соединениям участников чата"""
+        # Обходим только соединения, открытые для этого чата; отправка идет через очереди
+        connections = self.chat_connections.get(chat_id)
+        if connections:
+            # Кадр сериализуется один раз на формат и переиспользуется для всех получателей
+            frame = Frame(message)
+            for connection in list(connections):
+                if skip_user_id and connection.user_id == skip_user_id:
+                    continue
+                connection.enqueue(frame)
         
-        # Также отправляем сообщение всем пользователям, которые подключены к глобальному эндпоинту
-        # и являются участниками этого чата
-        chat_message = message.get("data", {})
+        # Также отправляем сообщение участникам чата, подключенным к глобальному эндпоинту
+        subscribers = self.chat_subscribers.get(chat_id)
+        if not subscribers:
+            return
+
+        chat_message = dict(message.get("data", {}))
         if chat_message and "chat_id" not in chat_message:
             chat_message["chat_id"] = str(chat_id)
+        user_frame = Frame({"type": "message", "data": chat_message})
         
-        # Получаем информацию о чате, чтобы узнать его участников
-        # Это можно оптимизировать, кэшируя информацию о чатах
-        chat_service = None
-        chat = None
-        
-        for user_id in list(self.user_connections.keys()):
-            if user_id == skip_user_id:
+        for connection in list(subscribers):
+            if connection.user_id == skip_user_id:
                 continue
-                
-            try:
-                # Отправляем сообщение всем пользователям, у которых есть глобальное подключение
-                # Проверку на принадлежность к чату можно добавить при необходимости
-                await self.user_connections[user_id].send_json({
-                    "type": "message",
-                    "data": chat_message
+            connection.enqueue(user_frame)
+
+manager = ConnectionManager(create_broker())
+
+def _message_event(result: Dict[str, Any], sender_name: str) -> Dict[str, Any]:
+    """Формирование события о новом сообщении для рассылки"""
+    return {
+        "type": "message",
+        "data": {
+            "id": str(result["id"]),
+            "sender_id": str(result["sender_id"]),
+            "sender_name": sender_name,
+            "text": result["text"],
+            "timestamp": str(result["timestamp"]),
+            "is_read": result["is_read"],
+            # Курсор для возобновления после переподключения (параметр last_seen)
+            "cursor": encode_cursor(result["timestamp"], result["id"])
+        }
+    }
+
+def _message_record(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Сообщение в виде записи буфера последних сообщений, пригодной для JSON брокера"""
+    sender = result["sender"]
+    return {
+        "id": str(result["id"]),
+        "chat_id": str(result["chat_id"]),
+        "sender_id": str(result["sender_id"]),
+        "sender": {"id": str(sender["id"]), "name": sender["name"], "email": sender["email"]},
+        "text": result["text"],
+        "timestamp": result["timestamp"].isoformat(),
+        "is_read": result["is_read"]
+    }
+
+def _parse_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Обратное преобразование записи из события брокера"""
+    sender = record["sender"]
+    return {
+        "id": UUID(record["id"]),
+        "chat_id": UUID(record["chat_id"]),
+        "sender_id": UUID(record["sender_id"]),
+        "sender": {"id": UUID(sender["id"]), "name": sender["name"], "email": sender["email"]},
+        "text": record["text"],
+        "timestamp": datetime.fromisoformat(record["timestamp"]),
+        "is_read": record["is_read"]
+    }
+
+async def _replay_frame(user, cursors: Dict[UUID, Optional[str]]) -> Optional[Frame]:
+    """Один кадр со всеми сообщениями, пропущенными с переданных при подключении курсоров.
+
+    Значение None вместо курсора означает ошибку разбора для этого чата.
+    """
+    if not cursors:
+        return None
+    chats = []
+    try:
+        async with async_session() as db:
+            message_service = MessageService(db)
+            for chat_id, cursor in cursors.items():
+                if cursor is None:
+                    chats.append({"chat_id": str(chat_id), "error": "Некорректный курсор"})
+                    continue
+                result = await message_service.get_messages_after(chat_id, user.id, cursor, settings.WS_RESUME_LIMIT)
+                if "error" in result:
+                    chats.append({"chat_id": str(chat_id), "error": result["error"]})
+                    continue
+                chats.append({
+                    "chat_id": str(chat_id),
+                    "messages": [_message_event(message, message["sender"]["name"])["data"] for message in result["messages"]],
+                    "has_more": result["has_more"]
                 })
-            except Exception as e:
-                log_error(f"Error sending message to user {user_id}: {str(e)}")
+    except Exception as e:
+        log_error(f"Replay failed for user {user.id}: {str(e)}")
+        return Frame({"type": "replay", "error": "Не удалось загрузить пропущенные сообщения"})
+    return Frame({"type": "replay", "chats": chats})
 
-manager = ConnectionManager()
+def _parse_last_seen(values: List[str], chat_ids: Iterable[UUID]) -> Dict[UUID, Optional[str]]:
+    """Разбор параметров last_seen вида "<chat_id>:<курсор>" для чатов пользователя"""
+    allowed = set(chat_ids)
+    cursors: Dict[UUID, Optional[str]] = {}
+    for value in values:
+        chat_part, _, cursor = value.partition(":")
+        try:
+            chat_id = UUID(chat_part)
+        except ValueError:
+            continue
+        if chat_id in allowed:
+            cursors[chat_id] = cursor or None
+    return cursors
+
+async def _accept(websocket: WebSocket):
+    """Принятие соединения; формат кадров выбирается по Sec-WebSocket-Protocol клиента"""
+    codec, subprotocol = negotiate(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=subprotocol)
+    return codec
+
+async def _receive(websocket: WebSocket) -> Dict[str, Any]:
+    """Прием текстового или бинарного кадра клиента"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    return message
+
+async def _mark_chat_as_read(db: AsyncSession, user, chat_id: UUID, message_id: Any = None) -> Dict[str, Any]:
+    """Отметка чата прочитанным до указанного (или последнего) сообщения"""
+    message_service = MessageService(db)
+    result = await message_service.mark_chat_as_read(
+        chat_id=chat_id,
+        user_id=user.id,
+        message_id=UUID(str(message_id)) if message_id else None
+    )
+    if "error" in result:
+        return {"error": result["error"], "chat_id": str(chat_id)}
+    return {
+        "type": "read",
+        "chat_id": str(chat_id),
+        "last_read_message_id": str(result["last_read_message_id"]) if result["last_read_message_id"] else None
+    }
+
+async def _handle_user_frame(db: AsyncSession, user, frame: Dict[str, Any], connection: Connection) -> Dict[str, Any]:
+    """Обработка кадра мультиплексированного протокола /ws/user.
+
+    Подписки меняются только у соединения connection, с которого пришел кадр.
+    Возвращает ответ для отправителя; поле request_id из кадра копируется в ответ.
+    """
+    frame_type = frame.get("type")
+    if frame_type not in ("subscribe", "unsubscribe", "send", "read"):
+        return {"error": f"Неизвестный тип кадра: {frame_type}"}
+
+    if frame_type == "read" and frame.get("chat_id") is None:
+        message_service = MessageService(db)
+        result = await message_service.mark_message_as_read(
+            message_id=UUID(str(frame.get("message_id"))),
+            user_id=user.id
+        )
+        if "error" in result:
+            return {"error": result["error"]}
+        return {"type": "read", "message_id": str(frame.get("message_id"))}
+
+    chat_id = UUID(str(frame.get("chat_id")))
+
+    if frame_type == "read":
+        return await _mark_chat_as_read(db, user, chat_id, frame.get("message_id"))
+
+    if frame_type == "unsubscribe":
+        manager.unsubscribe(connection, chat_id)
+        return {"type": "unsubscribed", "chat_id": str(chat_id)}
+
+    if frame_type == "subscribe":
+        chat_service = ChatService(db)
+        if not await chat_service.is_member(chat_id=chat_id, user_id=user.id):
+            return {"error": "Чат не найден или доступ запрещен", "chat_id": str(chat_id)}
+        manager.subscribe(connection, chat_id)
+        return {"type": "subscribed", "chat_id": str(chat_id)}
+
+    message_service = MessageService(db)
+    result = await message_service.create_message(
+        sender_id=user.id,
+        message_data=MessageCreate(
+            chat_id=chat_id,
+            text=frame.get("text", "")
+        ),
+        sender=user
+    )
+    if "error" in result:
+        return {"error": result["error"], "chat_id": str(chat_id)}
+
+    await manager.broadcast_message(result, user.name)
+    return {"type": "sent", "chat_id": str(chat_id), "message_id": str(result["id"])}
 
 @router.websocket("/ws/user")
 async def user_websocket_endpoint(
     websocket: WebSocket,
     token: str = Query(...),
-    db: AsyncSession = Depends(get_db)
+    last_seen: List[str] = Query([])
 ):
-    await websocket.accept()
+    codec = await _accept(websocket)
     log_info(f"Accepting global WebSocket connection request with token")
     
     # Аутентификация пользователя по токену
     from app.core.security import get_user_from_token
     
     try:
-        # Получаем пользователя из токена
-        user = await get_user_from_token(token=token, db=db)
+        # Сессия берется только на аутентификацию и загрузку чатов пользователя:
+        # простаивающий сокет не держит ни сессию, ни соединение из пула
+        async with async_session() as db:
+            user = await get_user_from_token(token=token, db=db)
+            chat_ids = await ChatRepository(db).get_user_chat_ids(user.id) if user else []
         
         if not user:
             log_warning(f"Invalid token for global WebSocket connection")
-            await websocket.send_json({"error": "Недействительный токен"})
+            await codec.send(websocket, Frame({"error": "Недействительный токен"}))
             await websocket.close(code=1008)
             return
             
         # Отправляем подтверждение успешного подключения
         log_info(f"User {user.id} connected to global WebSocket")
-        await websocket.send_json({"status": "connected", "user_id": str(user.id)})
+        await codec.send(websocket, Frame({"status": "connected", "user_id": str(user.id)}))
         
-        # Регистрируем глобальное соединение пользователя в менеджере
-        await manager.connect_user(websocket, user.id)
+        # Регистрируем глобальное соединение пользователя в менеджере вместе с его чатами.
+        # Пока загружаются пропущенные сообщения, новые события копятся в очереди
+        # соединения, поэтому между повтором и живой доставкой нет разрыва
+        cursors = _parse_last_seen(last_seen, chat_ids)
+        connection = await manager.connect_user(websocket, user.id, chat_ids, start=not cursors, codec=codec)
+        if cursors:
+            connection.start(await _replay_frame(user, cursors))
         
         try:
             while True:
-                # Просто поддерживаем соединение, ожидая события
-                await websocket.receive_text()
+                # Кадры subscribe, unsubscribe, send и read адресуются чату через chat_id
+                message = await _receive(websocket)
+                try:
+                    frame = codec.decode(message)
+                    if not isinstance(frame, dict):
+                        raise ValueError("Кадр должен быть объектом")
+                    # Короткая сессия на каждый входящий кадр
+                    async with async_session() as db:
+                        reply = await _handle_user_frame(db, user, frame, connection)
+                except ValueError as e:
+                    reply = {"error": f"Некорректный кадр: {str(e)}"}
+                    frame = {}
+                if "request_id" in frame:
+                    reply["request_id"] = frame["request_id"]
+                # Ответ уходит в то соединение, с которого пришел кадр
+                connection.enqueue(Frame(reply))
         except WebSocketDisconnect:
             log_info(f"User {user.id} disconnected from global WebSocket")
-            manager.disconnect_user(user.id)
+            manager.disconnect_user(user.id, websocket)
         except Exception as e:
             log_error(f"Global WebSocket error for user {user.id}: {str(e)}")
-            await websocket.send_json({"error": str(e)})
-            manager.disconnect_user(user.id)
+            await codec.send(websocket, Frame({"error": str(e)}))
+            manager.disconnect_user(user.id, websocket)
     except Exception as e:
         log_error(f"Authentication error in global WebSocket: {str(e)}")
-        await websocket.send_json({"error": "Ошибка аутентификации"})
+        await codec.send(websocket, Frame({"error": "Ошибка аутентификации"}))
         await websocket.close(code=1008) 
 
 @router.websocket("/ws/{chat_id}")
@@ -131,86 +634,83 @@ async def websocket_endpoint(
     websocket: WebSocket,
     chat_id: UUID,
     token: str = Query(...),
-    db: AsyncSession = Depends(get_db)
+    last_seen: Optional[str] = Query(None)
 ):
-    await websocket.accept()
+    codec = await _accept(websocket)
     
     # Аутентификация пользователя по токену
     from app.core.security import get_user_from_token
     
     try:
-        user = await get_user_from_token(token=token, db=db)
+        # Сессия нужна только на время аутентификации и проверки доступа
+        async with async_session() as db:
+            user = await get_user_from_token(token=token, db=db)
+            is_member = user is not None and await ChatService(db).is_member(chat_id=chat_id, user_id=user.id)
         if not user:
             log_warning(f"Invalid token for chat connection: {chat_id}")
-            await websocket.send_json({"error": "Недействительный токен"})
+            await codec.send(websocket, Frame({"error": "Недействительный токен"}))
             await websocket.close(code=1008)
             return
             
         # Проверка доступа к чату
-        chat_service = ChatService(db)
-        chat_result = await chat_service.get_chat_by_id(chat_id=chat_id, user_id=user.id)
-        
-        if not chat_result or "error" in chat_result:
+        if not is_member:
             log_warning(f"Chat access denied for user {user.id} to chat {chat_id}")
-            await websocket.send_json({"error": "Чат не найден или доступ запрещен"})
+            await codec.send(websocket, Frame({"error": "Чат не найден или доступ запрещен"}))
             await websocket.close(code=1008)
             return
 
         # Отправляем подтверждение успешного подключения
         log_info(f"User {user.id} connected to chat {chat_id}")
-        await websocket.send_json({"status": "connected", "user_id": str(user.id), "chat_id": str(chat_id)})
+        await codec.send(websocket, Frame({"status": "connected", "user_id": str(user.id), "chat_id": str(chat_id)}))
         
-        # Регистрируем соединение в менеджере
-        await manager.connect(websocket, user.id, chat_id)
+        # Регистрируем соединение в менеджере; пропущенные с last_seen сообщения
+        # отправляются одним кадром раньше накопленных за это время событий
+        connection = await manager.connect(websocket, user.id, chat_id, start=last_seen is None, codec=codec)
+        if last_seen is not None:
+            connection.start(await _replay_frame(user, {chat_id: last_seen}))
         
         try:
             while True:
                 # Получение сообщения от клиента
-                data = await websocket.receive_text()
-                message_data_text = json.loads(data)
+                message_data_text = codec.decode(await _receive(websocket))
+                
+                # Кадр {"type": "read"} отмечает чат прочитанным до message_id одним запросом
+                if message_data_text.get("type") == "read":
+                    try:
+                        async with async_session() as db:
+                            reply = await _mark_chat_as_read(db, user, chat_id, message_data_text.get("message_id"))
+                    except ValueError as e:
+                        reply = {"error": f"Некорректный кадр: {str(e)}"}
+                    connection.enqueue(Frame(reply))
+                    continue
                 
-                # Создание сообщения в базе данных
-                message_service = MessageService(db)
-                result = await message_service.create_message(
-                    sender_id=user.id,
-                    message_data=MessageCreate(
-                        chat_id = chat_id,
-                        text = message_data_text.get("text", "")
+                # Создание сообщения в базе данных в короткой сессии на кадр
+                async with async_session() as db:
+                    message_service = MessageService(db)
+                    result = await message_service.create_message(
+                        sender_id=user.id,
+                        message_data=MessageCreate(
+                            chat_id = chat_id,
+                            text = message_data_text.get("text", "")
+                        ),
+                        sender=user
                     )
-                )
                 
                 if "error" in result:
-                    await manager.send_personal_message(
-                        {"error": result["error"]},
-                        user.id,
-                        chat_id
-                    )
+                    connection.enqueue(Frame({"error": result["error"]}))
                     continue
                 
                 # Отправка сообщения всем участникам чата
-                await manager.broadcast_to_chat(
-                    {
-                        "type": "message",
-                        "data": {
-                            "id": str(result["id"]),
-                            "sender_id": str(result["sender_id"]),
-                            "sender_name": user.name,
-                            "text": result["text"],
-                            "timestamp": str(result["timestamp"]),
-                            "is_read": result["is_read"]
-                        }
-                    },
-                    chat_id
-                )
+                await manager.broadcast_message(result, user.name)
         except WebSocketDisconnect:
             log_info(f"User {user.id} disconnected from chat {chat_id}")
-            manager.disconnect(user.id, chat_id)
+            manager.disconnect(user.id, chat_id, websocket)
         except Exception as e:
             log_error(f"WebSocket error for user {user.id} in chat {chat_id}: {str(e)}")
-            await websocket.send_json({"error": str(e)})
-            manager.disconnect(user.id, chat_id)
+            await codec.send(websocket, Frame({"error": str(e)}))
+            manager.disconnect(user.id, chat_id, websocket)
     except Exception as e:
         log_error(f"Authentication error in chat WebSocket: {str(e)}")
-        await websocket.send_json({"error": "Ошибка аутентификации"})
+        await codec.send(websocket, Frame({"error": "Ошибка аутентификации"}))
         await websocket.close(code=1008)
 
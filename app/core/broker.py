@@ -0,0 +1,207 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import log_info, log_error, log_warning
+
+# Обработчик события, доставленного брокером
+EventHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+class Broker:
+    """Базовый брокер событий для рассылки между процессами"""
+
+    def __init__(self):
+        self.handler: Optional[EventHandler] = None
+
+    def bind(self, handler: EventHandler):
+        """Назначение обработчика, которому доставляются события"""
+        self.handler = handler
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, event: Dict[str, Any]):
+        raise NotImplementedError
+
+class InMemoryBroker(Broker):
+    """Брокер в пределах одного процесса: событие сразу доставляется локально"""
+
+    async def publish(self, event: Dict[str, Any]):
+        if self.handler is not None:
+            await self.handler(event)
+
+class PostgresBroker(Broker):
+    """Брокер на основе LISTEN/NOTIFY PostgreSQL.
+
+    Событие доставляется локально без ожидания базы, а остальным процессам
+    передается через NOTIFY; собственные уведомления процесс пропускает.
+    """
+
+    # Ограничение PostgreSQL на размер payload у NOTIFY - 8000 байт
+    PAYLOAD_LIMIT = 7000
+    RECONNECT_DELAY = 1.0
+    CONNECT_TIMEOUT = 5.0
+    # Части одного события приходят подряд; событие, не собранное за PENDING_PARTS_TTL
+    # секунд (часть потеряна при разрыве соединения), отбрасывается. Одновременно
+    # собирается не больше PENDING_PARTS_LIMIT событий
+    PENDING_PARTS_TTL = 30.0
+    PENDING_PARTS_LIMIT = 1000
+
+    def __init__(self, dsn: str, channel: str):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self.listener = None
+        self.publisher = None
+        self.publish_lock = asyncio.Lock()
+        # Части крупных событий, ожидающие сборки: {event_id: (время первой части, [part, ...])}
+        self.pending_parts: Dict[str, Tuple[float, List[Optional[str]]]] = {}
+        self._stopping = False
+
+    async def start(self):
+        self._stopping = False
+        await self._connect_listener()
+        await self._connect_publisher()
+        log_info(f"Postgres broker listening on channel {self.channel}")
+
+    async def _connect_listener(self):
+        import asyncpg
+
+        self.listener = await asyncpg.connect(self.dsn, timeout=self.CONNECT_TIMEOUT)
+        self.listener.add_termination_listener(self._on_termination)
+        await self.listener.add_listener(self.channel, self._on_notify)
+
+    async def _connect_publisher(self):
+        import asyncpg
+
+        self.publisher = await asyncpg.connect(self.dsn, timeout=self.CONNECT_TIMEOUT)
+
+    async def stop(self):
+        self._stopping = True
+        for connection in (self.listener, self.publisher):
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+        self.listener = None
+        self.publisher = None
+
+    def _on_termination(self, connection):
+        if self._stopping:
+            return
+        log_warning("Postgres broker listener connection lost, reconnecting")
+        asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        """Восстановление соединения LISTEN; соединение публикации восстанавливает publish"""
+        while not self._stopping:
+            try:
+                await self._connect_listener()
+                log_info("Postgres broker reconnected")
+                # Уведомления, отправленные во время разрыва, потеряны: локальные
+                # кэши, которые они поддерживали, нужно сбросить
+                if self.handler is not None:
+                    await self._dispatch({"type": "resync"})
+                return
+            except Exception as e:
+                log_error(f"Postgres broker reconnect failed: {str(e)}")
+                await asyncio.sleep(self.RECONNECT_DELAY)
+
+    async def publish(self, event: Dict[str, Any]):
+        if self.handler is not None:
+            await self.handler(event)
+
+        # ASCII-представление гарантирует, что длина части в символах равна длине в байтах
+        body = json.dumps(event, ensure_ascii=True, separators=(",", ":"), default=str)
+        event_id = uuid.uuid4().hex
+        chunks = [
+            body[i:i + self.PAYLOAD_LIMIT]
+            for i in range(0, len(body), self.PAYLOAD_LIMIT)
+        ]
+        # Формат уведомления: origin:event_id:part:parts:data
+        payloads = [
+            f"{self.origin}:{event_id}:{index}:{len(chunks)}:{chunk}"
+            for index, chunk in enumerate(chunks)
+        ]
+
+        async with self.publish_lock:
+            # Разорванное соединение публикации открывается заново, и событие отправляется повторно
+            for attempt in range(2):
+                try:
+                    if self.publisher is None or self.publisher.is_closed():
+                        await self._connect_publisher()
+                    # Части одного события отправляются в одной транзакции и приходят подряд
+                    async with self.publisher.transaction():
+                        for payload in payloads:
+                            await self.publisher.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+                    return
+                except Exception as e:
+                    connection_lost = self.publisher is None or self.publisher.is_closed()
+                    if attempt or not connection_lost:
+                        log_error(f"Postgres broker publish failed: {str(e)}")
+                        return
+                    log_warning("Postgres broker publisher connection lost, reconnecting")
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str):
+        try:
+            origin, event_id, part, parts, data = payload.split(":", 4)
+            part, parts = int(part), int(parts)
+        except ValueError:
+            log_warning("Postgres broker received malformed payload")
+            return
+        if origin == self.origin:
+            return
+        if not 0 <= part < parts:
+            log_warning("Postgres broker received malformed payload")
+            return
+
+        if parts == 1:
+            body = data
+        else:
+            now = time.monotonic()
+            self._expire_pending_parts(now)
+            entry = self.pending_parts.get(event_id)
+            if entry is None:
+                if len(self.pending_parts) >= self.PENDING_PARTS_LIMIT:
+                    del self.pending_parts[next(iter(self.pending_parts))]
+                    log_warning("Postgres broker dropped incomplete event: too many pending events")
+                entry = self.pending_parts[event_id] = (now, [None] * parts)
+            received = entry[1]
+            received[part] = data
+            if any(chunk is None for chunk in received):
+                return
+            del self.pending_parts[event_id]
+            body = "".join(received)
+
+        if self.handler is not None:
+            asyncio.get_running_loop().create_task(self._dispatch(json.loads(body)))
+
+    def _expire_pending_parts(self, now: float):
+        """Удаление событий, части которых не пришли вовремя"""
+        # Словарь упорядочен по времени первой части: устаревшие события идут первыми
+        expired = 0
+        while self.pending_parts:
+            event_id, (started, _) = next(iter(self.pending_parts.items()))
+            if now - started < self.PENDING_PARTS_TTL:
+                break
+            del self.pending_parts[event_id]
+            expired += 1
+        if expired:
+            log_warning(f"Postgres broker dropped {expired} incomplete events")
+
+    async def _dispatch(self, event: Dict[str, Any]):
+        try:
+            await self.handler(event)
+        except Exception as e:
+            log_error(f"Postgres broker handler error: {str(e)}")
+
+def create_broker() -> Broker:
+    """Создание брокера согласно настройке BROKER_BACKEND"""
+    if settings.BROKER_BACKEND == "postgres":
+        return PostgresBroker(settings.ASYNCPG_DSN, settings.BROKER_CHANNEL)
+    return InMemoryBroker()
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import PostgresDsn
 from pydantic_settings import BaseSettings
 
@@ -16,10 +18,70 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # WebSocket settings
+    WS_SEND_QUEUE_SIZE: int = 256
+    # Политика для переполненной очереди; неизвестное значение - ошибка загрузки настроек
+    WS_SLOW_CONSUMER_POLICY: Literal["drop_oldest", "drop_new", "disconnect"] = "drop_oldest"
+    # Кадры, пришедшие до запуска отправки (пока загружается повтор пропущенных
+    # сообщений), копятся отдельно и не подпадают под политику до этого предела
+    WS_START_BACKLOG_SIZE: int = 4096
+    
+    # Брокер для рассылки между процессами: memory или postgres
+    BROKER_BACKEND: str = "memory"
+    BROKER_CHANNEL: str = "messenger_events"
+    
+    # Пакетная запись сообщений: окно ожидания и максимальный размер пакета
+    INGEST_BATCHING: bool = True
+    INGEST_BATCH_WINDOW_MS: float = 5
+    INGEST_BATCH_SIZE: int = 200
+    
+    # Кэш участников чатов для проверок доступа
+    MEMBERSHIP_CACHE_SIZE: int = 10000
+    MEMBERSHIP_CACHE_TTL: float = 60
+    
+    # Кэш проверенных токенов доступа; TTL - наибольшая задержка, с которой изменения
+    # пользователя в обход API доходят до аутентификации
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: float = 60
+    
+    # Хэширование паролей: число потоков и допустимая очередь ожидающих операций
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_SIZE: int = 64
+    
+    # Число процессов приложения; та же переменная задает число воркеров uvicorn
+    WEB_CONCURRENCY: int = 1
+    
+    # Буфер последних сообщений активных чатов: размер на чат, общие лимиты
+    # и срок, после которого буфер перечитывается из базы. Буфер работает, только
+    # если о каждой записи узнают все процессы: в одном процессе или с брокером postgres
+    RECENT_MESSAGES_ENABLED: bool = True
+    RECENT_MESSAGES_PER_CHAT: int = 50
+    RECENT_MESSAGES_MAX_CHATS: int = 10000
+    RECENT_MESSAGES_MAX_BYTES: int = 64 * 1024 * 1024
+    RECENT_MESSAGES_TTL: float = 300
+    
+    # Максимум сообщений на чат в кадре повтора при переподключении WebSocket
+    WS_RESUME_LIMIT: int = 200
+    
+    # Секционирование сообщений по месяцам: сколько месяцев вперед создавать секции,
+    # как часто это проверять (с) и сколько месяцев хранить до выгрузки в архив
+    MESSAGE_PARTITIONS_AHEAD: int = 3
+    # Последние сообщения и первая страница истории сначала читаются только из
+    # стольких последних месячных секций (текущая и предыдущая)
+    MESSAGE_RECENT_MONTHS: int = 2
+    MESSAGE_PARTITION_CHECK_INTERVAL: float = 6 * 60 * 60
+    MESSAGE_RETENTION_MONTHS: int = 12
+    MESSAGE_ARCHIVE_DIR: str = "archive"
+    
     @property
     def DATABASE_URL(self) -> str:
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
     
+    @property
+    def ASYNCPG_DSN(self) -> str:
+        # DSN в формате, который принимает asyncpg напрямую
+        return self.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+    
     class Config:
         case_sensitive = True
         env_file = ".env"
@@ -0,0 +1,164 @@
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+from uuid import UUID
+
+# Быстрый JSON-кодировщик используется, если он установлен
+try:
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+# Бинарный протокол MessagePack доступен, только если установлен msgpack
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - зависит от окружения
+    msgpack = None
+
+def dumps(data: Any) -> str:
+    """Сериализация данных в JSON-строку для отправки через WebSocket"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+# Подпротоколы WebSocket (Sec-WebSocket-Protocol), которые может запросить клиент
+JSON_PROTOCOL = "messenger.json"
+MSGPACK_PROTOCOL = "messenger.msgpack"
+
+# Короткие ключи бинарного протокола; ключи, которых нет в таблице, передаются как есть
+COMPACT_KEYS = {
+    "type": "t",
+    "data": "d",
+    "id": "i",
+    "chat_id": "c",
+    "sender_id": "s",
+    "sender_name": "n",
+    "text": "x",
+    "timestamp": "ts",
+    "is_read": "r",
+    "cursor": "k",
+    "chats": "cs",
+    "messages": "m",
+    "has_more": "h",
+    "message_id": "mi",
+    "last_read_message_id": "l",
+    "user_id": "u",
+    "request_id": "q",
+    "status": "st",
+    "error": "e",
+}
+EXPANDED_KEYS = {short: key for key, short in COMPACT_KEYS.items()}
+# Значения этих ключей передаются как 16 байт UUID и целое число микросекунд от эпохи Unix (UTC)
+UUID_KEYS = {"id", "chat_id", "sender_id", "message_id", "last_read_message_id", "user_id"}
+TIMESTAMP_KEYS = {"timestamp"}
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+def _compact_value(key: Optional[str], value: Any) -> Any:
+    # Проверки упорядочены по частоте: большинство значений - строки
+    kind = type(value)
+    if kind is str:
+        if key in UUID_KEYS and len(value) == 36:
+            try:
+                return bytes.fromhex(value.replace("-", ""))
+            except ValueError:
+                return value
+        if key in TIMESTAMP_KEYS:
+            try:
+                value = datetime.fromisoformat(value)
+            except ValueError:
+                return value
+        else:
+            return value
+    elif kind is dict:
+        return {COMPACT_KEYS.get(k, k): _compact_value(k, v) for k, v in value.items()}
+    elif kind is list:
+        return [_compact_value(None, item) for item in value]
+    elif kind is UUID:
+        return value.bytes
+    if isinstance(value, datetime):
+        # Время в базе хранится в UTC без часового пояса
+        return (value.replace(tzinfo=None) - EPOCH) // MICROSECOND
+    return value
+
+def _expand_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {EXPANDED_KEYS.get(k, k): _expand_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_expand_value(item) for item in value]
+    if isinstance(value, bytes) and len(value) == 16:
+        return str(UUID(bytes=value))
+    return value
+
+class JSONCodec:
+    """Текстовые кадры JSON - протокол по умолчанию"""
+
+    protocol = JSON_PROTOCOL
+
+    def encode(self, data: Any) -> str:
+        return dumps(data)
+
+    def decode(self, message: Dict[str, Any]) -> Any:
+        if message.get("text") is None:
+            raise ValueError("Ожидался текстовый кадр")
+        return json.loads(message["text"])
+
+    async def send(self, websocket, frame: "Frame"):
+        await websocket.send_text(frame.encode(self))
+
+class MessagePackCodec:
+    """Бинарные кадры MessagePack с короткими ключами, UUID в 16 байтах
+    и временем в микросекундах"""
+
+    protocol = MSGPACK_PROTOCOL
+
+    def __init__(self):
+        # Упаковщик переиспользуется: кодирование идет в одном потоке цикла событий
+        self.packer = msgpack.Packer(default=str)
+
+    def encode(self, data: Any) -> bytes:
+        return self.packer.pack(_compact_value(None, data))
+
+    def decode(self, message: Dict[str, Any]) -> Any:
+        if message.get("bytes") is None:
+            raise ValueError("Ожидался бинарный кадр")
+        try:
+            return _expand_value(msgpack.unpackb(message["bytes"]))
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(str(e))
+
+    async def send(self, websocket, frame: "Frame"):
+        await websocket.send_bytes(frame.encode(self))
+
+json_codec = JSONCodec()
+CODECS = {JSON_PROTOCOL: json_codec}
+if msgpack is not None:
+    CODECS[MSGPACK_PROTOCOL] = MessagePackCodec()
+
+def negotiate(protocols: Iterable[str]) -> Tuple[Any, Optional[str]]:
+    """Выбор кодека по подпротоколам клиента в порядке его предпочтения.
+
+    Возвращает кодек и подпротокол для ответа; без подходящего подпротокола - JSON без него.
+    """
+    for protocol in protocols:
+        codec = CODECS.get(protocol)
+        if codec is not None:
+            return codec, protocol
+    return json_codec, None
+
+class Frame:
+    """Исходящий кадр: при рассылке сериализуется не больше одного раза на каждый кодек"""
+
+    __slots__ = ("data", "_encoded")
+
+    def __init__(self, data: Any):
+        self.data = data
+        self._encoded: Dict[str, Any] = {}
+
+    def encode(self, codec) -> Any:
+        encoded = self._encoded.get(codec.protocol)
+        if encoded is None:
+            encoded = self._encoded[codec.protocol] = codec.encode(self.data)
+        return encoded
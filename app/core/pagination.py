@@ -0,0 +1,42 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+from uuid import UUID
+
+# Позиция сообщения в истории чата: (timestamp, id)
+Cursor = Tuple[datetime, UUID]
+
+def encode_cursor(timestamp: datetime, message_id: UUID) -> str:
+    """Кодирование позиции сообщения в непрозрачный курсор"""
+    raw = f"{timestamp.isoformat()}|{message_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Cursor]:
+    """Декодирование курсора; при некорректном значении выбрасывает ValueError"""
+    if cursor is None:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        timestamp, message_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp), UUID(message_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Некорректный курсор") from e
+
+# Позиция результата поиска: (ранг, timestamp, id)
+SearchCursor = Tuple[float, datetime, UUID]
+
+def encode_search_cursor(rank: float, timestamp: datetime, message_id: UUID) -> str:
+    """Кодирование позиции результата поиска в непрозрачный курсор"""
+    raw = f"{rank!r}|{timestamp.isoformat()}|{message_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_search_cursor(cursor: Optional[str]) -> Optional[SearchCursor]:
+    """Декодирование курсора поиска; при некорректном значении выбрасывает ValueError"""
+    if cursor is None:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        rank, timestamp, message_id = raw.split("|", 2)
+        return float(rank), datetime.fromisoformat(timestamp), UUID(message_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Некорректный курсор") from e
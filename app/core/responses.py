@@ -0,0 +1,20 @@
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core.encoding import orjson
+
+class FastJSONResponse(JSONResponse):
+    """JSON-ответ, сериализуемый orjson за один проход (UUID, datetime и Enum - без
+    промежуточного jsonable_encoder); без orjson - обычный JSONResponse.
+
+    Эндпоинт, который возвращает этот ответ сам, минует проверку и сериализацию
+    по response_model: так отдаются данные, собранные сервисами по схеме ответа.
+    response_model при этом остается описанием ответа в OpenAPI.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return super().render(jsonable_encoder(content))
@@ -1,5 +1,8 @@
-from datetime import datetime, timedelta
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from typing import Optional
+from uuid import UUID
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -10,7 +13,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
 from app.db.base import get_db
 from app.db.repositories import UserRepository
-from app.schemas.user import TokenData
+from app.schemas.user import TokenData, CurrentUser
+from app.core.cache import TTLCache
 from app.core.logging import log_error, log_warning, log_info
 
 # Настройка контекста шифрования паролей
@@ -19,6 +23,11 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # Настройка OAuth2 с проверкой по паролю
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/token")
 
+# Кэш проверенных токенов: {token: CurrentUser}. Изменения пользователя через API
+# сбрасывают его записи (invalidate_user_principal); изменения в обход API доходят
+# до аутентификации не позже истечения записи (AUTH_CACHE_TTL, не дольше срока токена)
+principal_cache = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Проверка соответствия пароля хэшу"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -27,6 +36,36 @@ def get_password_hash(password: str) -> str:
     """Получение хэша пароля"""
     return pwd_context.hash(password)
 
+class PasswordHashingBusy(Exception):
+    """Очередь хэширования паролей переполнена"""
+
+# bcrypt выполняется в отдельных потоках, чтобы не блокировать цикл событий
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+# Число операций, выполняемых и ожидающих в очереди
+_hash_pending = 0
+
+async def _run_hashing(func, *args):
+    global _hash_pending
+    # При переполнении очереди отказываем сразу, а не копим задержку для всех
+    if _hash_pending >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_SIZE:
+        raise PasswordHashingBusy()
+    _hash_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_pending -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Проверка пароля в пуле потоков хэширования"""
+    return await _run_hashing(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Получение хэша пароля в пуле потоков хэширования"""
+    return await _run_hashing(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Создание JWT токена доступа"""
     to_encode = data.copy()
@@ -38,16 +77,33 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def invalidate_user_principal(user_id: UUID):
+    """Сброс кэша аутентификации для пользователя после изменения его данных"""
+    principal_cache.invalidate_matching(lambda token, user: user.id == user_id)
+
+def _remember_principal(token: str, user: CurrentUser, payload: dict):
+    # Запись не должна пережить сам токен
+    ttl = settings.AUTH_CACHE_TTL
+    expires = payload.get("exp")
+    if expires is not None:
+        ttl = min(ttl, expires - datetime.now(timezone.utc).timestamp())
+    if ttl > 0:
+        principal_cache.set(token, user, ttl=ttl)
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db)
-) -> dict:
+) -> CurrentUser:
     """Получение текущего пользователя по токену"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Невозможно проверить учетные данные",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    # Повторный запрос с тем же токеном не обращается к базе
+    user = principal_cache.get(token)
+    if user is not None:
+        return user
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         user_id: str = payload.get("sub")
@@ -58,16 +114,20 @@ async def get_current_user(
         raise credentials_exception
     
     user_repo = UserRepository(db)
-    user = await user_repo.get_by_id(token_data.user_id)
+    user = await user_repo.get_principal(token_data.user_id)
     if user is None:
         raise credentials_exception
+    _remember_principal(token, user, payload)
     return user
 
 async def get_user_from_token(
     token: str,
     db: AsyncSession
-) -> dict:
+) -> Optional[CurrentUser]:
     """Получение пользователя по токену для WebSocket соединений"""
+    user = principal_cache.get(token)
+    if user is not None:
+        return user
     try:
         # Проверяем и декодируем токен
         payload = jwt.decode(
@@ -86,12 +146,14 @@ async def get_user_from_token(
         
         # Получаем пользователя из базы данных
         user_repo = UserRepository(db)
-        user = await user_repo.get_by_id(token_data.user_id)
+        user = await user_repo.get_principal(token_data.user_id)
         
         if user is None:
             log_warning(f"User with ID {token_data.user_id} not found in database")
             return None
-            
+        
+        _remember_principal(token, user, payload)
+
         log_info(f"Successfully authenticated user {user.id} via WebSocket token")
         return user
         
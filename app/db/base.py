@@ -2,7 +2,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 from typing import AsyncGenerator
-from app.core.logging import log_info
+from app.core.logging import log_info, log_warning
 
 # Создание асинхронного движка SQLAlchemy
 engine = create_async_engine(settings.DATABASE_URL, echo=True)
@@ -23,6 +23,12 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 # Функция для инициализации таблиц базы данных
 async def init_db():
     from app.db.models import Base
+    from app.db.partitions import ensure_message_partitions, is_partitioned
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-    log_info("База данных инициализирована: таблицы созданы") 
\ No newline at end of file
+        # Секционированной таблице нужны секции, иначе вставка невозможна
+        if await is_partitioned(conn):
+            await ensure_message_partitions(conn)
+        else:
+            log_warning("Таблица messages не секционирована: выполните alembic upgrade head")
+    log_info("База данных инициализирована: таблицы созданы")
@@ -1,19 +1,24 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, ForeignKey, Boolean, Table, DateTime, TEXT, Enum
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, ForeignKey, Boolean, Table, DateTime, TEXT, Enum, Index, PrimaryKeyConstraint, Computed
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from enum import Enum as PyEnum
 
 Base = declarative_base()
 
+# Конфигурация текстового поиска PostgreSQL для сообщений
+SEARCH_CONFIG = 'russian'
+
 # Промежуточная таблица для связи many-to-many между пользователями и групповыми чатами
 group_members = Table(
     'group_members',
     Base.metadata,
     Column('user_id', UUID(as_uuid=True), ForeignKey('users.id')),
-    Column('group_id', UUID(as_uuid=True), ForeignKey('groups.id'))
+    Column('group_id', UUID(as_uuid=True), ForeignKey('groups.id')),
+    PrimaryKeyConstraint('user_id', 'group_id', name='pk_group_members'),
+    Index('ix_group_members_group_id_user_id', 'group_id', 'user_id')
 )
 
 # Промежуточная таблица для связи many-to-many между пользователями и личными чатами
@@ -21,7 +26,9 @@ chat_members = Table(
     'chat_members',
     Base.metadata,
     Column('user_id', UUID(as_uuid=True), ForeignKey('users.id')),
-    Column('chat_id', UUID(as_uuid=True), ForeignKey('chats.id'))
+    Column('chat_id', UUID(as_uuid=True), ForeignKey('chats.id')),
+    PrimaryKeyConstraint('user_id', 'chat_id', name='pk_chat_members'),
+    Index('ix_chat_members_chat_id_user_id', 'chat_id', 'user_id')
 )
 
 class ChatType(PyEnum):
@@ -40,11 +47,11 @@ class User(Base):
     messages = relationship("Message", back_populates="sender")
     created_groups = relationship("Group", back_populates="creator")
     group_memberships = relationship("Group", secondary=group_members, back_populates="members")
+    # Связи загружаются явно профилями загрузки в репозиториях
     chats = relationship(
         "Chat", 
         secondary=chat_members, 
-        back_populates="members",
-        lazy="selectin"  
+        back_populates="members"
     )
 
 class Chat(Base):
@@ -59,8 +66,7 @@ class Chat(Base):
     members = relationship(
         "User", 
         secondary=chat_members, 
-        back_populates="chats",
-        lazy="selectin"
+        back_populates="chats"
     )
     group = relationship("Group", back_populates="chat", uselist=False)
 
@@ -77,34 +83,71 @@ class Group(Base):
     members = relationship(
         "User", 
         secondary=group_members, 
-        back_populates="group_memberships",
-        lazy="selectin"
+        back_populates="group_memberships"
     )
     chat = relationship("Chat", back_populates="group")
 
 class Message(Base):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Индекс для постраничного чтения истории по курсору (timestamp, id)
+        Index('ix_messages_chat_id_timestamp_id', 'chat_id', 'timestamp', 'id'),
+        Index('ix_messages_sender_id', 'sender_id'),
+        # Полнотекстовый поиск по тексту сообщений
+        Index('ix_messages_search_vector', 'search_vector', postgresql_using='gin'),
+        # Таблица секционирована по месяцам (app/db/partitions.py); ключ секционирования
+        # обязан входить в первичный ключ
+        {'postgresql_partition_by': 'RANGE ("timestamp")'},
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     chat_id = Column(UUID(as_uuid=True), ForeignKey('chats.id'), nullable=False)
     sender_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
     text = Column(TEXT, nullable=False)
-    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
+    timestamp = Column(DateTime, default=datetime.utcnow, primary_key=True, nullable=False)
     is_read = Column(Boolean, default=False, nullable=False)
+    # Вычисляется базой при вставке и изменении текста; при обычной загрузке не читается
+    search_vector = deferred(Column(TSVECTOR, Computed(f"to_tsvector('{SEARCH_CONFIG}', text)", persisted=True)))
     
     # Связи
     chat = relationship("Chat", back_populates="messages")
     sender = relationship("User", back_populates="messages")
-    read_by = relationship("MessageRead", back_populates="message")
+    read_by = relationship(
+        "MessageRead",
+        primaryjoin="Message.id == foreign(MessageRead.message_id)",
+        back_populates="message",
+        viewonly=True
+    )
 
 class MessageRead(Base):
+    # Устаревшие отметки о прочтении по отдельным сообщениям; заменены ChatReadState.
+    # Внешнего ключа на messages нет: первичный ключ секционированной таблицы - (id, timestamp)
     __tablename__ = 'message_reads'
+    __table_args__ = (
+        Index('ix_message_reads_user_id_message_id', 'user_id', 'message_id', unique=True),
+        Index('ix_message_reads_message_id', 'message_id'),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    message_id = Column(UUID(as_uuid=True), ForeignKey('messages.id'), nullable=False)
+    message_id = Column(UUID(as_uuid=True), nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
     read_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     # Связи
-    message = relationship("Message", back_populates="read_by")
-    user = relationship("User") 
\ No newline at end of file
+    message = relationship(
+        "Message",
+        primaryjoin="foreign(MessageRead.message_id) == Message.id",
+        back_populates="read_by",
+        viewonly=True
+    )
+    user = relationship("User") 
+
+class ChatReadState(Base):
+    # Отметка "прочитано до": последнее прочитанное участником сообщение чата
+    __tablename__ = 'chat_read_states'
+    
+    chat_id = Column(UUID(as_uuid=True), ForeignKey('chats.id'), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), primary_key=True)
+    last_read_at = Column(DateTime, nullable=False)
+    last_read_message_id = Column(UUID(as_uuid=True), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,168 @@
+"""Помесячные секции таблицы messages.
+
+Секция messages_yYYYYmMM покрывает полуинтервал [начало месяца, начало
+следующего месяца). Строки вне созданных секций попадают в секцию по умолчанию
+messages_default, поэтому вставка не падает, даже если создание секций отстало.
+"""
+import asyncio
+import re
+from datetime import date, datetime
+from typing import List, Optional, Union
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.core.config import settings
+from app.core.logging import log_info, log_error
+
+PARENT_TABLE = "messages"
+DEFAULT_PARTITION = "messages_default"
+MESSAGE_COLUMNS = "id, chat_id, sender_id, text, timestamp, is_read"
+PARTITION_NAME = re.compile(r"^messages_y(\d{4})m(\d{2})$")
+
+def month_start(value: Union[date, datetime]) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def recent_window_start(now: Optional[datetime] = None) -> datetime:
+    """Нижняя граница timestamp для горячих запросов: начало самой старой
+    из MESSAGE_RECENT_MONTHS последних секций"""
+    return add_months(month_start(now or datetime.utcnow()), 1 - settings.MESSAGE_RECENT_MONTHS)
+
+def partition_name(month: datetime) -> str:
+    return f"messages_y{month.year:04d}m{month.month:02d}"
+
+def partition_month(name: str) -> Optional[datetime]:
+    """Начало месяца секции по ее имени; None для секции по умолчанию и чужих таблиц"""
+    match = PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1)
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    """messages уже секционирована (база создана до миграции - еще нет)"""
+    result = await conn.execute(
+        text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+            "JOIN pg_class ON pg_class.oid = pg_partitioned_table.partrelid "
+            "WHERE pg_class.relname = :parent AND pg_table_is_visible(pg_class.oid))"
+        ),
+        {"parent": PARENT_TABLE}
+    )
+    return result.scalar_one()
+
+async def list_partitions(conn: AsyncConnection) -> List[str]:
+    """Имена секций, подключенных к messages"""
+    result = await conn.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :parent AND pg_table_is_visible(parent.oid)"
+        ),
+        {"parent": PARENT_TABLE}
+    )
+    return sorted(row[0] for row in result)
+
+async def list_detached_partitions(conn: AsyncConnection) -> List[str]:
+    """Месячные таблицы, отключенные от messages, но еще не удаленные"""
+    result = await conn.execute(
+        text(
+            "SELECT relname FROM pg_class "
+            "WHERE relkind = 'r' AND NOT relispartition AND pg_table_is_visible(oid) "
+            "AND relname ~ '^messages_y[0-9]{4}m[0-9]{2}$'"
+        )
+    )
+    return sorted(row[0] for row in result)
+
+async def create_partition(conn: AsyncConnection, month: datetime):
+    """Создание секции месяца; строки этого месяца из секции по умолчанию переносятся в нее"""
+    name = partition_name(month)
+    bounds = {"lower": month, "upper": add_months(month, 1)}
+    in_range = "timestamp >= :lower AND timestamp < :upper"
+    create = text(
+        f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{bounds['lower'].isoformat()}') TO ('{bounds['upper'].isoformat()}')"
+    )
+    misplaced = (await conn.execute(
+        text(f"SELECT count(*) FROM {DEFAULT_PARTITION} WHERE {in_range}"), bounds
+    )).scalar_one()
+    if not misplaced:
+        await conn.execute(create)
+        return
+    # Пока в секции по умолчанию есть строки диапазона, новую секцию подключить
+    # нельзя: секция по умолчанию отключается на время переноса в той же транзакции
+    await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    await conn.execute(create)
+    await conn.execute(
+        text(
+            f"INSERT INTO {PARENT_TABLE} ({MESSAGE_COLUMNS}) "
+            f"SELECT {MESSAGE_COLUMNS} FROM {DEFAULT_PARTITION} WHERE {in_range}"
+        ),
+        bounds
+    )
+    await conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_range}"), bounds)
+    await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    log_info(f"Moved {misplaced} messages from {DEFAULT_PARTITION} to {name}")
+
+async def ensure_message_partitions(
+    conn: AsyncConnection,
+    start: Optional[Union[date, datetime]] = None,
+    months_ahead: Optional[int] = None
+) -> List[str]:
+    """Создание недостающих секций от месяца start (по умолчанию текущего)
+    до months_ahead месяцев вперед; возвращает имена созданных секций"""
+    if months_ahead is None:
+        months_ahead = settings.MESSAGE_PARTITIONS_AHEAD
+    current = month_start(datetime.utcnow())
+    month = month_start(start) if start is not None else current
+    last = add_months(current, months_ahead)
+    # Несколько процессов приложения не должны создавать одну секцию одновременно
+    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": PARENT_TABLE + "_partitions"})
+    await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+    existing = set(await list_partitions(conn))
+    created = []
+    while month <= last:
+        name = partition_name(month)
+        if name not in existing:
+            await create_partition(conn, month)
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+class PartitionMaintainer:
+    """Фоновое создание секций на будущие месяцы"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.worker: Optional[asyncio.Task] = None
+
+    def start(self, engine: AsyncEngine):
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._run(engine))
+
+    async def stop(self):
+        if self.worker is None:
+            return
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        self.worker = None
+
+    async def _run(self, engine: AsyncEngine):
+        while True:
+            try:
+                async with engine.begin() as conn:
+                    created = await ensure_message_partitions(conn)
+                if created:
+                    log_info(f"Created message partitions: {', '.join(created)}")
+            except Exception as e:
+                log_error(f"Message partition maintenance failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+partition_maintainer = PartitionMaintainer(settings.MESSAGE_PARTITION_CHECK_INTERVAL)
@@ -1,10 +1,21 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable, Set, Tuple
 from uuid import UUID
-from sqlalchemy import select, update, and_, insert
+from datetime import datetime
+from sqlalchemy import select, update, and_, or_, func, insert, tuple_, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import aliased, load_only, selectinload
 
-from app.db.models import User, Chat, Message, Group, MessageRead, ChatType, chat_members, group_members
+from app.core.pagination import Cursor, SearchCursor
+from app.schemas.user import CurrentUser
+from app.db.models import User, Chat, Message, Group, ChatReadState, ChatType, SEARCH_CONFIG, chat_members, group_members
+from app.db.partitions import recent_window_start
+
+# Профили загрузки: связи по умолчанию ленивые, каждый запрос явно указывает,
+# какие связи и колонки ему нужны
+USER_SUMMARY_COLUMNS = (User.id, User.name, User.email)
+CHAT_MEMBERS = selectinload(Chat.members).load_only(*USER_SUMMARY_COLUMNS)
+MESSAGE_SENDER = selectinload(Message.sender).load_only(*USER_SUMMARY_COLUMNS)
 
 class BaseRepository:
     def __init__(self, db: AsyncSession):
@@ -24,11 +35,31 @@ class UserRepository(BaseRepository):
         )
         return result.scalars().first()
     
+    async def get_principal(self, user_id: UUID) -> Optional[CurrentUser]:
+        # Только нужные для аутентификации колонки, без загрузки связей
+        result = await self.db.execute(
+            select(User.id, User.name, User.email).where(User.id == user_id)
+        )
+        row = result.first()
+        if row is None:
+            return None
+        return CurrentUser(id=row.id, name=row.name, email=row.email)
+    
     async def get_by_email(self, email: str) -> Optional[User]:
         result = await self.db.execute(
             select(User).where(User.email == email)
         )
         return result.scalars().first()
+    
+    async def update(self, user_id: UUID, **values) -> Optional[User]:
+        user = await self.get_by_id(user_id)
+        if user is None:
+            return None
+        for name, value in values.items():
+            setattr(user, name, value)
+        await self.db.commit()
+        await self.db.refresh(user)
+        return user
 
 class ChatRepository(BaseRepository):
     async def create_personal_chat(self, user_ids: List[UUID], name: Optional[str] = None) -> Chat:
@@ -51,7 +82,7 @@ class ChatRepository(BaseRepository):
         # Загружаем чат с участниками
         result = await self.db.execute(
             select(Chat)
-            .options(selectinload(Chat.members))
+            .options(CHAT_MEMBERS)
             .where(Chat.id == chat.id)
         )
         return result.scalars().first()
@@ -91,7 +122,7 @@ class ChatRepository(BaseRepository):
         # Загружаем чат с участниками
         result = await self.db.execute(
             select(Chat)
-            .options(selectinload(Chat.members))
+            .options(CHAT_MEMBERS)
             .options(selectinload(Chat.group))
             .where(Chat.id == chat.id)
         )
@@ -100,7 +131,7 @@ class ChatRepository(BaseRepository):
     async def get_chat_by_id(self, chat_id: UUID) -> Optional[Chat]:
         result = await self.db.execute(
             select(Chat)
-            .options(selectinload(Chat.members))
+            .options(CHAT_MEMBERS)
             .where(Chat.id == chat_id)
         )
         return result.scalars().first()
@@ -110,10 +141,36 @@ class ChatRepository(BaseRepository):
             select(Chat)
             .join(Chat.members)
             .where(User.id == user_id)
-            .options(selectinload(Chat.members))
+            .options(CHAT_MEMBERS)
+        )
+        return result.scalars().all()
+    
+    async def get_member_ids(self, chat_id: UUID) -> List[UUID]:
+        result = await self.db.execute(
+            select(chat_members.c.user_id)
+            .where(chat_members.c.chat_id == chat_id)
+        )
+        return result.scalars().all()
+    
+    async def get_user_chat_ids(self, user_id: UUID) -> List[UUID]:
+        result = await self.db.execute(
+            select(chat_members.c.chat_id)
+            .where(chat_members.c.user_id == user_id)
         )
         return result.scalars().all()
 
+    async def get_chat_ids_for_users(self, user_ids: Iterable[UUID]) -> Dict[UUID, Set[UUID]]:
+        """Чаты нескольких пользователей одним запросом: {user_id: {chat_id}}"""
+        user_ids = list(user_ids)
+        memberships: Dict[UUID, Set[UUID]] = {user_id: set() for user_id in user_ids}
+        result = await self.db.execute(
+            select(chat_members.c.user_id, chat_members.c.chat_id)
+            .where(chat_members.c.user_id.in_(user_ids))
+        )
+        for user_id, chat_id in result.all():
+            memberships[user_id].add(chat_id)
+        return memberships
+
 class MessageRepository(BaseRepository):
     async def create(self, chat_id: UUID, sender_id: UUID, text: str) -> Message:
         message = Message(chat_id=chat_id, sender_id=sender_id, text=text)
@@ -129,88 +186,274 @@ class MessageRepository(BaseRepository):
         return result.scalars().first()
     
     async def get_chat_history(self, chat_id: UUID, limit: int = 100, offset: int = 0) -> List[Message]:
+        # Сначала читаются только последние месячные секции; если страница в них
+        # не набралась, запрос повторяется по всей истории чата
+        messages = await self._chat_history(chat_id, limit, offset, recent_window_start())
+        if len(messages) < limit:
+            messages = await self._chat_history(chat_id, limit, offset)
+        return messages
+    
+    async def _chat_history(self, chat_id: UUID, limit: int, offset: int, since: Optional[datetime] = None) -> List[Message]:
+        statement = select(Message).where(Message.chat_id == chat_id)
+        if since is not None:
+            statement = statement.where(Message.timestamp >= since)
         result = await self.db.execute(
-            select(Message)
-            .where(Message.chat_id == chat_id)
-            .order_by(Message.timestamp.desc())
-            .options(selectinload(Message.sender))
+            statement
+            .order_by(Message.timestamp.desc(), Message.id.desc())
+            .options(MESSAGE_SENDER)
             .limit(limit)
             .offset(offset)
         )
         return result.scalars().all()
     
-    async def get_last_message(self, chat_id: UUID) -> Optional[Message]:
+    async def get_chat_history_before(self, chat_id: UUID, cursor: Cursor, limit: int = 100, inclusive: bool = False) -> List[Message]:
+        # Сообщения старше курсора, от новых к старым; отдельное условие на timestamp
+        # отсекает месячные секции новее курсора
+        position = tuple_(Message.timestamp, Message.id)
+        condition = position <= tuple_(*cursor) if inclusive else position < tuple_(*cursor)
         result = await self.db.execute(
             select(Message)
-            .where(Message.chat_id == chat_id)
-            .order_by(Message.timestamp.desc())
-            .options(selectinload(Message.sender))
-            .limit(1)
+            .where(Message.chat_id == chat_id, Message.timestamp <= cursor[0], condition)
+            .order_by(Message.timestamp.desc(), Message.id.desc())
+            .options(MESSAGE_SENDER)
+            .limit(limit)
         )
-        return result.scalars().first()
+        return result.scalars().all()
     
-    async def get_unread_count(self, chat_id: UUID, user_id: UUID) -> int:
-        # Получаем все сообщения в чате, которые не от текущего пользователя
-        messages_result = await self.db.execute(
+    async def get_chat_history_after(self, chat_id: UUID, cursor: Cursor, limit: int = 100) -> List[Message]:
+        # Сообщения новее курсора; выбираем по возрастанию и возвращаем от новых к старым.
+        # Условие на timestamp отсекает секции старше курсора
+        result = await self.db.execute(
             select(Message)
             .where(
-                and_(
-                    Message.chat_id == chat_id,
-                    Message.sender_id != user_id
-                )
+                Message.chat_id == chat_id,
+                Message.timestamp >= cursor[0],
+                tuple_(Message.timestamp, Message.id) > tuple_(*cursor)
             )
+            .order_by(Message.timestamp.asc(), Message.id.asc())
+            .options(MESSAGE_SENDER)
+            .limit(limit)
         )
-        messages = messages_result.scalars().all()
-        
+        return list(reversed(result.scalars().all()))
+    
+    async def search(
+        self,
+        user_id: UUID,
+        query: str,
+        chat_id: Optional[UUID] = None,
+        cursor: Optional[SearchCursor] = None,
+        limit: int = 50
+    ) -> List[Tuple[Message, float]]:
+        # Совпадения ищутся по GIN-индексу, доступ ограничен чатами пользователя
+        # соединением с chat_members в том же запросе
+        ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+        rank = func.ts_rank_cd(Message.search_vector, ts_query)
+        statement = (
+            select(Message, rank.label("rank"))
+            .join(
+                chat_members,
+                and_(chat_members.c.chat_id == Message.chat_id, chat_members.c.user_id == user_id)
+            )
+            .where(Message.search_vector.op("@@")(ts_query))
+            .order_by(rank.desc(), Message.timestamp.desc(), Message.id.desc())
+            .options(MESSAGE_SENDER)
+            .limit(limit)
+        )
+        if chat_id is not None:
+            statement = statement.where(Message.chat_id == chat_id)
+        if cursor is not None:
+            statement = statement.where(tuple_(rank, Message.timestamp, Message.id) < tuple_(*cursor))
+        result = await self.db.execute(statement)
+        return [(message, rank_value) for message, rank_value in result.all()]
+    
+    async def get_last_message(self, chat_id: UUID) -> Optional[Message]:
+        # Как и история: полный запрос нужен, только если в последних секциях сообщений нет
+        messages = await self._chat_history(chat_id, 1, 0, recent_window_start())
         if not messages:
-            return 0
-        
-        # Получаем ID прочитанных сообщений
-        read_messages_result = await self.db.execute(
-            select(MessageRead.message_id)
-            .where(MessageRead.user_id == user_id)
-            .where(MessageRead.message_id.in_([message.id for message in messages]))
+            messages = await self._chat_history(chat_id, 1, 0)
+        return messages[0] if messages else None
+    
+    async def get_unread_count(self, chat_id: UUID, user_id: UUID) -> int:
+        # Непрочитанные - чужие сообщения новее отметки "прочитано до"
+        read_state = aliased(ChatReadState)
+        result = await self.db.execute(
+            select(func.count())
+            .select_from(Message)
+            .outerjoin(
+                read_state,
+                and_(read_state.chat_id == Message.chat_id, read_state.user_id == user_id)
+            )
+            .where(
+                Message.chat_id == chat_id,
+                Message.sender_id != user_id,
+                or_(
+                    read_state.user_id.is_(None),
+                    tuple_(Message.timestamp, Message.id)
+                    > tuple_(read_state.last_read_at, read_state.last_read_message_id)
+                )
+            )
         )
-        read_message_ids = set(read_messages_result.scalars().all())
-        
-        # Считаем непрочитанные
-        unread_count = sum(1 for message in messages if message.id not in read_message_ids)
-        
-        return unread_count
+        return result.scalar_one()
     
-    async def mark_as_read(self, message_id: UUID, user_id: UUID) -> MessageRead:
-        message_read = MessageRead(message_id=message_id, user_id=user_id)
-        self.db.add(message_read)
-        
-        # Проверка, прочитали ли все участники чата сообщение
-        message = await self.get_by_id(message_id)
-        
-        if message:
-            chat = await self.db.execute(
-                select(Chat)
-                .options(selectinload(Chat.members))
-                .where(Chat.id == message.chat_id)
+    async def get_last_messages_for_user(self, user_id: UUID) -> Dict[UUID, Any]:
+        # Последнее сообщение каждого чата пользователя одним запросом (LATERAL по индексу)
+        # по последним месячным секциям; чаты без свежих сообщений дочитываются
+        # вторым запросом по всей истории
+        rows = await self._last_messages(chat_members.c.user_id == user_id, recent_window_start())
+        last_messages = {row.chat_id: row for row in rows if row.id is not None}
+        quiet = [row.chat_id for row in rows if row.id is None]
+        if quiet:
+            rows = await self._last_messages(
+                and_(chat_members.c.user_id == user_id, chat_members.c.chat_id.in_(quiet))
             )
-            chat = chat.scalars().first()
-            
-            if chat:
-                # Получаем всех, кто прочитал сообщение
-                read_by_result = await self.db.execute(
-                    select(MessageRead.user_id)
-                    .where(MessageRead.message_id == message_id)
+            last_messages.update((row.chat_id, row) for row in rows if row.id is not None)
+        return last_messages
+    
+    async def _last_messages(self, condition, since: Optional[datetime] = None) -> List[Any]:
+        # Строка возвращается для каждого чата; у чата без сообщений в окне поля сообщения пустые
+        statement = (
+            select(Message.id, Message.sender_id, Message.text, Message.timestamp, Message.is_read)
+            .where(Message.chat_id == chat_members.c.chat_id)
+        )
+        if since is not None:
+            statement = statement.where(Message.timestamp >= since)
+        last_message = (
+            statement
+            .order_by(Message.timestamp.desc(), Message.id.desc())
+            .limit(1)
+            .lateral()
+        )
+        result = await self.db.execute(
+            select(
+                chat_members.c.chat_id,
+                last_message.c.id,
+                last_message.c.sender_id,
+                User.name.label("sender_name"),
+                last_message.c.text,
+                last_message.c.timestamp,
+                last_message.c.is_read
+            )
+            .select_from(chat_members)
+            .outerjoin(last_message, true())
+            .outerjoin(User, User.id == last_message.c.sender_id)
+            .where(condition)
+        )
+        return result.all()
+    
+    async def get_unread_counts_for_user(self, user_id: UUID) -> Dict[UUID, int]:
+        # Количество непрочитанных по всем чатам пользователя одним сгруппированным запросом
+        read_state = aliased(ChatReadState)
+        result = await self.db.execute(
+            select(chat_members.c.chat_id, func.count(Message.id))
+            .select_from(chat_members)
+            .outerjoin(
+                read_state,
+                and_(
+                    read_state.chat_id == chat_members.c.chat_id,
+                    read_state.user_id == chat_members.c.user_id
                 )
-                read_by_user_ids = [r for r in read_by_result.scalars().all()]
-                
-                # Проверяем, все ли участники чата прочитали сообщение
-                all_read = all(user.id in read_by_user_ids for user in chat.members if user.id != message.sender_id)
-                
-                if all_read:
-                    await self.db.execute(
-                        update(Message)
-                        .where(Message.id == message_id)
-                        .values(is_read=True)
+            )
+            .join(
+                Message,
+                and_(
+                    Message.chat_id == chat_members.c.chat_id,
+                    Message.sender_id != user_id,
+                    or_(
+                        read_state.user_id.is_(None),
+                        tuple_(Message.timestamp, Message.id)
+                        > tuple_(read_state.last_read_at, read_state.last_read_message_id)
                     )
-        
+                )
+            )
+            .where(chat_members.c.user_id == user_id)
+            .group_by(chat_members.c.chat_id)
+        )
+        return {chat_id: count for chat_id, count in result.all()}
+    
+    async def get_read_state(self, chat_id: UUID, user_id: UUID) -> Optional[ChatReadState]:
+        result = await self.db.execute(
+            select(ChatReadState)
+            .where(ChatReadState.chat_id == chat_id, ChatReadState.user_id == user_id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalars().first()
+    
+    async def mark_read_up_to(self, chat_id: UUID, user_id: UUID, timestamp: datetime, message_id: UUID) -> Tuple[ChatReadState, List[UUID]]:
+        # Отметка только сдвигается вперед: более старое сообщение ее не уменьшает;
+        # вместе с отметкой возвращаются ID сообщений, ставших прочитанными
+        result = await self.db.execute(
+            select(ChatReadState.last_read_at, ChatReadState.last_read_message_id)
+            .where(ChatReadState.chat_id == chat_id, ChatReadState.user_id == user_id)
+            .with_for_update()
+        )
+        previous = result.first()
+        now = datetime.utcnow()
+        statement = pg_insert(ChatReadState).values(
+            chat_id=chat_id,
+            user_id=user_id,
+            last_read_at=timestamp,
+            last_read_message_id=message_id,
+            updated_at=now
+        )
+        result = await self.db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[ChatReadState.chat_id, ChatReadState.user_id],
+                set_={
+                    "last_read_at": statement.excluded.last_read_at,
+                    "last_read_message_id": statement.excluded.last_read_message_id,
+                    "updated_at": statement.excluded.updated_at
+                },
+                where=tuple_(ChatReadState.last_read_at, ChatReadState.last_read_message_id)
+                < tuple_(statement.excluded.last_read_at, statement.excluded.last_read_message_id)
+            )
+            .returning(ChatReadState.user_id)
+        )
+        # Без сдвига отметки флаги is_read не меняются
+        read_ids = []
+        if result.first() is not None:
+            read_ids = await self._refresh_is_read(chat_id, user_id, previous, (timestamp, message_id))
         await self.db.commit()
-        await self.db.refresh(message_read)
-        return message_read 
\ No newline at end of file
+        return await self.get_read_state(chat_id, user_id), read_ids
+    
+    async def _refresh_is_read(self, chat_id: UUID, user_id: UUID, previous: Optional[Cursor], current: Cursor) -> List[UUID]:
+        # Сдвиг отметки пользователя затрагивает только чужие сообщения между прежней и новой
+        # отметкой; сообщение прочитано, если отметки всех участников, кроме отправителя, не старше него
+        read_state = aliased(ChatReadState)
+        unread_member = (
+            select(chat_members.c.user_id)
+            .outerjoin(
+                read_state,
+                and_(
+                    read_state.chat_id == chat_members.c.chat_id,
+                    read_state.user_id == chat_members.c.user_id
+                )
+            )
+            .where(
+                chat_members.c.chat_id == chat_id,
+                chat_members.c.user_id != Message.sender_id,
+                or_(
+                    read_state.user_id.is_(None),
+                    tuple_(read_state.last_read_at, read_state.last_read_message_id)
+                    < tuple_(Message.timestamp, Message.id)
+                )
+            )
+            .exists()
+        )
+        position = tuple_(Message.timestamp, Message.id)
+        conditions = [
+            Message.chat_id == chat_id,
+            Message.sender_id != user_id,
+            Message.is_read.is_(False),
+            Message.timestamp <= current[0],
+            position <= tuple_(*current)
+        ]
+        if previous is not None:
+            conditions += [Message.timestamp >= previous[0], position > tuple_(*previous)]
+        result = await self.db.execute(
+            update(Message)
+            .where(*conditions, ~unread_member)
+            .values(is_read=True)
+            .returning(Message.id)
+            .execution_options(synchronize_session=False)
+        )
+        return result.scalars().all()
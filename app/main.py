@@ -1,4 +1,5 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
@@ -6,16 +7,24 @@ from uuid import UUID
 from typing import List, Dict, Any, Optional
 
 from app.core.config import settings
-from app.db.base import get_db, init_db
+from app.core.responses import FastJSONResponse
+from app.core.encoding import orjson
+from app.db.base import engine, get_db, init_db
+from app.db.partitions import partition_maintainer
 from app.services.user_service import UserService
 from app.services.chat_service import ChatService
 from app.services.message_service import MessageService
-from app.schemas.user import UserCreate, UserLogin, TokenResponse, UserResponse
+from app.services.message_ingestion import ingestor, IngestorStopped
+from app.schemas.user import UserCreate, UserLogin, UserUpdate, PasswordChange, TokenResponse, UserResponse
 from app.schemas.chat import ChatCreate, GroupChatCreate, ChatResponse, ChatWithLastMessageResponse
-from app.core.security import get_current_user
+from app.core.security import get_current_user, principal_cache, PasswordHashingBusy
+from app.services.membership import membership_cache
+from app.services.recent_messages import recent_messages
+from app.core.logging import log_warning
 from app.api import history, websockets
 
-app = FastAPI(title=settings.PROJECT_NAME)
+# Ответы сериализуются orjson; крупные списки отдаются в обход проверки по response_model
+app = FastAPI(title=settings.PROJECT_NAME, default_response_class=FastJSONResponse)
 
 # CORS настройки
 app.add_middleware(
@@ -26,6 +35,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Перегрузка пула хэширования паролей: клиенту предлагается повторить позже
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Сервер перегружен, повторите попытку позже"},
+        headers={"Retry-After": "1"},
+    )
+
+# Прием сообщений остановлен при завершении работы процесса
+@app.exception_handler(IngestorStopped)
+async def ingestor_stopped_handler(request: Request, exc: IngestorStopped):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Сервер завершает работу, повторите попытку позже"},
+        headers={"Retry-After": "1"},
+    )
+
 # API роутер
 api_router = APIRouter(prefix=settings.API_V1_STR)
 
@@ -33,6 +60,18 @@ api_router = APIRouter(prefix=settings.API_V1_STR)
 @app.on_event("startup")
 async def startup_db_client():
     await init_db()
+    if orjson is None:
+        log_warning("orjson is not installed: REST responses and WebSocket frames use the slower standard json encoder")
+    if settings.RECENT_MESSAGES_ENABLED and not recent_messages.enabled:
+        log_warning("Recent messages buffer disabled: several workers require BROKER_BACKEND=postgres")
+    partition_maintainer.start(engine)
+    await websockets.manager.start()
+
+@app.on_event("shutdown")
+async def shutdown_broker():
+    await ingestor.stop()
+    await websockets.manager.stop()
+    await partition_maintainer.stop()
 
 # Auth endpoints
 @api_router.post("/auth/register", response_model=UserResponse)
@@ -65,6 +104,43 @@ async def login_for_access_token(login_data: UserLogin, db: AsyncSession = Depen
     
     return result
 
+# User endpoints
+@api_router.patch("/users/me", response_model=UserResponse)
+async def update_current_user(
+    user_data: UserUpdate,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Изменение имени или email текущего пользователя"""
+    service = UserService(db)
+    result = await service.update_user(current_user.id, user_data)
+    
+    if "error" in result:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=result["error"]
+        )
+    
+    return result
+
+@api_router.put("/users/me/password")
+async def change_password(
+    password_data: PasswordChange,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Смена пароля текущего пользователя"""
+    service = UserService(db)
+    result = await service.change_password(current_user.id, password_data)
+    
+    if "error" in result:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=result["error"]
+        )
+    
+    return result
+
 # Chat endpoints
 @api_router.post("/chats/personal", response_model=ChatResponse)
 async def create_personal_chat(
@@ -85,6 +161,7 @@ async def create_personal_chat(
             detail=result["error"]
         )
     
+    await websockets.manager.add_chat_members(result["id"], [member["id"] for member in result["members"]])
     return result
 
 @api_router.post("/chats/group", response_model=ChatResponse)
@@ -106,6 +183,7 @@ async def create_group_chat(
             detail=result["error"]
         )
     
+    await websockets.manager.add_chat_members(result["id"], [member["id"] for member in result["members"]])
     return result
 
 @api_router.get("/chats", response_model=List[ChatResponse])
@@ -116,7 +194,7 @@ async def get_user_chats(
     """Получение списка чатов пользователя"""
     service = ChatService(db)
     result = await service.get_user_chats(user_id=current_user.id)
-    return result
+    return FastJSONResponse(result)
 
 @api_router.get("/chats/with-last-message", response_model=List[ChatWithLastMessageResponse])
 async def get_user_chats_with_last_message(
@@ -126,7 +204,7 @@ async def get_user_chats_with_last_message(
     """Получение списка чатов пользователя с последними сообщениями и статусом прочтения"""
     service = ChatService(db)
     result = await service.get_user_chats_with_last_message(user_id=current_user.id)
-    return result
+    return FastJSONResponse(result)
 
 @api_router.get("/chats/{chat_id}", response_model=ChatResponse)
 async def get_chat_by_id(
@@ -150,7 +228,7 @@ async def get_chat_by_id(
             detail=result["error"]
         )
     
-    return result
+    return FastJSONResponse(result)
 
 # Подключение API роутеров
 api_router.include_router(history.router, prefix="/chats", tags=["messages"])
@@ -174,7 +252,21 @@ def websocket_info():
             {
                 "path": "/ws/user",
                 "params": ["token"],
-                "description": "WebSocket соединение для получения всех сообщений пользователя. Токен нужно передавать как query-параметр."
+                "description": "WebSocket соединение для получения всех сообщений пользователя. Принимает кадры subscribe, unsubscribe, send и read с полем chat_id. Токен нужно передавать как query-параметр."
             }
         ]
-    } 
\ No newline at end of file
+    }
+
+@app.get("/ws-stats")
+def websocket_stats():
+    """Состояние исходящих очередей WebSocket соединений"""
+    return websockets.manager.get_stats()
+
+@app.get("/cache-stats")
+def cache_stats():
+    """Размер и доля попаданий кэшей аутентификации, участников чатов и последних сообщений"""
+    return {
+        "auth": principal_cache.stats(),
+        "membership": membership_cache.stats(),
+        "recent_messages": recent_messages.stats()
+    }
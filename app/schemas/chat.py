@@ -1,5 +1,5 @@
 from typing import List, Optional
-from pydantic import BaseModel, UUID4
+from pydantic import BaseModel, ConfigDict, UUID4
 from enum import Enum
 from datetime import datetime
 
@@ -25,8 +25,7 @@ class ChatResponse(ChatBase):
     id: UUID4
     members: List[UserResponse]
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class LastMessageInfo(BaseModel):
     id: UUID4
@@ -40,5 +39,4 @@ class ChatWithLastMessageResponse(ChatResponse):
     last_message: Optional[LastMessageInfo] = None
     unread_count: int = 0
     
-    class Config:
-        orm_mode = True 
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True) 
\ No newline at end of file
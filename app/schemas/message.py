@@ -1,5 +1,5 @@
 from typing import Optional, List
-from pydantic import BaseModel, UUID4
+from pydantic import BaseModel, ConfigDict, UUID4
 from datetime import datetime
 
 from app.schemas.user import UserResponse
@@ -18,13 +18,44 @@ class MessageResponse(MessageBase):
     timestamp: datetime
     is_read: bool
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ChatHistoryParams(BaseModel):
     limit: Optional[int] = 100
     offset: Optional[int] = 0
+    # Курсоры постраничного чтения; допускается только один из них
+    before: Optional[str] = None
+    after: Optional[str] = None
+    around: Optional[str] = None
 
 class ChatHistoryResponse(BaseModel):
     messages: List[MessageResponse]
-    total: int 
\ No newline at end of file
+    total: int
+    # Курсор для загрузки более старых сообщений (параметр before)
+    next_cursor: Optional[str] = None
+    # Курсор для загрузки более новых сообщений (параметр after)
+    prev_cursor: Optional[str] = None 
+
+class MessageSearchParams(BaseModel):
+    q: str
+    limit: Optional[int] = 50
+    # Курсор следующей страницы результатов (next_cursor предыдущего ответа)
+    cursor: Optional[str] = None
+
+class MessageSearchResult(MessageResponse):
+    rank: float
+
+class MessageSearchResponse(BaseModel):
+    messages: List[MessageSearchResult]
+    total: int
+    next_cursor: Optional[str] = None
+
+class ChatReadRequest(BaseModel):
+    # Если не указано, чат отмечается прочитанным до последнего сообщения
+    message_id: Optional[UUID4] = None
+
+class ChatReadResponse(BaseModel):
+    chat_id: UUID4
+    user_id: UUID4
+    last_read_message_id: Optional[UUID4] = None
+    read_at: Optional[datetime] = None
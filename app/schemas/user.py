@@ -1,5 +1,5 @@
 from typing import Optional
-from pydantic import BaseModel, EmailStr, UUID4
+from pydantic import BaseModel, EmailStr, UUID4, ConfigDict
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -13,11 +13,18 @@ class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
+class UserUpdate(BaseModel):
+    email: Optional[EmailStr] = None
+    name: Optional[str] = None
+
+class PasswordChange(BaseModel):
+    current_password: str
+    new_password: str
+
 class UserResponse(UserBase):
     id: UUID4
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class Token(BaseModel):
     access_token: str
@@ -28,4 +35,12 @@ class TokenResponse(Token):
     name: str
 
 class TokenData(BaseModel):
-    user_id: Optional[str] = None 
\ No newline at end of file
+    user_id: Optional[str] = None 
+
+class CurrentUser(BaseModel):
+    # Облегченные данные аутентифицированного пользователя без связей ORM
+    model_config = ConfigDict(frozen=True)
+    
+    id: UUID4
+    name: str
+    email: str
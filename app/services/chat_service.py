@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.repositories import ChatRepository, UserRepository, MessageRepository
 from app.schemas.chat import ChatCreate, GroupChatCreate
+from app.services.membership import is_chat_member, remember_chat_members
 
 class ChatService:
     def __init__(self, db: AsyncSession):
@@ -22,6 +23,7 @@ class ChatService:
         
         # Создаем личный чат
         chat = await self.repository.create_personal_chat(member_ids, chat_data.name)
+        remember_chat_members(chat.id, [member.id for member in chat.members])
         
         return {
             "id": chat.id,
@@ -48,6 +50,7 @@ class ChatService:
             creator_id=creator_id,
             member_ids=chat_data.member_ids
         )
+        remember_chat_members(chat.id, [member.id for member in chat.members])
         
         return {
             "id": chat.id,
@@ -70,19 +73,21 @@ class ChatService:
     async def get_user_chats_with_last_message(self, user_id: UUID) -> List[Dict[str, Any]]:
         # Получаем все чаты пользователя
         chats = await self.repository.get_user_chats(user_id)
+        # Последние сообщения и счетчики непрочитанных - по одному запросу на все чаты
+        last_messages = await self.message_repository.get_last_messages_for_user(user_id)
+        unread_counts = await self.message_repository.get_unread_counts_for_user(user_id)
         result = []
         
         for chat in chats:
-            # Получаем последнее сообщение в чате
-            last_message = await self.message_repository.get_last_message(chat.id)
-            # Получаем количество непрочитанных сообщений
-            unread_count = await self.message_repository.get_unread_count(chat.id, user_id)
+            last_message = last_messages.get(chat.id)
+            unread_count = unread_counts.get(chat.id, 0)
             
             chat_data = {
                 "id": chat.id,
                 "name": chat.name,
                 "type": chat.type.value,
                 "members": [{"id": member.id, "name": member.name, "email": member.email} for member in chat.members],
+                "last_message": None,
                 "unread_count": unread_count
             }
             
@@ -90,7 +95,7 @@ class ChatService:
                 chat_data["last_message"] = {
                     "id": last_message.id,
                     "sender_id": last_message.sender_id,
-                    "sender_name": last_message.sender.name,
+                    "sender_name": last_message.sender_name,
                     "text": last_message.text,
                     "timestamp": last_message.timestamp,
                     "is_read": last_message.is_read
@@ -107,8 +112,11 @@ class ChatService:
         if not chat:
             return None
         
+        member_ids = [member.id for member in chat.members]
+        remember_chat_members(chat.id, member_ids)
+        
         # Проверяем, что пользователь является участником чата
-        if user_id not in [member.id for member in chat.members]:
+        if user_id not in member_ids:
             return {"error": "У вас нет доступа к этому чату"}
         
         return {
@@ -116,4 +124,8 @@ class ChatService:
             "name": chat.name,
             "type": chat.type.value,
             "members": [{"id": member.id, "name": member.name, "email": member.email} for member in chat.members]
-        } 
\ No newline at end of file
+        } 
+    
+    async def is_member(self, chat_id: UUID, user_id: UUID) -> Optional[bool]:
+        # Проверка доступа без загрузки чата; None, если чат не найден
+        return await is_chat_member(self.db, chat_id, user_id)
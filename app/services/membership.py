@@ -0,0 +1,47 @@
+from typing import FrozenSet, Iterable, Optional
+from uuid import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.repositories import ChatRepository
+
+# Кэш участников чатов: {chat_id: frozenset(user_id)}
+membership_cache = TTLCache(
+    maxsize=settings.MEMBERSHIP_CACHE_SIZE,
+    ttl=settings.MEMBERSHIP_CACHE_TTL
+)
+
+async def get_chat_member_ids(db: AsyncSession, chat_id: UUID) -> Optional[FrozenSet[UUID]]:
+    """ID участников чата; None, если чат не найден"""
+    member_ids = membership_cache.get(chat_id)
+    if member_ids is None:
+        loaded = await ChatRepository(db).get_member_ids(chat_id)
+        # У существующего чата всегда есть участники, пустой результат не кэшируем
+        if not loaded:
+            return None
+        member_ids = frozenset(loaded)
+        membership_cache.set(chat_id, member_ids)
+    return member_ids
+
+async def is_chat_member(db: AsyncSession, chat_id: UUID, user_id: UUID) -> Optional[bool]:
+    """Проверка участия пользователя в чате; None, если чат не найден"""
+    member_ids = await get_chat_member_ids(db, chat_id)
+    if member_ids is None:
+        return None
+    return user_id in member_ids
+
+def remember_chat_members(chat_id: UUID, member_ids: Iterable[UUID]):
+    """Запись уже загруженного состава чата в кэш"""
+    membership_cache.set(chat_id, frozenset(member_ids))
+
+def apply_member_changes(chat_id: UUID, added: Iterable[UUID] = (), removed: Iterable[UUID] = ()):
+    """Сброс кэша после изменения состава чата, если кэш еще не отражает изменение.
+
+    Процесс, создавший чат, уже записал его состав через remember_chat_members;
+    событие брокера о тех же участниках не должно стирать эту запись.
+    """
+    cached = membership_cache.get(chat_id)
+    if cached is not None and cached.issuperset(added) and cached.isdisjoint(removed):
+        return
+    membership_cache.invalidate(chat_id)
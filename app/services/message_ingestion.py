@@ -0,0 +1,178 @@
+import asyncio
+import uuid
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.core.logging import log_error
+from app.db.base import async_session
+from app.db.models import Message
+
+# Элемент очереди: данные сообщения и future, которое получит сохраненную строку
+PendingMessage = Tuple[dict, asyncio.Future]
+
+# Метка конца очереди: фоновая задача записывает накопленный пакет и завершается
+_STOP = object()
+
+class IngestorStopped(RuntimeError):
+    """Прием сообщений остановлен"""
+
+class MessageIngestor:
+    """Пакетная запись входящих сообщений с групповым коммитом.
+
+    Сообщения от всех соединений собираются в течение короткого окна или до
+    заполнения пакета и записываются одним многострочным INSERT ... RETURNING
+    в одной транзакции. Отправитель получает результат только после коммита.
+    """
+
+    def __init__(self, session_factory=async_session, window_ms: Optional[float] = None, batch_size: Optional[int] = None):
+        self.session_factory = session_factory
+        self.window = (settings.INGEST_BATCH_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self.batch_size = settings.INGEST_BATCH_SIZE if batch_size is None else batch_size
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        # После stop новые сообщения не принимаются
+        self.closing = False
+        # Статистика пакетной записи
+        self.batches = 0
+        self.rows = 0
+
+    def _ensure_worker(self):
+        # Очередь создается один раз: перезапуск задачи не теряет уже поставленные сообщения
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._run())
+
+    async def submit(self, chat_id: UUID, sender_id: UUID, text: str) -> Any:
+        """Постановка сообщения в пакет; возвращает строку после фиксации транзакции"""
+        if self.closing:
+            raise IngestorStopped("Message ingestor is stopped")
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        values = {
+            "id": uuid.uuid4(),
+            "chat_id": chat_id,
+            "sender_id": sender_id,
+            "text": text,
+            "timestamp": datetime.utcnow(),
+            "is_read": False
+        }
+        await self.queue.put((values, future))
+        return await future
+
+    async def stop(self):
+        """Запись оставшихся сообщений и остановка фоновой задачи.
+
+        Задача не отменяется посреди записи: метка конца очереди ставится после
+        уже принятых сообщений, и задача завершается, записав их.
+        """
+        self.closing = True
+        if self.worker is None:
+            return
+        if not self.worker.done():
+            await self.queue.put(_STOP)
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            # Отменена сама задача записи, а не вызов stop
+            if not self.worker.cancelled():
+                raise
+        except Exception as e:
+            log_error(f"Message ingestor worker failed: {str(e)}")
+        finally:
+            self.worker = None
+            # Сообщения, которые задача не успела записать, получают ошибку, а не зависают
+            self._fail_pending(IngestorStopped("Message ingestor is stopped"))
+
+    def _fail_pending(self, error: Exception):
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not _STOP:
+                self._fail([item], error)
+
+    @staticmethod
+    def _fail(batch: List[PendingMessage], error: BaseException):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = loop.time() + self.window
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await self._flush(batch)
+            except BaseException as e:
+                # Отправители пакета не должны ждать вечно, в том числе при отмене задачи
+                self._fail(batch, e if isinstance(e, Exception) else IngestorStopped("Message ingestor is stopped"))
+                raise
+
+    async def _flush(self, batch: List[PendingMessage]):
+        try:
+            rows = await self._insert([values for values, _ in batch])
+        except Exception as e:
+            # Ошибка одной строки не должна отклонять весь пакет: пишем по одной
+            log_error(f"Batch insert of {len(batch)} messages failed, retrying one by one: {str(e)}")
+            for values, future in batch:
+                try:
+                    row = (await self._insert([values]))[0]
+                except Exception as row_error:
+                    if not future.done():
+                        future.set_exception(row_error)
+                    continue
+                if not future.done():
+                    future.set_result(row)
+            return
+
+        self.batches += 1
+        self.rows += len(rows)
+        by_id = {row.id: row for row in rows}
+        for values, future in batch:
+            if future.done():
+                continue
+            row = by_id.get(values["id"])
+            if row is None:
+                future.set_exception(RuntimeError("Inserted message row was not returned"))
+            else:
+                future.set_result(row)
+
+    async def _insert(self, values: List[dict]) -> List[Any]:
+        async with self.session_factory() as session:
+            result = await session.execute(
+                insert(Message)
+                .values(values)
+                .returning(
+                    Message.id,
+                    Message.chat_id,
+                    Message.sender_id,
+                    Message.text,
+                    Message.timestamp,
+                    Message.is_read
+                )
+            )
+            rows = result.all()
+            await session.commit()
+            return rows
+
+ingestor = MessageIngestor()
@@ -0,0 +1,105 @@
+"""Архивация старых секций сообщений.
+
+Секции месяцев старше срока хранения отключаются от messages, выгружаются
+в сжатый CSV (<archive-dir>/messages_yYYYYmMM.csv.gz) и удаляются. Таблица
+удаляется только после того, как число строк в архиве совпало с числом строк
+в секции; прерванный запуск продолжается следующим со стадии выгрузки.
+
+Запуск (например, раз в сутки из cron):
+    python -m app.services.message_retention --retention-months 12 --archive-dir /var/lib/messenger/archive
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.logging import log_info
+from app.db.base import engine
+from app.db.partitions import (
+    PARENT_TABLE, add_months, list_detached_partitions, list_partitions, month_start, partition_month
+)
+
+ARCHIVE_COLUMNS = ["id", "chat_id", "sender_id", "text", "timestamp", "is_read"]
+
+def expired_partitions(names: List[str], cutoff: datetime) -> List[str]:
+    """Месячные секции, целиком лежащие раньше cutoff"""
+    return [name for name in names if partition_month(name) is not None and add_months(partition_month(name), 1) <= cutoff]
+
+async def _export(name: str, path: Path) -> int:
+    """Выгрузка таблицы в gzip CSV через COPY; возвращает число строк"""
+    tmp_path = path.with_name(path.name + ".part")
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        with gzip.open(tmp_path, "wb") as archive:
+            async def write(chunk: bytes):
+                archive.write(chunk)
+            await raw.driver_connection.copy_from_table(
+                name, columns=ARCHIVE_COLUMNS, output=write, format="csv", header=True
+            )
+        rows = (await conn.execute(text(f"SELECT count(*) FROM {name}"))).scalar_one()
+    with gzip.open(tmp_path, "rt", encoding="utf-8", newline="") as archive:
+        # Заголовок не считается; переводы строк внутри текста CSV берет в кавычки
+        archived = sum(1 for _ in csv.reader(archive)) - 1
+    if archived != rows:
+        tmp_path.unlink()
+        raise RuntimeError(f"Archive of {name} has {archived} rows, table has {rows}")
+    os.replace(tmp_path, path)
+    return rows
+
+async def archive_expired_partitions(
+    retention_months: int, archive_dir: Path, dry_run: bool = False
+) -> List[Dict[str, Any]]:
+    """Отключение, выгрузка и удаление секций старше retention_months месяцев"""
+    cutoff = add_months(month_start(datetime.utcnow()), -retention_months)
+    async with engine.connect() as conn:
+        attached = expired_partitions(await list_partitions(conn), cutoff)
+        # Отключенные ранее таблицы остались от прерванного запуска
+        detached = expired_partitions(await list_detached_partitions(conn), cutoff)
+    if dry_run:
+        return [{"partition": name, "detached": name in detached} for name in attached + detached]
+
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    report = []
+    for name in attached:
+        # После отключения секция не видна запросам к messages; обычный DETACH
+        # (а не CONCURRENTLY) нужен из-за секции по умолчанию и держит блокировку недолго
+        async with engine.begin() as conn:
+            await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        log_info(f"Detached message partition {name}")
+    for name in sorted(attached + detached):
+        path = archive_dir / f"{name}.csv.gz"
+        rows = await _export(name, path)
+        async with engine.begin() as conn:
+            # Устаревшие отметки о прочтении ссылаются на удаляемые сообщения
+            reads = await conn.execute(
+                text(f"DELETE FROM message_reads USING {name} WHERE message_reads.message_id = {name}.id")
+            )
+            await conn.execute(text(f"DROP TABLE {name}"))
+        log_info(f"Archived message partition {name}: {rows} rows to {path}")
+        report.append({"partition": name, "rows": rows, "message_reads": reads.rowcount, "archive": str(path)})
+    return report
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--retention-months", type=int, default=settings.MESSAGE_RETENTION_MONTHS)
+    parser.add_argument("--archive-dir", type=Path, default=Path(settings.MESSAGE_ARCHIVE_DIR))
+    parser.add_argument("--dry-run", action="store_true", help="только показать секции для архивации")
+    args = parser.parse_args()
+
+    engine.sync_engine.echo = False
+    try:
+        report = await archive_expired_partitions(args.retention_months, args.archive_dir, args.dry_run)
+    finally:
+        await engine.dispose()
+    for row in report:
+        print(row)
+
+if __name__ == "__main__":
+    asyncio.run(main())
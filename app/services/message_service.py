@@ -1,41 +1,67 @@
+from datetime import datetime
 from typing import List, Dict, Any, Optional
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.repositories import MessageRepository, ChatRepository
+from app.core.config import settings
+from app.core.pagination import Cursor, encode_cursor, decode_cursor, encode_search_cursor, decode_search_cursor
+from app.db.repositories import MessageRepository, ChatRepository, UserRepository
 from app.schemas.message import MessageCreate
+from app.services.membership import is_chat_member
+from app.services.message_ingestion import ingestor
+from app.services.recent_messages import recent_messages
+
+def _message_dict(message) -> Dict[str, Any]:
+    """Представление сообщения с отправителем для ответов API и буфера"""
+    return {
+        "id": message.id,
+        "chat_id": message.chat_id,
+        "sender_id": message.sender_id,
+        "sender": {
+            "id": message.sender.id,
+            "name": message.sender.name,
+            "email": message.sender.email
+        },
+        "text": message.text,
+        "timestamp": message.timestamp,
+        "is_read": message.is_read
+    }
 
 class MessageService:
     def __init__(self, db: AsyncSession):
         self.db = db
         self.repository = MessageRepository(db)
         self.chat_repository = ChatRepository(db)
+        self.user_repository = UserRepository(db)
     
-    async def create_message(self, sender_id: UUID, message_data: MessageCreate) -> Dict[str, Any]:
-        # Проверяем, существует ли чат
-        chat = await self.chat_repository.get_chat_by_id(message_data.chat_id)
-        if not chat:
+    async def create_message(self, sender_id: UUID, message_data: MessageCreate, sender: Optional[Any] = None) -> Dict[str, Any]:
+        # Проверяем, существует ли чат и является ли отправитель его участником (по кэшу)
+        is_member = await is_chat_member(self.db, message_data.chat_id, sender_id)
+        if is_member is None:
             return {"error": "Чат не найден"}
         
-        # Проверяем, является ли отправитель участником чата
-        if sender_id not in [member.id for member in chat.members]:
+        if not is_member:
             return {"error": "Вы не являетесь участником этого чата"}
         
-        # Создаем сообщение
-        message = await self.repository.create(
-            chat_id=message_data.chat_id,
-            sender_id=sender_id,
-            text=message_data.text
-        )
+        # Создаем сообщение; при пакетной записи ответ приходит после коммита пакета
+        if settings.INGEST_BATCHING:
+            message = await ingestor.submit(
+                chat_id=message_data.chat_id,
+                sender_id=sender_id,
+                text=message_data.text
+            )
+        else:
+            message = await self.repository.create(
+                chat_id=message_data.chat_id,
+                sender_id=sender_id,
+                text=message_data.text
+            )
         
-        # Получаем данные отправителя
-        sender = None
-        for member in chat.members:
-            if member.id == sender_id:
-                sender = member
-                break
+        # Данные отправителя передает вызывающий код (уже аутентифицированный пользователь)
+        if sender is None:
+            sender = await self.user_repository.get_by_id(sender_id)
         
-        return {
+        result = {
             "id": message.id,
             "chat_id": message.chat_id,
             "sender_id": message.sender_id,
@@ -48,43 +74,174 @@ class MessageService:
             "timestamp": message.timestamp,
             "is_read": message.is_read
         }
+        recent_messages.append(message_data.chat_id, result)
+        return result
     
-    async def get_chat_history(self, chat_id: UUID, user_id: UUID, limit: int = 100, offset: int = 0) -> Dict[str, Any]:
-        # Проверяем, существует ли чат
-        chat = await self.chat_repository.get_chat_by_id(chat_id)
-        if not chat:
+    async def get_chat_history(
+        self,
+        chat_id: UUID,
+        user_id: UUID,
+        limit: int = 100,
+        offset: int = 0,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        around: Optional[str] = None
+    ) -> Dict[str, Any]:
+        if sum(cursor is not None for cursor in (before, after, around)) > 1:
+            return {"error": "Допускается только один из параметров before, after, around"}
+        try:
+            before_cursor = decode_cursor(before)
+            after_cursor = decode_cursor(after)
+            around_cursor = decode_cursor(around)
+        except ValueError as e:
+            return {"error": str(e)}
+        
+        # Проверяем, существует ли чат и является ли пользователь его участником
+        is_member = await is_chat_member(self.db, chat_id, user_id)
+        if is_member is None:
             return {"error": "Чат не найден"}
         
-        # Проверяем, является ли пользователь участником чата
-        if user_id not in [member.id for member in chat.members]:
+        if not is_member:
             return {"error": "Вы не являетесь участником этого чата"}
         
-        # Получаем историю сообщений
-        messages = await self.repository.get_chat_history(chat_id, limit, offset)
+        # Получаем историю сообщений; лишняя запись показывает, есть ли следующая страница.
+        # Первая страница и догрузка новых сообщений по возможности берутся из буфера в памяти
+        has_older = has_newer = False
+        if before_cursor:
+            messages = await self.repository.get_chat_history_before(chat_id, before_cursor, limit + 1)
+            messages = [_message_dict(message) for message in messages]
+            has_older = len(messages) > limit
+            messages = messages[:limit]
+            has_newer = True
+        elif after_cursor:
+            messages = await self._history_after(chat_id, after_cursor, limit)
+            has_newer = len(messages) > limit
+            messages = messages[-limit:] if limit else []
+            has_older = True
+        elif around_cursor:
+            older_limit = (limit + 1) // 2
+            newer_limit = limit - older_limit
+            older = await self.repository.get_chat_history_before(chat_id, around_cursor, older_limit + 1, inclusive=True)
+            newer = await self.repository.get_chat_history_after(chat_id, around_cursor, newer_limit + 1)
+            has_older = len(older) > older_limit
+            has_newer = len(newer) > newer_limit
+            messages = [
+                _message_dict(message)
+                for message in (newer[-newer_limit:] if newer_limit else []) + older[:older_limit]
+            ]
+        else:
+            messages = recent_messages.latest(chat_id, limit) if offset == 0 else None
+            if messages is None:
+                messages = await self._load_latest(chat_id, limit, offset)
+            has_older = len(messages) > limit
+            messages = messages[:limit]
+            has_newer = offset > 0
         
-        # Помечаем сообщения как прочитанные
-        for message in messages:
-            if message.sender_id != user_id and not message.is_read:
-                await self.repository.mark_as_read(message.id, user_id)
+        # Сдвигаем отметку "прочитано до" на самое новое сообщение страницы, если на ней
+        # есть чужие сообщения новее отметки пользователя
+        if await self._has_unread(chat_id, user_id, messages):
+            newest = messages[0]
+            await self._mark_read_up_to(chat_id, user_id, newest["timestamp"], newest["id"])
         
         return {
-            "messages": [
-                {
-                    "id": message.id,
-                    "chat_id": message.chat_id,
-                    "sender_id": message.sender_id,
-                    "sender": {
-                        "id": message.sender.id,
-                        "name": message.sender.name,
-                        "email": message.sender.email
-                    },
-                    "text": message.text,
-                    "timestamp": message.timestamp,
-                    "is_read": message.is_read
-                }
-                for message in messages
-            ],
-            "total": len(messages)
+            "messages": messages,
+            "total": len(messages),
+            "next_cursor": encode_cursor(messages[-1]["timestamp"], messages[-1]["id"]) if messages and has_older else None,
+            "prev_cursor": encode_cursor(messages[0]["timestamp"], messages[0]["id"]) if messages and has_newer else None
+        }
+    
+    async def get_messages_after(self, chat_id: UUID, user_id: UUID, after: str, limit: int = 100) -> Dict[str, Any]:
+        """Сообщения новее курсора от старых к новым, без сдвига отметки о прочтении.
+
+        Используется для догрузки пропущенного при переподключении WebSocket.
+        """
+        try:
+            after_cursor = decode_cursor(after)
+        except ValueError as e:
+            return {"error": str(e)}
+        
+        is_member = await is_chat_member(self.db, chat_id, user_id)
+        if is_member is None:
+            return {"error": "Чат не найден"}
+        
+        if not is_member:
+            return {"error": "Вы не являетесь участником этого чата"}
+        
+        messages = await self._history_after(chat_id, after_cursor, limit)
+        return {
+            "messages": messages[-limit:][::-1] if limit else [],
+            "has_more": len(messages) > limit
+        }
+    
+    async def _history_after(self, chat_id: UUID, cursor: Cursor, limit: int) -> List[Dict[str, Any]]:
+        """До limit + 1 ближайших к курсору более новых сообщений, от новых к старым"""
+        messages = recent_messages.after(chat_id, cursor, limit)
+        if messages is not None:
+            return messages[::-1]
+        messages = await self.repository.get_chat_history_after(chat_id, cursor, limit + 1)
+        return [_message_dict(message) for message in messages]
+    
+    async def _load_latest(self, chat_id: UUID, limit: int, offset: int) -> List[Dict[str, Any]]:
+        """Последние limit + 1 сообщений со смещением; первая страница заполняет буфер чата"""
+        if offset:
+            messages = await self.repository.get_chat_history(chat_id, limit + 1, offset)
+            return [_message_dict(message) for message in messages]
+        
+        fetch = max(limit, recent_messages.per_chat) + 1
+        recent_messages.begin_load(chat_id)
+        try:
+            messages = await self.repository.get_chat_history(chat_id, fetch, 0)
+        except Exception:
+            recent_messages.end_load(chat_id)
+            raise
+        messages = [_message_dict(message) for message in messages]
+        recent_messages.end_load(chat_id, messages[::-1], complete=len(messages) < fetch)
+        return messages[:limit + 1]
+    
+    async def _has_unread(self, chat_id: UUID, user_id: UUID, messages: List[Dict[str, Any]]) -> bool:
+        """Есть ли среди сообщений чужие, еще не прочитанные пользователем.
+
+        Сравнение идет с собственной отметкой пользователя, а не с общим флагом is_read:
+        флаг остается False, пока сообщение не прочитают все участники.
+        """
+        positions = [(message["timestamp"], message["id"]) for message in messages if message["sender_id"] != user_id]
+        if not positions:
+            return False
+        read_state = await self.repository.get_read_state(chat_id, user_id)
+        if read_state is None:
+            return True
+        return max(positions) > (read_state.last_read_at, read_state.last_read_message_id)
+    
+    async def _mark_read_up_to(self, chat_id: UUID, user_id: UUID, timestamp: datetime, message_id: UUID):
+        read_state, read_ids = await self.repository.mark_read_up_to(chat_id, user_id, timestamp, message_id)
+        # Флаги is_read в буфере последних сообщений обновляются вместе с базой
+        recent_messages.mark_read(chat_id, read_ids)
+        return read_state
+    
+    async def search_messages(
+        self,
+        user_id: UUID,
+        query: str,
+        chat_id: Optional[UUID] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50
+    ) -> Dict[str, Any]:
+        if not query or not query.strip():
+            return {"error": "Пустой поисковый запрос"}
+        try:
+            search_cursor = decode_search_cursor(cursor)
+        except ValueError as e:
+            return {"error": str(e)}
+        
+        # Доступ к чатам проверяется в самом запросе: чужие сообщения в выборку не попадают
+        results = await self.repository.search(user_id, query.strip(), chat_id, search_cursor, limit + 1)
+        has_more = len(results) > limit
+        results = results[:limit]
+        
+        return {
+            "messages": [{**_message_dict(message), "rank": rank} for message, rank in results],
+            "total": len(results),
+            "next_cursor": encode_search_cursor(results[-1][1], results[-1][0].timestamp, results[-1][0].id) if results and has_more else None
         }
     
     async def mark_message_as_read(self, message_id: UUID, user_id: UUID) -> Dict[str, Any]:
@@ -94,22 +251,51 @@ class MessageService:
             return {"error": "Сообщение не найдено"}
         
         # Проверяем, является ли пользователь участником чата
-        chat = await self.chat_repository.get_chat_by_id(message.chat_id)
-        if not chat:
+        is_member = await is_chat_member(self.db, message.chat_id, user_id)
+        if is_member is None:
             return {"error": "Чат не найден"}
         
-        if user_id not in [member.id for member in chat.members]:
+        if not is_member:
             return {"error": "Вы не являетесь участником этого чата"}
         
         # Если пользователь - отправитель сообщения, то оно уже считается прочитанным
         if message.sender_id == user_id:
             return {"message": "Это ваше сообщение, оно уже считается прочитанным"}
         
-        # Помечаем сообщение как прочитанное
-        message_read = await self.repository.mark_as_read(message_id, user_id)
+        # Помечаем прочитанными все сообщения чата до этого включительно
+        read_state = await self._mark_read_up_to(message.chat_id, user_id, message.timestamp, message.id)
+        
+        return {
+            "message_id": message_id,
+            "user_id": user_id,
+            "read_at": read_state.updated_at
+        } 
+    
+    async def mark_chat_as_read(self, chat_id: UUID, user_id: UUID, message_id: Optional[UUID] = None) -> Dict[str, Any]:
+        # Проверяем, существует ли чат и является ли пользователь его участником
+        is_member = await is_chat_member(self.db, chat_id, user_id)
+        if is_member is None:
+            return {"error": "Чат не найден"}
+        
+        if not is_member:
+            return {"error": "Вы не являетесь участником этого чата"}
+        
+        # Определяем сообщение, до которого чат прочитан
+        if message_id:
+            message = await self.repository.get_by_id(message_id)
+            if not message or message.chat_id != chat_id:
+                return {"error": "Сообщение не найдено"}
+        else:
+            message = await self.repository.get_last_message(chat_id)
+            if not message:
+                return {"chat_id": chat_id, "user_id": user_id, "last_read_message_id": None, "read_at": None}
+        
+        # Одна запись отметки и один пересчет is_read для всех сообщений до указанного
+        read_state = await self._mark_read_up_to(chat_id, user_id, message.timestamp, message.id)
         
         return {
-            "message_id": message_read.message_id,
-            "user_id": message_read.user_id,
-            "read_at": message_read.read_at
-        } 
\ No newline at end of file
+            "chat_id": chat_id,
+            "user_id": user_id,
+            "last_read_message_id": read_state.last_read_message_id,
+            "read_at": read_state.updated_at
+        }
@@ -0,0 +1,219 @@
+import sys
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.pagination import Cursor
+
+# Примерные накладные расходы на одно сообщение в буфере (словарь, UUID, datetime)
+MESSAGE_OVERHEAD = 600
+
+def _position(message: Dict[str, Any]) -> Cursor:
+    return message["timestamp"], message["id"]
+
+def _message_size(message: Dict[str, Any]) -> int:
+    return MESSAGE_OVERHEAD + sys.getsizeof(message["text"])
+
+class ChatBuffer:
+    """Последние сообщения одного чата, от старых к новым"""
+
+    def __init__(self, capacity: int, messages: Iterable[Dict[str, Any]], complete: bool):
+        self.messages: Deque[Dict[str, Any]] = deque((dict(message) for message in messages), maxlen=capacity)
+        # complete - в буфере вся история чата, более старых сообщений нет
+        self.complete = complete
+        self.loaded_at = time.monotonic()
+        self.size = sum(_message_size(message) for message in self.messages)
+
+    def add(self, message: Dict[str, Any]) -> int:
+        """Вставка с сохранением порядка (timestamp, id); возвращает изменение размера"""
+        position = _position(message)
+        index = len(self.messages)
+        while index and _position(self.messages[index - 1]) > position:
+            index -= 1
+        if index and self.messages[index - 1]["id"] == message["id"]:
+            return 0
+        delta = _message_size(message)
+        if len(self.messages) == self.messages.maxlen:
+            if index == 0:
+                # Сообщение старше всего буфера: в последние оно уже не входит,
+                # но и полной история в буфере больше не является
+                self.complete = False
+                return 0
+            delta -= _message_size(self.messages.popleft())
+            self.complete = False
+            index -= 1
+        self.messages.insert(index, message)
+        self.size += delta
+        return delta
+
+    def contains(self, message_id: UUID) -> bool:
+        return any(message["id"] == message_id for message in self.messages)
+
+class RecentMessages:
+    """Кольцевые буферы последних сообщений активных чатов.
+
+    Буфер создается только из результата запроса к базе и затем пополняется
+    при записи, поэтому всегда содержит непрерывный хвост истории чата.
+    Число чатов и общий объем ограничены, давно не использованные чаты
+    вытесняются первыми. Выключенный буфер ничего не хранит, и все чтения
+    идут в базу.
+    """
+
+    def __init__(self, per_chat: int, max_chats: int, max_bytes: int, ttl: float, enabled: bool = True):
+        self.enabled = enabled
+        self.per_chat = per_chat
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._chats: "OrderedDict[UUID, ChatBuffer]" = OrderedDict()
+        self.bytes = 0
+        # Загрузки из базы, во время которых чат изменился: их результат устарел
+        self._loading: Dict[UUID, int] = {}
+        self._dirty: Set[UUID] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get(self, chat_id: UUID) -> Optional[ChatBuffer]:
+        buffer = self._chats.get(chat_id)
+        if buffer is None:
+            return None
+        # Ограничиваем устаревание флагов is_read, изменяемых другими процессами
+        if time.monotonic() - buffer.loaded_at > self.ttl:
+            self.invalidate(chat_id)
+            return None
+        self._chats.move_to_end(chat_id)
+        return buffer
+
+    def latest(self, chat_id: UUID, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """До limit + 1 последних сообщений от новых к старым;
+        None, если буфер не может ответить"""
+        buffer = self._get(chat_id)
+        if buffer is None or (len(buffer.messages) <= limit and not buffer.complete):
+            self.misses += 1
+            return None
+        self.hits += 1
+        messages = list(buffer.messages)[::-1]
+        return [dict(message) for message in messages[:limit + 1]]
+
+    def after(self, chat_id: UUID, cursor: Cursor, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """До limit + 1 ближайших к курсору более новых сообщений, от старых к новым;
+        None, если курсор старше содержимого буфера"""
+        buffer = self._get(chat_id)
+        if buffer is None or (
+            not buffer.complete and (not buffer.messages or _position(buffer.messages[0]) > cursor)
+        ):
+            self.misses += 1
+            return None
+        self.hits += 1
+        newer = [message for message in buffer.messages if _position(message) > cursor]
+        return [dict(message) for message in newer[:limit + 1]]
+
+    def begin_load(self, chat_id: UUID):
+        """Отметка начала загрузки чата из базы"""
+        self._loading[chat_id] = self._loading.get(chat_id, 0) + 1
+
+    def end_load(self, chat_id: UUID, messages: Optional[List[Dict[str, Any]]] = None, complete: bool = False):
+        """Завершение загрузки; messages (от старых к новым) заполняют буфер,
+        если чат не менялся во время запроса"""
+        stale = chat_id in self._dirty
+        if self._loading.get(chat_id, 0) <= 1:
+            self._loading.pop(chat_id, None)
+            self._dirty.discard(chat_id)
+        else:
+            self._loading[chat_id] -= 1
+        if not self.enabled or messages is None or stale or chat_id in self._chats:
+            return
+        buffer = ChatBuffer(self.per_chat, messages[-self.per_chat:], complete and len(messages) <= self.per_chat)
+        self._chats[chat_id] = buffer
+        self.bytes += buffer.size
+        self._evict()
+
+    def append(self, chat_id: UUID, message: Dict[str, Any]):
+        """Добавление записанного сообщения в буфер чата"""
+        if chat_id in self._loading:
+            self._dirty.add(chat_id)
+        buffer = self._chats.get(chat_id)
+        if buffer is None:
+            return
+        self.bytes += buffer.add(dict(message))
+        self._evict()
+
+    def mark_read(self, chat_id: UUID, message_ids: Iterable[UUID]):
+        """Обновление флагов is_read после сдвига отметок о прочтении"""
+        message_ids = set(message_ids)
+        if not message_ids:
+            return
+        if chat_id in self._loading:
+            self._dirty.add(chat_id)
+        buffer = self._chats.get(chat_id)
+        if buffer is None:
+            return
+        for message in buffer.messages:
+            if message["id"] in message_ids:
+                message["is_read"] = True
+
+    def observe(self, chat_id: UUID, message: Dict[str, Any]):
+        """Сообщение из рассылки брокера, в том числе записанное другим процессом.
+
+        Сообщение вставляется в буфер по позиции; буфер сбрасывается, только
+        если сообщение старше неполного буфера и непрерывность хвоста не проверить.
+        """
+        if chat_id in self._loading:
+            self._dirty.add(chat_id)
+        buffer = self._chats.get(chat_id)
+        if buffer is None or buffer.contains(message["id"]):
+            return
+        if not buffer.complete and (not buffer.messages or _position(message) < _position(buffer.messages[0])):
+            self.invalidate(chat_id)
+            return
+        self.bytes += buffer.add(dict(message))
+        self._evict()
+
+    def invalidate(self, chat_id: UUID):
+        buffer = self._chats.pop(chat_id, None)
+        if buffer is not None:
+            self.bytes -= buffer.size
+
+    def clear(self):
+        self._chats.clear()
+        self.bytes = 0
+
+    def _evict(self):
+        while self._chats and (len(self._chats) > self.max_chats or self.bytes > self.max_bytes):
+            _, buffer = self._chats.popitem(last=False)
+            self.bytes -= buffer.size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "chats": len(self._chats),
+            "max_chats": self.max_chats,
+            "messages": sum(len(buffer.messages) for buffer in self._chats.values()),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / requests if requests else 0.0,
+        }
+
+def buffer_allowed() -> bool:
+    """Буфер согласован с базой, только если о каждой записи узнают все процессы.
+
+    Брокер в памяти не доставляет события другим процессам: с несколькими
+    воркерами их буферы пропускали бы новые сообщения до истечения TTL.
+    """
+    return settings.BROKER_BACKEND == "postgres" or settings.WEB_CONCURRENCY <= 1
+
+recent_messages = RecentMessages(
+    per_chat=settings.RECENT_MESSAGES_PER_CHAT,
+    max_chats=settings.RECENT_MESSAGES_MAX_CHATS,
+    max_bytes=settings.RECENT_MESSAGES_MAX_BYTES,
+    ttl=settings.RECENT_MESSAGES_TTL,
+    enabled=settings.RECENT_MESSAGES_ENABLED and buffer_allowed()
+)
@@ -4,8 +4,8 @@ from datetime import timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.repositories import UserRepository
-from app.core.security import get_password_hash, verify_password, create_access_token
-from app.schemas.user import UserCreate, UserLogin, Token
+from app.core.security import get_password_hash_async, verify_password_async, create_access_token, invalidate_user_principal
+from app.schemas.user import UserCreate, UserLogin, UserUpdate, PasswordChange, Token
 
 class UserService:
     def __init__(self, db: AsyncSession):
@@ -19,7 +19,7 @@ class UserService:
             return {"error": "Пользователь с таким email уже существует"}
         
         # Хешируем пароль
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await get_password_hash_async(user_data.password)
         
         # Создаем пользователя
         user = await self.repository.create(
@@ -33,7 +33,7 @@ class UserService:
     async def authenticate_user(self, login_data: UserLogin) -> Optional[Dict[str, Any]]:
         user = await self.repository.get_by_email(login_data.email)
         
-        if not user or not verify_password(login_data.password, user.password):
+        if not user or not await verify_password_async(login_data.password, user.password):
             return None
         
         # Создаем токен доступа
@@ -42,4 +42,34 @@ class UserService:
             expires_delta=timedelta(minutes=30)
         )
         
-        return {"access_token": access_token, "token_type": "bearer", "user_id": str(user.id), "name": user.name} 
\ No newline at end of file
+        return {"access_token": access_token, "token_type": "bearer", "user_id": str(user.id), "name": user.name}
+    
+    async def update_user(self, user_id: UUID, user_data: UserUpdate) -> Dict[str, Any]:
+        values = user_data.model_dump(exclude_none=True)
+        if "email" in values:
+            db_user = await self.repository.get_by_email(values["email"])
+            if db_user and db_user.id != user_id:
+                return {"error": "Пользователь с таким email уже существует"}
+        
+        user = await self.repository.update(user_id, **values)
+        if user is None:
+            return {"error": "Пользователь не найден"}
+        
+        # Кэш аутентификации хранит имя и email: следующий запрос должен увидеть новые данные
+        invalidate_user_principal(user_id)
+        return {"id": user.id, "email": user.email, "name": user.name}
+    
+    async def change_password(self, user_id: UUID, password_data: PasswordChange) -> Dict[str, Any]:
+        user = await self.repository.get_by_id(user_id)
+        if not user:
+            return {"error": "Пользователь не найден"}
+        
+        if not await verify_password_async(password_data.current_password, user.password):
+            return {"error": "Неверный текущий пароль"}
+        
+        hashed_password = await get_password_hash_async(password_data.new_password)
+        await self.repository.update(user_id, password=hashed_password)
+        
+        # Закэшированные токены пользователя проверяются заново по базе
+        invalidate_user_principal(user_id)
+        return {"message": "Пароль изменен"}
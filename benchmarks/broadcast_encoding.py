@@ -0,0 +1,98 @@
+"""Бенчмарк сериализации сообщений при рассылке в чат.
+
+Сравнивает время кодирования на одну рассылку для прежнего подхода
+(send_json на каждого получателя) и кодирования кадра один раз.
+
+Запуск: python -m benchmarks.broadcast_encoding
+"""
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime
+
+from app.api.websockets import ConnectionManager
+from app.core.encoding import json_codec
+
+RECIPIENTS = [10, 100, 1000, 2000]
+ROUNDS = 50
+
+
+class NullWebSocket:
+    async def send_text(self, data: str):
+        pass
+
+
+def make_message() -> dict:
+    return {
+        "type": "message",
+        "data": {
+            "id": str(uuid.uuid4()),
+            "sender_id": str(uuid.uuid4()),
+            "sender_name": "Пользователь",
+            "text": "Текст сообщения " * 8,
+            "timestamp": str(datetime.utcnow()),
+            "is_read": False,
+        },
+    }
+
+
+async def measure(recipients: int) -> dict:
+    manager = ConnectionManager()
+    chat_id = uuid.uuid4()
+    for _ in range(recipients):
+        await manager.connect(NullWebSocket(), uuid.uuid4(), chat_id)
+
+    # Считаем время, проведенное внутри кодировщика
+    encode_time = 0.0
+    encode_calls = 0
+    original_encode = json_codec.encode
+
+    def timed_encode(data):
+        nonlocal encode_time, encode_calls
+        started = time.perf_counter()
+        frame = original_encode(data)
+        encode_time += time.perf_counter() - started
+        encode_calls += 1
+        return frame
+
+    json_codec.encode = timed_encode
+    try:
+        for _ in range(ROUNDS):
+            await manager.broadcast_to_chat(make_message(), chat_id)
+            # Даем задачам-писателям опустошить очереди
+            await asyncio.sleep(0)
+    finally:
+        del json_codec.encode
+
+    # Прежний подход: отдельное кодирование для каждого сокета
+    message = make_message()
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        for _ in range(recipients):
+            json.dumps(message)
+    per_socket_time = time.perf_counter() - started
+
+    for user_id in list(manager.active_connections):
+        manager.disconnect(user_id, chat_id)
+
+    return {
+        "recipients": recipients,
+        "encodes_per_broadcast": encode_calls / ROUNDS,
+        "encode_once_us": encode_time / ROUNDS * 1e6,
+        "encode_per_socket_us": per_socket_time / ROUNDS * 1e6,
+    }
+
+
+async def main():
+    print(f"{'recipients':>10} {'encodes':>8} {'once, us':>10} {'per socket, us':>15}")
+    for recipients in RECIPIENTS:
+        row = await measure(recipients)
+        print(
+            f"{row['recipients']:>10} {row['encodes_per_broadcast']:>8.1f} "
+            f"{row['encode_once_us']:>10.1f} {row['encode_per_socket_us']:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+"""Бенчмарк списка чатов с последними сообщениями.
+
+Для пользователя, состоящего в растущем числе чатов, измеряет число SQL-запросов,
+полученных строк и время ChatService.get_user_chats_with_last_message.
+Число запросов не должно зависеть от количества чатов.
+
+Требуется отдельная локальная база PostgreSQL, таблицы в ней будут пересозданы:
+    POSTGRES_HOST=localhost POSTGRES_DB=messenger_bench python -m benchmarks.chat_list_queries
+"""
+import asyncio
+import time
+import uuid
+
+import asyncpg
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.services.chat_service import ChatService
+from benchmarks.dataset import StatementCounter, reset_schema, seed
+
+CHAT_COUNTS = [10, 50, 200, 1000]
+MESSAGES_PER_CHAT = 50
+MEMBERS_PER_CHAT = 3
+
+
+async def measure(engine, chats: int) -> dict:
+    await reset_schema(engine)
+    user_id = uuid.uuid4()
+    raw = await asyncpg.connect(settings.ASYNCPG_DSN)
+    await seed(raw, chats * 2, chats, MEMBERS_PER_CHAT, chats * MESSAGES_PER_CHAT, member=user_id)
+    await raw.close()
+
+    counter = StatementCounter()
+    counter.attach(engine)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with session_factory() as db:
+            started = time.perf_counter()
+            result = await ChatService(db).get_user_chats_with_last_message(user_id)
+            elapsed = time.perf_counter() - started
+    finally:
+        counter.detach(engine)
+
+    return {
+        "chats": len(result),
+        "queries": len(counter.statements),
+        "rows": counter.rows,
+        "ms": elapsed * 1000,
+    }
+
+
+async def main():
+    engine = create_async_engine(settings.DATABASE_URL)
+    print(f"{'chats':>6} {'queries':>8} {'rows':>8} {'ms':>9}")
+    for chats in CHAT_COUNTS:
+        row = await measure(engine, chats)
+        print(f"{row['chats']:>6} {row['queries']:>8} {row['rows']:>8} {row['ms']:>9.1f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
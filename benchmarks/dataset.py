@@ -0,0 +1,119 @@
+"""Общие помощники бенчмарков: небольшие наборы данных и подсчет SQL-запросов."""
+import random
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import asyncpg
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.db.models import Base
+from app.db.partitions import ensure_message_partitions
+
+
+@dataclass
+class Dataset:
+    users: List[uuid.UUID]
+    chats: List[uuid.UUID]
+    members: Dict[uuid.UUID, List[uuid.UUID]]
+    # (id, chat_id, sender_id, text, timestamp, is_read)
+    messages: List[tuple]
+
+
+@dataclass
+class StatementCounter:
+    """Счетчик SQL-запросов и полученных строк, подключаемый к движку"""
+
+    statements: List[Tuple[str, Any]] = field(default_factory=list)
+    rows: int = 0
+
+    def attach(self, engine: AsyncEngine):
+        event.listen(engine.sync_engine, "before_cursor_execute", self._before)
+        event.listen(engine.sync_engine, "after_cursor_execute", self._after)
+
+    def detach(self, engine: AsyncEngine):
+        event.remove(engine.sync_engine, "before_cursor_execute", self._before)
+        event.remove(engine.sync_engine, "after_cursor_execute", self._after)
+
+    def reset(self):
+        self.statements.clear()
+        self.rows = 0
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, parameters))
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        if cursor.description is not None and cursor.rowcount and cursor.rowcount > 0:
+            self.rows += cursor.rowcount
+
+
+async def reset_schema(engine: AsyncEngine, history_days: int = 30):
+    """Пересоздание всех таблиц приложения с секциями сообщений за history_days дней"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await ensure_message_partitions(conn, start=datetime.utcnow() - timedelta(days=history_days))
+
+
+async def seed(
+    connection: asyncpg.Connection,
+    users: int,
+    chats: int,
+    members_per_chat: int,
+    messages: int,
+    member: Optional[uuid.UUID] = None,
+    started: Optional[datetime] = None,
+) -> Dataset:
+    """Загрузка набора данных через COPY; member, если задан, входит во все чаты.
+
+    Сообщения идут раз в секунду начиная со started (по умолчанию 30 дней назад).
+    """
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    if member is not None:
+        user_ids[0] = member
+    chat_ids = [uuid.uuid4() for _ in range(chats)]
+    await connection.copy_records_to_table(
+        "users",
+        records=[(user_id, f"user{i}", f"user{i}@example.com", "x") for i, user_id in enumerate(user_ids)],
+        columns=["id", "name", "email", "password"],
+    )
+    await connection.copy_records_to_table(
+        "chats",
+        records=[(chat_id, None, "PERSONAL") for chat_id in chat_ids],
+        columns=["id", "name", "type"],
+    )
+    members = {}
+    for chat_id in chat_ids:
+        chosen = random.sample(user_ids[1:], members_per_chat - 1) if member else random.sample(user_ids, members_per_chat)
+        members[chat_id] = ([member] if member else []) + chosen
+    await connection.copy_records_to_table(
+        "chat_members",
+        records=[(user_id, chat_id) for chat_id, user_ids_ in members.items() for user_id in user_ids_],
+        columns=["user_id", "chat_id"],
+    )
+    if started is None:
+        started = datetime.utcnow() - timedelta(days=30)
+    rows = []
+    for i in range(messages):
+        chat_id = random.choice(chat_ids)
+        rows.append((
+            uuid.uuid4(), chat_id, random.choice(members[chat_id]),
+            f"message {i}", started + timedelta(seconds=i), False,
+        ))
+    await connection.copy_records_to_table(
+        "messages", records=rows,
+        columns=["id", "chat_id", "sender_id", "text", "timestamp", "is_read"],
+    )
+    # Каждый участник прочитал чат до некоторого сообщения
+    read_states = {}
+    for message in rows[: len(rows) // 2]:
+        for user_id in members[message[1]]:
+            read_states[(message[1], user_id)] = (message[1], user_id, message[4], message[0], message[4])
+    await connection.copy_records_to_table(
+        "chat_read_states", records=list(read_states.values()),
+        columns=["chat_id", "user_id", "last_read_at", "last_read_message_id", "updated_at"],
+    )
+    await connection.execute("ANALYZE")
+    return Dataset(user_ids, chat_ids, members, rows)
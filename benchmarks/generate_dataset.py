@@ -0,0 +1,254 @@
+"""Генератор синтетического набора данных с массовой загрузкой через COPY.
+
+Создает пользователей, личные чаты, группы (включая несколько больших групп
+с тысячами участников), сообщения и отметки "прочитано до". Активность чатов
+распределена по закону Ципфа: небольшая доля чатов получает большую часть
+сообщений. Данные генерируются потоком пакетов и загружаются через asyncpg
+COPY несколькими соединениями параллельно; ORM, bcrypt и коммит на каждую
+строку не используются, поэтому десятки миллионов строк загружаются за минуты.
+
+У всех пользователей один пароль (--password), email имеет вид user<N>@example.com.
+
+Пример (таблицы будут пересозданы):
+    POSTGRES_HOST=localhost POSTGRES_DB=messenger_bench python -m benchmarks.generate_dataset \\
+        --users 200000 --personal-chats 500000 --groups 20000 --messages 20000000 --reset
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+import asyncpg
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.schema import CreateIndex
+
+from app.core.config import settings
+from app.core.security import get_password_hash
+from app.db.models import Message
+from app.db.partitions import ensure_message_partitions
+from benchmarks.dataset import reset_schema
+
+MESSAGE_COLUMNS = ["id", "chat_id", "sender_id", "text", "timestamp", "is_read"]
+WORDS = (
+    "привет как дела сегодня завтра встреча проект код ревью релиз база запрос "
+    "сообщение чат группа отлично спасибо хорошо посмотрю позже готово"
+).split()
+
+
+class Loader:
+    """Параллельная загрузка пакетов строк через COPY"""
+
+    def __init__(self, pool: asyncpg.Pool, workers: int):
+        self.pool = pool
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(workers)]
+        self.rows: Dict[str, int] = {}
+
+    async def put(self, table: str, columns: List[str], records: list):
+        if records:
+            await self.queue.put((table, columns, records))
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            table, columns, records = item
+            async with self.pool.acquire() as connection:
+                await connection.copy_records_to_table(table, records=records, columns=columns)
+            self.rows[table] = self.rows.get(table, 0) + len(records)
+
+    async def close(self):
+        for _ in self.tasks:
+            await self.queue.put(None)
+        await asyncio.gather(*self.tasks)
+
+
+def group_sizes(groups: int, large_groups: int, large_group_size: int, users: int) -> List[int]:
+    """Обычные группы по 3-50 участников (чаще маленькие) и несколько больших"""
+    sizes = [min(users, large_group_size) for _ in range(min(large_groups, groups))]
+    sizes += [min(users, 50, 2 + int(random.paretovariate(1.2))) for _ in range(groups - len(sizes))]
+    return sizes
+
+
+def zipf_cum_weights(n: int, s: float) -> List[float]:
+    return list(itertools.accumulate(1.0 / rank ** s for rank in range(1, n + 1)))
+
+
+def message_texts(count: int = 4096) -> List[str]:
+    """Заранее собранные тексты: генерация текста на каждую строку дороже самой загрузки"""
+    return [" ".join(random.choices(WORDS, k=random.randint(2, 14))) for _ in range(count)]
+
+
+async def generate(args):
+    started = time.perf_counter()
+    engine = create_async_engine(settings.DATABASE_URL)
+    if args.reset:
+        await reset_schema(engine, history_days=args.days)
+    else:
+        # Месячные секции на весь период, иначе сообщения окажутся в секции по умолчанию
+        async with engine.begin() as conn:
+            await ensure_message_partitions(conn, start=datetime.utcnow() - timedelta(days=args.days))
+    await engine.dispose()
+
+    pool = await asyncpg.create_pool(settings.ASYNCPG_DSN, min_size=args.workers, max_size=args.workers)
+    batch = args.batch
+
+    # Чаты: личные пары и группы; members[chat] нужен для отправителей и read-state
+    user_ids = [uuid.uuid4() for _ in range(args.users)]
+    chat_ids: List[uuid.UUID] = []
+    members: List[List[uuid.UUID]] = []
+    chat_rows = []
+    for _ in range(args.personal_chats):
+        chat_ids.append(uuid.uuid4())
+        members.append(random.sample(user_ids, 2))
+        chat_rows.append((chat_ids[-1], None, "PERSONAL"))
+    group_rows = []
+    for i, size in enumerate(group_sizes(args.groups, args.large_groups, args.large_group_size, args.users)):
+        chat_ids.append(uuid.uuid4())
+        members.append(random.sample(user_ids, size))
+        chat_rows.append((chat_ids[-1], f"group {i}", "GROUP"))
+        group_rows.append((uuid.uuid4(), f"group {i}", chat_ids[-1], members[-1][0]))
+
+    # Загрузка идет этапами: внутри этапа пакеты пишутся параллельно,
+    # а строки с внешними ключами попадают в базу после тех, на кого ссылаются
+    password_hash = get_password_hash(args.password)
+    loader = Loader(pool, args.workers)
+    for offset in range(0, args.users, batch):
+        await loader.put("users", ["id", "name", "email", "password"], [
+            (user_ids[i], f"user{i}", f"user{i}@example.com", password_hash)
+            for i in range(offset, min(offset + batch, args.users))
+        ])
+    for offset in range(0, len(chat_rows), batch):
+        await loader.put("chats", ["id", "name", "type"], chat_rows[offset:offset + batch])
+    await loader.close()
+    rows = dict(loader.rows)
+
+    loader = Loader(pool, args.workers)
+    for offset in range(0, len(group_rows), batch):
+        await loader.put("groups", ["id", "name", "chat_id", "creator_id"], group_rows[offset:offset + batch])
+    member_rows = []
+    for chat_id, chat_members in zip(chat_ids, members):
+        member_rows.extend((user_id, chat_id) for user_id in chat_members)
+        if len(member_rows) >= batch:
+            await loader.put("chat_members", ["user_id", "chat_id"], member_rows)
+            member_rows = []
+    await loader.put("chat_members", ["user_id", "chat_id"], member_rows)
+    await loader.close()
+    rows.update(loader.rows)
+
+    # Индексы сообщений строятся после загрузки: так COPY заметно быстрее
+    async with pool.acquire() as connection:
+        if args.defer_indexes:
+            for index in Message.__table__.indexes:
+                await connection.execute(f"DROP INDEX IF EXISTS {index.name}")
+
+    loader = Loader(pool, args.workers)
+    group_member_rows = []
+    for i, (group_id, *_) in enumerate(group_rows):
+        group_member_rows.extend((user_id, group_id) for user_id in members[args.personal_chats + i])
+        if len(group_member_rows) >= batch:
+            await loader.put("group_members", ["user_id", "group_id"], group_member_rows)
+            group_member_rows = []
+    await loader.put("group_members", ["user_id", "group_id"], group_member_rows)
+
+    # Сообщения: порядок чатов по активности перемешан, чтобы большие группы
+    # не оказывались всегда самыми активными
+    ranking = list(range(len(chat_ids)))
+    random.shuffle(ranking)
+    cum_weights = zipf_cum_weights(len(ranking), args.zipf)
+    now = datetime.utcnow()
+    start = now - timedelta(days=args.days)
+    step = (now - start) / max(args.messages, 1)
+    # Сообщения старше границы прочитаны всеми участниками
+    read_boundary = now - (now - start) * args.unread_share
+    texts = message_texts()
+    last_message: Dict[int, Tuple[datetime, uuid.UUID]] = {}
+    last_read_message: Dict[int, Tuple[datetime, uuid.UUID]] = {}
+    for offset in range(0, args.messages, batch):
+        count = min(batch, args.messages - offset)
+        records = []
+        for i, chat in enumerate(random.choices(ranking, cum_weights=cum_weights, k=count)):
+            message_id = uuid.uuid4()
+            timestamp = start + step * (offset + i)
+            is_read = timestamp < read_boundary
+            records.append((message_id, chat_ids[chat], random.choice(members[chat]), random.choice(texts), timestamp, is_read))
+            last_message[chat] = (timestamp, message_id)
+            if is_read:
+                last_read_message[chat] = (timestamp, message_id)
+        await loader.put("messages", MESSAGE_COLUMNS, records)
+
+    # Отметки "прочитано до": большинство участников дочитали чат до конца,
+    # остальные остановились на границе прочитанного
+    read_rows = []
+    for chat, (timestamp, message_id) in last_message.items():
+        behind = last_read_message.get(chat)
+        for user_id in members[chat]:
+            if random.random() < args.caught_up or behind is None:
+                read_rows.append((chat_ids[chat], user_id, timestamp, message_id, timestamp))
+            else:
+                read_rows.append((chat_ids[chat], user_id, behind[0], behind[1], behind[0]))
+        if len(read_rows) >= batch:
+            await loader.put(
+                "chat_read_states",
+                ["chat_id", "user_id", "last_read_at", "last_read_message_id", "updated_at"],
+                read_rows,
+            )
+            read_rows = []
+    await loader.put(
+        "chat_read_states",
+        ["chat_id", "user_id", "last_read_at", "last_read_message_id", "updated_at"],
+        read_rows,
+    )
+    await loader.close()
+    loaded = time.perf_counter()
+
+    async with pool.acquire() as connection:
+        if args.defer_indexes:
+            for index in Message.__table__.indexes:
+                await connection.execute(str(CreateIndex(index, if_not_exists=True).compile(dialect=postgresql.dialect())))
+        await connection.execute("ANALYZE")
+    await pool.close()
+
+    rows.update(loader.rows)
+    total = sum(rows.values())
+    elapsed = time.perf_counter() - started
+    for table, count in rows.items():
+        print(f"{table:<18} {count:>12}")
+    print(f"{'total':<18} {total:>12}")
+    print(f"load: {loaded - started:.1f} s, indexes and ANALYZE: {elapsed - (loaded - started):.1f} s, "
+          f"{total / elapsed:,.0f} rows/s overall")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--personal-chats", type=int, default=200000)
+    parser.add_argument("--groups", type=int, default=10000)
+    parser.add_argument("--large-groups", type=int, default=10, help="число групп размера --large-group-size")
+    parser.add_argument("--large-group-size", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=5000000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="показатель распределения активности чатов")
+    parser.add_argument("--days", type=int, default=180, help="период, на который распределены сообщения")
+    parser.add_argument("--unread-share", type=float, default=0.02,
+                        help="доля периода в конце, сообщения которой прочитаны не всеми")
+    parser.add_argument("--caught-up", type=float, default=0.7, help="доля участников, дочитавших чат")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--batch", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--defer-indexes", action="store_true", help="строить индексы сообщений после загрузки")
+    parser.add_argument("--reset", action="store_true", help="пересоздать таблицы перед загрузкой")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    asyncio.run(generate(args))
+
+
+if __name__ == "__main__":
+    main()
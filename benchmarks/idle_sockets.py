@@ -0,0 +1,173 @@
+"""Проверка: тысячи простаивающих WebSocket-соединений при маленьком пуле базы.
+
+Обработчики /ws/user вызываются напрямую с фиктивными сокетами, а фабрика
+сессий подменяется на движок с пулом из POOL_SIZE соединений без переполнения.
+Скрипт подключает SOCKETS пользователей, убеждается, что в простое ни одно
+соединение пула не занято, выполняет параллельные REST-запросы и кадры от
+части сокетов, и завершается с ненулевым кодом при нарушении ожиданий.
+Подключение сокета берет соединение из пула не больше одного раза (только на
+аутентификацию и загрузку чатов). Тот же сценарий выполняется в
+tests/test_idle_sockets.py: по умолчанию с 500 сокетами, с IDLE_SOCKETS_FULL=1 -
+с полными 10 000.
+
+Требуется отдельная локальная база PostgreSQL, таблицы в ней будут пересозданы:
+    POSTGRES_HOST=localhost POSTGRES_DB=messenger_bench python -m benchmarks.idle_sockets
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import asyncpg
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api import websockets
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.services.chat_service import ChatService
+from benchmarks.dataset import Dataset, reset_schema, seed
+
+POOL_SIZE = 10
+SOCKETS = 10000
+CONNECT_BATCH = 500
+
+
+class IdleWebSocket:
+    """Фиктивный сокет: входящие кадры подаются через очередь"""
+
+    def __init__(self):
+        self.scope = {"subprotocols": []}
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.sent: asyncio.Queue = asyncio.Queue()
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data: str):
+        await self.sent.put(json.loads(data))
+
+    async def receive(self) -> dict:
+        frame = await self.inbox.get()
+        if frame is None:
+            return {"type": "websocket.disconnect", "code": 1000}
+        return {"type": "websocket.receive", "text": frame}
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def run(sockets_count: int, rest_requests: int, active_count: int) -> Tuple[List[str], Dict[str, float]]:
+    """Подключение сокетов и нагрузка; возвращает нарушения ожиданий и замеры времени"""
+    engine = create_async_engine(
+        settings.DATABASE_URL, pool_size=POOL_SIZE, max_overflow=0, pool_timeout=10
+    )
+    await reset_schema(engine)
+    raw = await asyncpg.connect(settings.ASYNCPG_DSN)
+    dataset = await seed(raw, sockets_count, sockets_count // 10, 10, 0)
+    await raw.close()
+
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    original_session = websockets.async_session
+    websockets.async_session = session_factory
+    pool = engine.sync_engine.pool
+    try:
+        return await _exercise(session_factory, pool, dataset, rest_requests, active_count)
+    finally:
+        websockets.async_session = original_session
+        await engine.dispose()
+
+
+async def _exercise(session_factory, pool, dataset: Dataset, rest_requests: int, active_count: int) -> Tuple[List[str], Dict[str, float]]:
+    sockets = []
+    tasks = []
+    timings = {}
+    checkouts = [0]
+
+    def count_checkout(*args):
+        checkouts[0] += 1
+
+    event.listen(pool, "checkout", count_checkout)
+    started = time.perf_counter()
+    for offset in range(0, len(dataset.users), CONNECT_BATCH):
+        batch = []
+        for user_id in dataset.users[offset:offset + CONNECT_BATCH]:
+            ws = IdleWebSocket()
+            token = create_access_token({"sub": str(user_id)})
+            sockets.append(ws)
+            tasks.append(asyncio.create_task(websockets.user_websocket_endpoint(ws, token=token, last_seen=[])))
+            batch.append(ws)
+        # Дожидаемся подтверждения подключения для всей пачки
+        for ws in batch:
+            reply = await ws.sent.get()
+            assert reply.get("status") == "connected", reply
+    timings["connect_s"] = time.perf_counter() - started
+    event.remove(pool, "checkout", count_checkout)
+
+    failures = []
+    timings["checkouts_per_socket"] = checkouts[0] / len(sockets)
+    if checkouts[0] > len(sockets):
+        failures.append(f"{checkouts[0]} pool checkouts for {len(sockets)} socket connects")
+    await asyncio.sleep(0.5)
+    if pool.checkedout() != 0:
+        failures.append(f"idle sockets hold {pool.checkedout()} pooled connections")
+
+    # REST-трафик при подключенных сокетах не должен ждать соединений из пула
+    async def rest_call(user_id):
+        async with session_factory() as db:
+            await ChatService(db).get_user_chats(user_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(rest_call(dataset.users[i]) for i in range(rest_requests)))
+    timings["rest_s"] = time.perf_counter() - started
+
+    # Часть сокетов одновременно отправляет кадры, каждый берет сессию на время кадра
+    started = time.perf_counter()
+    user_chat = {}
+    for chat_id, members in dataset.members.items():
+        for user_id in members:
+            user_chat.setdefault(user_id, chat_id)
+    active = []
+    for i, ws in enumerate(sockets[:active_count]):
+        chat_id = user_chat.get(dataset.users[i], dataset.chats[0])
+        await ws.inbox.put(json.dumps({"type": "subscribe", "chat_id": str(chat_id), "request_id": i}))
+        active.append(ws)
+    replies = [await ws.sent.get() for ws in active]
+    timings["frames_s"] = time.perf_counter() - started
+    answered = sum(1 for reply in replies if "request_id" in reply)
+    if answered != len(active):
+        failures.append(f"only {answered} of {len(active)} frames answered")
+    if pool.checkedout() != 0:
+        failures.append(f"{pool.checkedout()} pooled connections still checked out after frames")
+
+    for ws in sockets:
+        await ws.inbox.put(None)
+    await asyncio.gather(*tasks)
+    return failures, timings
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sockets", type=int, default=SOCKETS)
+    parser.add_argument("--rest-requests", type=int, default=200)
+    parser.add_argument("--active", type=int, default=100)
+    args = parser.parse_args()
+
+    failures, timings = await run(args.sockets, args.rest_requests, args.active)
+
+    print(f"sockets:              {args.sockets}")
+    print(f"pool size:            {POOL_SIZE} (max_overflow=0)")
+    print(f"connect all:          {timings['connect_s']:.2f} s")
+    print(f"checkouts per socket: {timings['checkouts_per_socket']:.2f}")
+    print(f"{args.rest_requests} REST chat lists: {timings['rest_s']:.2f} s")
+    print(f"{args.active} socket frames:    {timings['frames_s']:.2f} s")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,79 @@
+"""Бенчмарк пропускной способности записи сообщений.
+
+Сравнивает запись по одному сообщению в транзакции (MessageRepository.create)
+с пакетной записью MessageIngestor при одновременной отправке от многих
+соединений.
+
+Требуется отдельная локальная база PostgreSQL, таблицы в ней будут пересозданы:
+    POSTGRES_HOST=localhost POSTGRES_DB=messenger_bench python -m benchmarks.ingestion_throughput
+"""
+import asyncio
+import time
+import uuid
+
+import asyncpg
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.repositories import MessageRepository
+from app.services.message_ingestion import MessageIngestor
+from benchmarks.dataset import reset_schema, seed
+
+SENDERS = 200
+MESSAGES_PER_SENDER = 20
+BATCH_SETTINGS = [(2, 50), (5, 200), (10, 500)]
+
+
+async def run_per_message(session_factory, chat_id, sender_id) -> float:
+    async def sender():
+        async with session_factory() as db:
+            repository = MessageRepository(db)
+            for i in range(MESSAGES_PER_SENDER):
+                await repository.create(chat_id, sender_id, f"message {i}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(SENDERS)))
+    return time.perf_counter() - started
+
+
+async def run_batched(session_factory, chat_id, sender_id, window_ms, batch_size):
+    ingestor = MessageIngestor(session_factory, window_ms=window_ms, batch_size=batch_size)
+
+    async def sender():
+        for i in range(MESSAGES_PER_SENDER):
+            await ingestor.submit(chat_id, sender_id, f"message {i}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(SENDERS)))
+    elapsed = time.perf_counter() - started
+    await ingestor.stop()
+    return elapsed, ingestor.batches
+
+
+async def main():
+    # Пул соответствует числу одновременных отправителей, чтобы сравнение было честным
+    engine = create_async_engine(settings.DATABASE_URL, pool_size=20, max_overflow=SENDERS)
+    await reset_schema(engine)
+    raw = await asyncpg.connect(settings.ASYNCPG_DSN)
+    dataset = await seed(raw, 10, 1, 2, 0)
+    await raw.close()
+    chat_id = dataset.chats[0]
+    sender_id = dataset.members[chat_id][0]
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    total = SENDERS * MESSAGES_PER_SENDER
+
+    elapsed = await run_per_message(session_factory, chat_id, sender_id)
+    print(f"{'mode':<28} {'msg/s':>10} {'batches':>8}")
+    print(f"{'commit per message':<28} {total / elapsed:>10.0f} {total:>8}")
+
+    for window_ms, batch_size in BATCH_SETTINGS:
+        elapsed, batches = await run_batched(session_factory, chat_id, sender_id, window_ms, batch_size)
+        label = f"batched {window_ms}ms/{batch_size}"
+        print(f"{label:<28} {total / elapsed:>10.0f} {batches:>8}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""Проверка профилей загрузки: число запросов и строк на входе, аутентификации и списке чатов.
+
+Пользователь состоит во многих чатах с большим числом участников; при жадной
+загрузке связей любой запрос пользователя тянул бы все его чаты и всех
+собеседников. Скрипт завершается с ненулевым кодом, если превышен бюджет;
+те же бюджеты проверяет tests/test_loading_profiles.py.
+
+Требуется отдельная локальная база PostgreSQL, таблицы в ней будут пересозданы:
+    POSTGRES_HOST=localhost POSTGRES_DB=messenger_bench python -m benchmarks.loading_profiles
+"""
+import asyncio
+import sys
+import uuid
+from typing import Any, Dict, List
+
+import asyncpg
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.repositories import UserRepository
+from app.services.chat_service import ChatService
+from benchmarks.dataset import StatementCounter, reset_schema, seed
+
+CHATS = 200
+MEMBERS_PER_CHAT = 20
+
+
+async def measure_profiles(engine: AsyncEngine) -> List[Dict[str, Any]]:
+    """Пересоздание схемы, загрузка данных и замер запросов и строк каждого случая"""
+    await reset_schema(engine)
+    user_id = uuid.uuid4()
+    raw = await asyncpg.connect(settings.ASYNCPG_DSN)
+    await seed(raw, 2000, CHATS, MEMBERS_PER_CHAT, 0, member=user_id)
+    await raw.close()
+
+    counter = StatementCounter()
+    counter.attach(engine)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    # (название, вызов, бюджет запросов, бюджет строк)
+    cases = [
+        ("login: get_by_email", lambda db: UserRepository(db).get_by_email("user0@example.com"), 1, 1),
+        ("auth: get_principal", lambda db: UserRepository(db).get_principal(user_id), 1, 1),
+        ("chat list: get_user_chats", lambda db: ChatService(db).get_user_chats(user_id), 2, CHATS + CHATS * MEMBERS_PER_CHAT),
+    ]
+
+    results = []
+    try:
+        for name, call, query_budget, row_budget in cases:
+            counter.reset()
+            async with session_factory() as db:
+                await call(db)
+            queries = len(counter.statements)
+            results.append({
+                "name": name,
+                "queries": queries,
+                "query_budget": query_budget,
+                "rows": counter.rows,
+                "row_budget": row_budget,
+                "ok": queries <= query_budget and counter.rows <= row_budget,
+            })
+    finally:
+        counter.detach(engine)
+    return results
+
+
+async def main() -> int:
+    engine = create_async_engine(settings.DATABASE_URL)
+    results = await measure_profiles(engine)
+    await engine.dispose()
+
+    print(f"{'case':<28} {'queries':>8} {'budget':>7} {'rows':>7} {'budget':>7}")
+    for row in results:
+        print(
+            f"{row['name']:<28} {row['queries']:>8} {row['query_budget']:>7} "
+            f"{row['rows']:>7} {row['row_budget']:>7} {'ok' if row['ok'] else 'OVER BUDGET'}"
+        )
+    return 0 if all(row["ok"] for row in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
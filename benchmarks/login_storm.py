@@ -0,0 +1,139 @@
+"""Бенчмарк задержек цикла событий во время всплеска входов.
+
+Одновременно запускается пачка проверок паролей bcrypt, а в фоне
+измеряются задержка цикла событий и время доставки сообщений в
+WebSocket-соединения. Сравниваются два режима:
+
+- inline: прежний вызов verify_password прямо в обработчике;
+- pool: verify_password_async в ограниченном пуле потоков.
+
+Запуск: python -m benchmarks.login_storm [--logins 32] [--sockets 100]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from app.api.websockets import ConnectionManager
+from app.core.security import (
+    PasswordHashingBusy,
+    get_password_hash,
+    verify_password,
+    verify_password_async,
+)
+
+LAG_INTERVAL = 0.01
+BROADCAST_INTERVAL = 0.02
+
+
+class RecordingWebSocket:
+    """Фиктивный сокет, запоминающий задержку доставки кадров"""
+
+    def __init__(self, latencies: list):
+        self.latencies = latencies
+
+    async def send_text(self, data: str):
+        sent_at = float(data.split('"sent_at":', 1)[1].split("}", 1)[0])
+        self.latencies.append(time.perf_counter() - sent_at)
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def monitor_lag(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(time.perf_counter() - started - LAG_INTERVAL)
+
+
+async def broadcast_loop(manager: ConnectionManager, chat_id: uuid.UUID, stop: asyncio.Event):
+    # Задержка считается от запланированного момента отправки, поэтому
+    # заблокированный цикл событий виден как рост задержки доставки
+    scheduled = time.perf_counter()
+    while not stop.is_set():
+        await manager.broadcast_to_chat(
+            {"type": "message", "data": {"sent_at": scheduled}}, chat_id
+        )
+        scheduled += BROADCAST_INTERVAL
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+
+
+async def login_inline(password: str, hashed: str) -> bool:
+    return verify_password(password, hashed)
+
+
+async def login_pool(password: str, hashed: str) -> bool:
+    return await verify_password_async(password, hashed)
+
+
+async def run(mode: str, logins: int, sockets: int, hashed: str) -> dict:
+    manager = ConnectionManager()
+    chat_id = uuid.uuid4()
+    latencies: list = []
+    for _ in range(sockets):
+        await manager.connect(RecordingWebSocket(latencies), uuid.uuid4(), chat_id)
+
+    lags: list = []
+    stop = asyncio.Event()
+    background = [
+        asyncio.create_task(monitor_lag(lags, stop)),
+        asyncio.create_task(broadcast_loop(manager, chat_id, stop)),
+    ]
+    # Даем фоновым задачам запуститься до начала всплеска
+    await asyncio.sleep(0.1)
+
+    login = login_inline if mode == "inline" else login_pool
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(login("secret", hashed) for _ in range(logins)), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - started
+
+    await asyncio.sleep(0.1)
+    stop.set()
+    await asyncio.gather(*background)
+    for user_id in list(manager.active_connections):
+        manager.disconnect(user_id, chat_id)
+
+    return {
+        "mode": mode,
+        "logins": logins,
+        "rejected": sum(isinstance(r, PasswordHashingBusy) for r in results),
+        "storm_s": elapsed,
+        "lag_p50_ms": percentile(lags, 0.5) * 1000,
+        "lag_max_ms": max(lags, default=0.0) * 1000,
+        "ws_p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "ws_p99_ms": percentile(latencies, 0.99) * 1000,
+        "ws_max_ms": max(latencies, default=0.0) * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--sockets", type=int, default=100)
+    args = parser.parse_args()
+
+    hashed = get_password_hash("secret")
+    header = (
+        f"{'mode':>7} {'logins':>6} {'rejected':>8} {'storm, s':>9} "
+        f"{'lag p50':>8} {'lag max':>8} {'ws p50':>8} {'ws p99':>8} {'ws max':>8}"
+    )
+    print(header)
+    for mode in ("inline", "pool"):
+        row = await run(mode, args.logins, args.sockets, hashed)
+        print(
+            f"{row['mode']:>7} {row['logins']:>6} {row['rejected']:>8} {row['storm_s']:>9.2f} "
+            f"{row['lag_p50_ms']:>8.1f} {row['lag_max_ms']:>8.1f} "
+            f"{row['ws_p50_ms']:>8.1f} {row['ws_p99_ms']:>8.1f} {row['ws_max_ms']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,176 @@
+"""Проверка планов запросов репозиториев на горячих путях.
+
+Заполняет базу тестовыми данными, выполняет запросы репозиториев (включая
+полнотекстовый поиск и выборку участников чата), перехватывает их SQL через
+события движка и запускает EXPLAIN для каждого SELECT. При
+отключенном enable_seqscan последовательное сканирование в плане означает,
+что для запроса нет подходящего индекса; в этом случае скрипт завершается с
+ненулевым кодом. Для горячих запросов (последние сообщения, первая страница
+истории) дополнительно проверяется, что план не читает месячные секции старше
+окна MESSAGE_RECENT_MONTHS. Те же проверки выполняются в tests/test_query_plans.py.
+
+Требуется отдельная локальная база PostgreSQL, таблицы в ней будут пересозданы:
+    POSTGRES_HOST=localhost POSTGRES_DB=messenger_bench python -m benchmarks.query_plans
+"""
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+import asyncpg
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.partitions import partition_month, recent_window_start
+from app.db.repositories import ChatRepository, MessageRepository, UserRepository
+from benchmarks.dataset import Dataset, StatementCounter, reset_schema, seed
+
+USERS = 500
+CHATS = 200
+MEMBERS_PER_CHAT = 5
+MESSAGES = 20000
+# Секции создаются с запасом в прошлое, чтобы в базе были секции старше окна горячих запросов
+HISTORY_DAYS = 120
+
+
+def seq_scans(plan: Any) -> List[str]:
+    """Таблицы, которые читаются последовательным сканированием"""
+    found = []
+    if isinstance(plan, dict):
+        if plan.get("Node Type") == "Seq Scan":
+            found.append(plan.get("Relation Name", "?"))
+        for value in plan.values():
+            found.extend(seq_scans(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            found.extend(seq_scans(item))
+    return found
+
+
+def relations(plan: Any) -> List[str]:
+    """Все таблицы, которые читает план"""
+    found = []
+    if isinstance(plan, dict):
+        if "Relation Name" in plan:
+            found.append(plan["Relation Name"])
+        for value in plan.values():
+            found.extend(relations(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            found.extend(relations(item))
+    return found
+
+
+async def explain(
+    engine: AsyncEngine, raw: asyncpg.Connection, queries: Dict[str, Callable]
+) -> Dict[str, List[Any]]:
+    """Планы EXPLAIN всех SELECT, выполненных каждым запросом"""
+    counter = StatementCounter()
+    counter.attach(engine)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await raw.execute("SET enable_seqscan = off")
+    results = {}
+    try:
+        for name, query in queries.items():
+            counter.reset()
+            async with session_factory() as db:
+                await query(db)
+            plans = []
+            for statement, parameters in counter.statements:
+                if not statement.lstrip().upper().startswith("SELECT"):
+                    continue
+                rows = await raw.fetch("EXPLAIN (FORMAT JSON) " + statement, *(parameters or ()))
+                plans.append(json.loads(rows[0][0]))
+            results[name] = plans
+    finally:
+        counter.detach(engine)
+        await raw.execute("RESET enable_seqscan")
+    return results
+
+
+async def check_plans(engine: AsyncEngine, raw: asyncpg.Connection, dataset: Dataset) -> Dict[str, List[str]]:
+    """Таблицы с последовательным сканированием в планах SELECT каждого запроса"""
+    messages = dataset.messages
+    chat_id, user_id = messages[-1][1], messages[-1][2]
+    cursor = (messages[len(messages) // 2][4], messages[len(messages) // 2][0])
+    search_text = messages[len(messages) // 2][3]
+
+    queries = {
+        "UserRepository.get_by_id": lambda db: UserRepository(db).get_by_id(user_id),
+        "UserRepository.get_by_email": lambda db: UserRepository(db).get_by_email("user1@example.com"),
+        "ChatRepository.get_chat_by_id": lambda db: ChatRepository(db).get_chat_by_id(chat_id),
+        "ChatRepository.get_user_chats": lambda db: ChatRepository(db).get_user_chats(user_id),
+        "ChatRepository.get_member_ids": lambda db: ChatRepository(db).get_member_ids(chat_id),
+        "ChatRepository.get_user_chat_ids": lambda db: ChatRepository(db).get_user_chat_ids(user_id),
+        "MessageRepository.get_chat_history": lambda db: MessageRepository(db).get_chat_history(chat_id, 50),
+        "MessageRepository.get_chat_history_before": lambda db: MessageRepository(db).get_chat_history_before(chat_id, cursor, 50),
+        "MessageRepository.get_chat_history_after": lambda db: MessageRepository(db).get_chat_history_after(chat_id, cursor, 50),
+        "MessageRepository.search": lambda db: MessageRepository(db).search(user_id, search_text),
+        "MessageRepository.search in chat": lambda db: MessageRepository(db).search(user_id, search_text, chat_id),
+        "MessageRepository.get_last_message": lambda db: MessageRepository(db).get_last_message(chat_id),
+        "MessageRepository.get_unread_count": lambda db: MessageRepository(db).get_unread_count(chat_id, user_id),
+        "MessageRepository.get_read_state": lambda db: MessageRepository(db).get_read_state(chat_id, user_id),
+        "MessageRepository.get_last_messages_for_user": lambda db: MessageRepository(db).get_last_messages_for_user(user_id),
+        "MessageRepository.get_unread_counts_for_user": lambda db: MessageRepository(db).get_unread_counts_for_user(user_id),
+    }
+
+    plans = await explain(engine, raw, queries)
+    return {name: [table for plan in items for table in seq_scans(plan)] for name, items in plans.items()}
+
+
+async def check_partitions(engine: AsyncEngine, raw: asyncpg.Connection, dataset: Dataset) -> Dict[str, List[str]]:
+    """Месячные секции старше окна последних секций в планах горячих запросов.
+
+    Последнее сообщение набора данных свежее, поэтому горячие запросы не должны
+    переходить к полному запросу по всей истории.
+    """
+    chat_id, user_id = dataset.messages[-1][1], dataset.messages[-1][2]
+    queries = {
+        "MessageRepository.get_chat_history": lambda db: MessageRepository(db).get_chat_history(chat_id, 50),
+        "MessageRepository.get_last_message": lambda db: MessageRepository(db).get_last_message(chat_id),
+        "MessageRepository.get_last_messages_for_user": lambda db: MessageRepository(db).get_last_messages_for_user(user_id),
+    }
+    window = recent_window_start()
+    plans = await explain(engine, raw, queries)
+    results = {}
+    for name, items in plans.items():
+        tables = {table for plan in items for table in relations(plan)}
+        results[name] = sorted(
+            table for table in tables
+            if partition_month(table) is not None and partition_month(table) < window
+        )
+    return results
+
+
+async def seed_recent(raw: asyncpg.Connection) -> Dataset:
+    """Набор данных, последние сообщения которого попадают в текущую секцию"""
+    started = datetime.utcnow() - timedelta(seconds=MESSAGES + 60)
+    return await seed(raw, USERS, CHATS, MEMBERS_PER_CHAT, MESSAGES, started=started)
+
+
+async def main() -> int:
+    engine = create_async_engine(settings.DATABASE_URL)
+    await reset_schema(engine, history_days=HISTORY_DAYS)
+    raw = await asyncpg.connect(settings.ASYNCPG_DSN)
+    dataset = await seed_recent(raw)
+
+    failed = False
+    for name, scans in (await check_plans(engine, raw, dataset)).items():
+        status = "ok" if not scans else "SEQ SCAN on " + ", ".join(scans)
+        failed = failed or bool(scans)
+        print(f"{name:45} {status}")
+    print()
+    for name, old in (await check_partitions(engine, raw, dataset)).items():
+        status = "recent partitions only" if not old else "OLD PARTITIONS " + ", ".join(old)
+        failed = failed or bool(old)
+        print(f"{name:45} {status}")
+
+    await raw.close()
+    await engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
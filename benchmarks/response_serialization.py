@@ -0,0 +1,192 @@
+"""Бенчмарк сериализации REST-ответов: большие списки чатов и страницы истории.
+
+Одни и те же данные в том виде, в каком их возвращают сервисы, отдаются тремя
+способами через ASGI-приложение (httpx.ASGITransport):
+- validated: прежний путь FastAPI - проверка по response_model, преобразование
+  в JSON-совместимые данные и стандартный json;
+- models: модели ответа собираются без проверки (model_construct) и
+  сериализуются pydantic-core (TypeAdapter.dump_json);
+- fast: FastJSONResponse - словари сервисов сериализуются orjson за один проход.
+
+Перед замером проверяется, что все три ответа совпадают после разбора JSON.
+База данных не нужна.
+
+Запуск: python -m benchmarks.response_serialization
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+from app.core.responses import FastJSONResponse
+from app.schemas.chat import ChatType, ChatWithLastMessageResponse, LastMessageInfo
+from app.schemas.message import ChatHistoryResponse, MessageResponse
+from app.schemas.user import UserResponse
+from app.services.message_service import _message_dict
+
+# (чатов, участников в чате) и число сообщений на странице истории
+CHAT_LISTS = [(200, 10), (1000, 10), (200, 200)]
+HISTORY_PAGES = [100, 500]
+
+
+def make_users(count: int) -> List[Dict[str, Any]]:
+    return [{"id": uuid.uuid4(), "name": f"user{i}", "email": f"user{i}@example.com"} for i in range(count)]
+
+
+def make_chats(chats: int, members: int) -> List[Dict[str, Any]]:
+    """Ответ ChatService.get_user_chats_with_last_message"""
+    users = make_users(max(members, 50))
+    now = datetime.utcnow()
+    result = []
+    for i in range(chats):
+        chat_members = users[:members]
+        sender = chat_members[i % len(chat_members)]
+        result.append({
+            "id": uuid.uuid4(),
+            "name": f"chat {i}",
+            "type": "group",
+            "members": chat_members,
+            "last_message": {
+                "id": uuid.uuid4(),
+                "sender_id": sender["id"],
+                "sender_name": sender["name"],
+                "text": "последнее сообщение " * 4,
+                "timestamp": now - timedelta(minutes=i),
+                "is_read": i % 3 == 0,
+            } if i % 10 else None,
+            "unread_count": i % 7,
+        })
+    return result
+
+
+def make_history(count: int) -> Dict[str, Any]:
+    """Ответ MessageService.get_chat_history"""
+    users = make_users(10)
+    chat_id = uuid.uuid4()
+    now = datetime.utcnow()
+    messages = []
+    for i in range(count):
+        sender = users[i % len(users)]
+        messages.append(_message_dict(SimpleNamespace(
+            id=uuid.uuid4(),
+            chat_id=chat_id,
+            sender_id=sender["id"],
+            sender=SimpleNamespace(**sender),
+            text=f"сообщение {i} " * 6,
+            timestamp=now - timedelta(seconds=i),
+            is_read=i > 5,
+        )))
+    return {"messages": messages, "total": count, "next_cursor": "cursor", "prev_cursor": None}
+
+
+def construct_chats(chats: List[Dict[str, Any]]) -> List[ChatWithLastMessageResponse]:
+    return [
+        ChatWithLastMessageResponse.model_construct(
+            id=chat["id"],
+            name=chat["name"],
+            type=ChatType(chat["type"]),
+            members=[UserResponse.model_construct(**member) for member in chat["members"]],
+            last_message=LastMessageInfo.model_construct(**chat["last_message"]) if chat["last_message"] else None,
+            unread_count=chat["unread_count"],
+        )
+        for chat in chats
+    ]
+
+
+def construct_history(history: Dict[str, Any]) -> ChatHistoryResponse:
+    return ChatHistoryResponse.model_construct(
+        messages=[
+            MessageResponse.model_construct(**{**message, "sender": UserResponse.model_construct(**message["sender"])})
+            for message in history["messages"]
+        ],
+        total=history["total"],
+        next_cursor=history["next_cursor"],
+        prev_cursor=history["prev_cursor"],
+    )
+
+
+def add_routes(app: FastAPI, name: str, payload: Any, adapter: TypeAdapter, construct: Callable, model: Any):
+    # Данные берутся из замыкания: параметры по умолчанию FastAPI считал бы query-параметрами
+    async def validated():
+        return payload
+
+    async def models():
+        return Response(adapter.dump_json(construct(payload)), media_type="application/json")
+
+    async def fast():
+        return FastJSONResponse(payload)
+
+    app.get(f"/validated/{name}", response_model=model, response_class=JSONResponse)(validated)
+    app.get(f"/models/{name}", response_model=model)(models)
+    app.get(f"/fast/{name}", response_model=model)(fast)
+
+
+def build_app(payloads: Dict[str, Any]) -> FastAPI:
+    app = FastAPI()
+    chats_adapter = TypeAdapter(List[ChatWithLastMessageResponse])
+    history_adapter = TypeAdapter(ChatHistoryResponse)
+    for name, payload in payloads.items():
+        if isinstance(payload, dict):
+            add_routes(app, name, payload, history_adapter, construct_history, ChatHistoryResponse)
+        else:
+            add_routes(app, name, payload, chats_adapter, construct_chats, List[ChatWithLastMessageResponse])
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, runs: int) -> Dict[str, float]:
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        response = await client.get(path)
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return {"p50_ms": statistics.median(latencies), "bytes": len(response.content)}
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    # Журнал запросов httpx искажает замеры
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    payloads: Dict[str, Any] = {}
+    for chats, members in CHAT_LISTS:
+        payloads[f"chats-{chats}x{members}"] = make_chats(chats, members)
+    for count in HISTORY_PAGES:
+        payloads[f"history-{count}"] = make_history(count)
+
+    app = build_app(payloads)
+    failed = False
+    print(f"{'payload':<18} {'bytes':>9} {'validated ms':>13} {'models ms':>10} {'fast ms':>8} {'speedup':>8}")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for name in payloads:
+            # Все способы должны отдавать одинаковый документ
+            bodies = [json.loads((await client.get(f"/{mode}/{name}")).content) for mode in ("validated", "models", "fast")]
+            if not bodies[0] == bodies[1] == bodies[2]:
+                failed = True
+                print(f"FAIL: responses for {name} differ")
+                continue
+            results = {mode: await measure(client, f"/{mode}/{name}", args.runs) for mode in ("validated", "models", "fast")}
+            print(
+                f"{name:<18} {results['fast']['bytes']:>9} {results['validated']['p50_ms']:>13.1f} "
+                f"{results['models']['p50_ms']:>10.1f} {results['fast']['p50_ms']:>8.1f} "
+                f"{results['validated']['p50_ms'] / results['fast']['p50_ms']:>7.0f}x"
+            )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,176 @@
+"""Бенчмарк REST-эндпоинтов с бюджетами SQL-запросов.
+
+Для наборов данных возрастающего размера приложение вызывается в процессе
+через httpx.ASGITransport, а к движку из app/db/base.py подключается
+StatementCounter. Для каждого эндпоинта фиксируются задержка, число SQL-запросов
+и полученных строк. Кэши принципалов и членства и буфер последних сообщений
+сбрасываются перед каждым запросом, поэтому учитывается худший (холодный) случай.
+
+Скрипт завершается с ненулевым кодом, если превышен бюджет эндпоинта или число
+запросов растет вместе с размером набора данных (признак N+1).
+
+Требуется отдельная локальная база PostgreSQL, таблицы в ней будут пересозданы:
+    POSTGRES_HOST=localhost POSTGRES_DB=messenger_bench python -m benchmarks.rest_endpoints --sizes small,medium
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import asyncpg
+import httpx
+
+from app.core.config import settings
+from app.core.security import create_access_token, get_password_hash, principal_cache
+from app.db.base import engine
+from app.main import app
+from app.services.membership import membership_cache
+from app.services.recent_messages import recent_messages
+from benchmarks.dataset import StatementCounter, reset_schema, seed
+
+# (пользователи, чаты, участников в чате, сообщения)
+SIZES = {
+    "small": (1000, 500, 10, 20000),
+    "medium": (10000, 5000, 10, 200000),
+    "large": (50000, 20000, 10, 1000000),
+}
+# Число чатов измеряемого пользователя не зависит от размера набора
+USER_CHATS = 50
+MEMBERS_PER_CHAT = 10
+HISTORY_LIMIT = 50
+PASSWORD = "benchmark-password"
+
+# Эндпоинт: (бюджет запросов, бюджет строк)
+BUDGETS = {
+    "POST /auth/token": (1, 1),
+    "GET /chats": (3, 1 + USER_CHATS * (1 + MEMBERS_PER_CHAT)),
+    "GET /chats/with-last-message": (5, 1 + USER_CHATS * (3 + MEMBERS_PER_CHAT)),
+    "GET /chats/{chat_id}/history": (7, 1 + MEMBERS_PER_CHAT + 2 * (HISTORY_LIMIT + 1) + 2),
+    "POST /chats/messages": (3, 1 + MEMBERS_PER_CHAT + 1),
+}
+
+
+async def prepare(size: str):
+    """Пересоздание схемы и загрузка набора; возвращает (user_id, chat_id)"""
+    users, chats, members_per_chat, messages = SIZES[size]
+    await reset_schema(engine)
+    raw = await asyncpg.connect(settings.ASYNCPG_DSN)
+    dataset = await seed(raw, users, chats, members_per_chat, messages)
+    user_id = dataset.users[0]
+    # Измеряемый пользователь состоит ровно в USER_CHATS чатах
+    await raw.execute("DELETE FROM chat_read_states WHERE user_id = $1", user_id)
+    await raw.execute("DELETE FROM chat_members WHERE user_id = $1", user_id)
+    await raw.executemany(
+        "INSERT INTO chat_members (user_id, chat_id) VALUES ($1, $2) ON CONFLICT DO NOTHING",
+        [(user_id, chat_id) for chat_id in dataset.chats[:USER_CHATS]],
+    )
+    await raw.execute("UPDATE users SET password = $1 WHERE id = $2", get_password_hash(PASSWORD), user_id)
+    await raw.execute("ANALYZE")
+    await raw.close()
+    return user_id, dataset.chats[0]
+
+
+async def measure(client: httpx.AsyncClient, counter: StatementCounter, request, runs: int) -> dict:
+    latencies = []
+    queries = []
+    rows = []
+    for _ in range(runs):
+        principal_cache.clear()
+        membership_cache.clear()
+        recent_messages.clear()
+        counter.reset()
+        started = time.perf_counter()
+        response = await request(client)
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        queries.append(len(counter.statements))
+        rows.append(counter.rows)
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": sorted(latencies)[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "queries": max(queries),
+        "rows": max(rows),
+    }
+
+
+async def run_size(size: str, runs: int) -> dict:
+    user_id, chat_id = await prepare(size)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+    prefix = settings.API_V1_STR
+
+    requests = {
+        "POST /auth/token": lambda c: c.post(
+            f"{prefix}/auth/token", json={"email": "user0@example.com", "password": PASSWORD}
+        ),
+        "GET /chats": lambda c: c.get(f"{prefix}/chats", headers=headers),
+        "GET /chats/with-last-message": lambda c: c.get(f"{prefix}/chats/with-last-message", headers=headers),
+        "GET /chats/{chat_id}/history": lambda c: c.get(
+            f"{prefix}/chats/{chat_id}/history", params={"limit": HISTORY_LIMIT}, headers=headers
+        ),
+        "POST /chats/messages": lambda c: c.post(
+            f"{prefix}/chats/messages", json={"chat_id": str(chat_id), "text": "benchmark"}, headers=headers
+        ),
+    }
+
+    counter = StatementCounter()
+    counter.attach(engine)
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, request in requests.items():
+                # Прогрев без учета
+                await request(client)
+                results[name] = await measure(client, counter, request, runs)
+    finally:
+        counter.detach(engine)
+    return results
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="small,medium")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    # Журнал SQL-запросов движка приложения только мешает измерениям
+    engine.sync_engine.echo = False
+
+    report = {}
+    for size in args.sizes.split(","):
+        report[size] = await run_size(size, args.runs)
+
+    failed = False
+    print(f"{'size':<7} {'endpoint':<30} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'rows':>6}")
+    for size, results in report.items():
+        for name, row in results.items():
+            query_budget, row_budget = BUDGETS[name]
+            ok = row["queries"] <= query_budget and row["rows"] <= row_budget
+            row["budget"] = {"queries": query_budget, "rows": row_budget, "ok": ok}
+            failed = failed or not ok
+            print(
+                f"{size:<7} {name:<30} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                f"{row['queries']:>8} {row['rows']:>6} {'ok' if ok else 'OVER BUDGET'}"
+            )
+
+    # Число запросов не должно зависеть от размера набора данных
+    sizes = list(report)
+    for name in BUDGETS:
+        counts = {size: report[size][name]["queries"] for size in sizes}
+        if len(set(counts.values())) > 1:
+            failed = True
+            print(f"FAIL: query count of {name} grows with dataset size: {counts}")
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2))
+    await engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
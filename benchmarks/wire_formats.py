@@ -0,0 +1,126 @@
+"""Бенчмарк форматов кадров WebSocket: байты на проводе и CPU на сообщение.
+
+Сравниваются JSON и MessagePack, каждый без сжатия и с permessage-deflate.
+Сжатие выполняется тем же расширением библиотеки websockets и с теми же
+параметрами, которые uvicorn согласует с клиентом (окно 15 бит, контекст
+сохраняется между кадрами), поэтому размеры совпадают с реальными.
+
+Кодирование выполняется один раз на рассылку (кадр общий для всех получателей),
+а сжатие - для каждого получателя отдельно: у каждого соединения свой контекст
+deflate. Поэтому CPU приводится отдельно на сообщение и на доставку.
+
+Запуск: python -m benchmarks.wire_formats [--messages 5000]
+"""
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+from websockets.frames import OP_BINARY, OP_TEXT, Frame as WireFrame
+
+from app.api.websockets import _message_event
+from app.core.encoding import CODECS, JSON_PROTOCOL, Frame
+
+WORDS = (
+    "привет как дела сегодня завтра встреча проект код ревью релиз база запрос "
+    "сообщение чат группа отлично спасибо хорошо посмотрю позже готово ok test"
+).split()
+REPLAY_SIZE = 50
+ROUNDS = 5
+
+
+def header_size(length: int) -> int:
+    """Заголовок кадра от сервера (без маски)"""
+    if length < 126:
+        return 2
+    if length < 65536:
+        return 4
+    return 10
+
+
+def make_events(count: int) -> List[dict]:
+    """События о новых сообщениях нескольких отправителей с текстом разной длины"""
+    senders = [(uuid.uuid4(), f"Пользователь {i}") for i in range(20)]
+    timestamp = datetime.utcnow() - timedelta(hours=1)
+    events = []
+    for _ in range(count):
+        sender_id, sender_name = random.choice(senders)
+        timestamp += timedelta(milliseconds=random.randint(10, 5000))
+        text = " ".join(random.choices(WORDS, k=max(1, int(random.paretovariate(1.5) * 3))))
+        events.append(_message_event(
+            {"id": uuid.uuid4(), "sender_id": sender_id, "text": text, "timestamp": timestamp, "is_read": False},
+            sender_name,
+        ))
+    return events
+
+
+def make_replays(events: List[dict]) -> List[dict]:
+    chat_id = str(uuid.uuid4())
+    return [
+        {"type": "replay", "chats": [{
+            "chat_id": chat_id,
+            "messages": [event["data"] for event in events[offset:offset + REPLAY_SIZE]],
+            "has_more": False,
+        }]}
+        for offset in range(0, len(events) - REPLAY_SIZE + 1, REPLAY_SIZE)
+    ]
+
+
+def measure(codec, payloads: List[dict], deflate: bool) -> Dict[str, float]:
+    # Лучший из нескольких прогонов: каждый раз новые кадры без кэша кодирования
+    encode_s = float("inf")
+    for _ in range(ROUNDS):
+        frames = [Frame(payload) for payload in payloads]
+        started = time.perf_counter()
+        encoded = [frame.encode(codec) for frame in frames]
+        encode_s = min(encode_s, time.perf_counter() - started)
+
+    opcode = OP_TEXT if codec.protocol == JSON_PROTOCOL else OP_BINARY
+    data = [item.encode("utf-8") if isinstance(item, str) else item for item in encoded]
+    compress_s = 0.0
+    if deflate:
+        # Один поток кадров одному получателю: контекст сжатия накапливается
+        _, extension = ServerPerMessageDeflateFactory().process_request_params([], [])
+        started = time.perf_counter()
+        data = [extension.encode(WireFrame(opcode, item)).data for item in data]
+        compress_s = time.perf_counter() - started
+
+    wire = sum(len(item) + header_size(len(item)) for item in data)
+    return {
+        "bytes": wire / len(payloads),
+        "encode_us": encode_s / len(payloads) * 1e6,
+        "compress_us": compress_s / len(payloads) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    events = make_events(args.messages)
+    workloads = {"message": events, f"replay x{REPLAY_SIZE}": make_replays(events)}
+    print(f"{'frame':<12} {'encoding':<16} {'bytes':>9} {'vs json':>8} "
+          f"{'encode us/frame':>16} {'deflate us/delivery':>20}")
+    for workload, payloads in workloads.items():
+        baseline = None
+        for protocol, codec in CODECS.items():
+            for deflate in (False, True):
+                row = measure(codec, payloads, deflate)
+                baseline = baseline or row["bytes"]
+                name = protocol.split(".")[-1] + ("+deflate" if deflate else "")
+                print(
+                    f"{workload:<12} {name:<16} {row['bytes']:>9.1f} {row['bytes'] / baseline:>8.0%} "
+                    f"{row['encode_us']:>16.2f} {row['compress_us']:>20.2f}"
+                )
+    if len(CODECS) == 1:
+        print("msgpack не установлен: бинарный протокол не измерялся")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""Нагрузочный бенчмарк реального времени: рассылка сообщений через WebSocket.
+
+Создает N пользователей, личные и групповые чаты (напрямую в базе через COPY),
+открывает для каждого пользователя сокет /ws/user и для части чатов сокеты
+/ws/{chat_id}, после чего пользователи в течение заданного времени отправляют
+сообщения. Отчет содержит перцентили задержки от отправки до получения,
+сообщения в секунду, а при указании --server-pid еще CPU и память сервера
+в расчете на соединение. Результат сохраняется в JSON для сравнения коммитов.
+
+Приложение должно быть запущено отдельно с той же базой и SECRET_KEY:
+    uvicorn app.main:app --port 8000 &
+    python -m benchmarks.ws_load --url ws://localhost:8000 --users 500 --server-pid $!
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+from websockets.asyncio.client import connect
+
+from app.core.config import settings
+from app.core.security import create_access_token
+
+RESULTS_DIR = Path(__file__).parent / "results"
+CONNECT_CONCURRENCY = 100
+
+
+async def seed_chats(
+    raw: asyncpg.Connection, users: int, personal: int, groups: int, group_size: int
+) -> Tuple[List[uuid.UUID], Dict[uuid.UUID, List[uuid.UUID]]]:
+    """Новые пользователи и чаты с уникальными id; существующие данные не трогаются"""
+    run = uuid.uuid4().hex[:8]
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    await raw.copy_records_to_table(
+        "users",
+        records=[(user_id, f"load{i}", f"load-{run}-{i}@example.com", "x") for i, user_id in enumerate(user_ids)],
+        columns=["id", "name", "email", "password"],
+    )
+    chats: Dict[uuid.UUID, List[uuid.UUID]] = {}
+    chat_rows = []
+    group_rows = []
+    for _ in range(personal):
+        chat_id = uuid.uuid4()
+        chats[chat_id] = random.sample(user_ids, 2)
+        chat_rows.append((chat_id, None, "PERSONAL"))
+    for i in range(groups):
+        chat_id = uuid.uuid4()
+        chats[chat_id] = random.sample(user_ids, min(group_size, users))
+        chat_rows.append((chat_id, f"load group {i}", "GROUP"))
+        group_rows.append((uuid.uuid4(), f"load group {i}", chat_id, chats[chat_id][0]))
+    await raw.copy_records_to_table("chats", records=chat_rows, columns=["id", "name", "type"])
+    await raw.copy_records_to_table(
+        "chat_members",
+        records=[(user_id, chat_id) for chat_id, members in chats.items() for user_id in members],
+        columns=["user_id", "chat_id"],
+    )
+    await raw.copy_records_to_table(
+        "groups", records=group_rows, columns=["id", "name", "chat_id", "creator_id"]
+    )
+    await raw.copy_records_to_table(
+        "group_members",
+        records=[(user_id, row[0]) for row in group_rows for user_id in chats[row[2]]],
+        columns=["user_id", "group_id"],
+    )
+    return user_ids, chats
+
+
+def process_sample(pid: Optional[int]) -> Optional[Tuple[float, int]]:
+    """Суммарное процессорное время (с) и RSS (байт) процесса сервера из /proc"""
+    if pid is None:
+        return None
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    with open(f"/proc/{pid}/status") as f:
+        rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+    return cpu, rss
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class Stats:
+    def __init__(self):
+        self.sent = 0
+        self.delivered = 0
+        self.latencies: List[float] = []
+        self.errors = 0
+
+
+async def receive_loop(ws, user_id: uuid.UUID, stats: Stats):
+    """Учет доставленных сообщений; отметка времени отправки зашита в текст"""
+    own = str(user_id)
+    async for raw in ws:
+        event = json.loads(raw)
+        if "error" in event:
+            stats.errors += 1
+            continue
+        if event.get("type") != "message":
+            continue
+        data = event["data"]
+        if data["sender_id"] == own or not data["text"].startswith("bench:"):
+            continue
+        stats.delivered += 1
+        stats.latencies.append(time.perf_counter() - float(data["text"].split(":", 2)[1]))
+
+
+async def open_socket(url: str, stack: list, semaphore: asyncio.Semaphore):
+    async with semaphore:
+        ws = await connect(url, max_size=None)
+        # Первый кадр подтверждает аутентификацию
+        hello = json.loads(await ws.recv())
+        if hello.get("status") != "connected":
+            raise RuntimeError(f"Подключение отклонено: {hello}")
+        stack.append(ws)
+        return ws
+
+
+async def sender(
+    user_ws, chat_sockets: Dict[uuid.UUID, object], user_chats: List[uuid.UUID],
+    rate: float, deadline: float, stats: Stats,
+):
+    await asyncio.sleep(random.random() / rate)
+    while time.perf_counter() < deadline:
+        chat_id = random.choice(user_chats)
+        text = f"bench:{time.perf_counter()}:{uuid.uuid4().hex[:8]}"
+        chat_ws = chat_sockets.get(chat_id)
+        if chat_ws is not None and random.random() < 0.5:
+            await chat_ws.send(json.dumps({"text": text}))
+        else:
+            await user_ws.send(json.dumps({"type": "send", "chat_id": str(chat_id), "text": text}))
+        stats.sent += 1
+        await asyncio.sleep(random.expovariate(rate))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="ws://localhost:8000")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--personal-chats", type=int, default=400)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--group-size", type=int, default=50)
+    parser.add_argument("--chat-socket-ratio", type=float, default=0.3,
+                        help="доля членств, для которых открывается сокет /ws/{chat_id}")
+    parser.add_argument("--rate", type=float, default=1.0, help="сообщений в секунду на пользователя")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--server-pid", type=int)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    raw = await asyncpg.connect(settings.ASYNCPG_DSN)
+    user_ids, chats = await seed_chats(raw, args.users, args.personal_chats, args.groups, args.group_size)
+    await raw.close()
+
+    memberships: Dict[uuid.UUID, List[uuid.UUID]] = {user_id: [] for user_id in user_ids}
+    for chat_id, members in chats.items():
+        for user_id in members:
+            memberships[user_id].append(chat_id)
+
+    stats = Stats()
+    sockets: list = []
+    semaphore = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    baseline = process_sample(args.server_pid)
+
+    # Подключение: /ws/user для каждого и /ws/{chat_id} для части членств
+    user_sockets = {}
+    chat_sockets: Dict[uuid.UUID, Dict[uuid.UUID, object]] = {user_id: {} for user_id in user_ids}
+    started = time.perf_counter()
+
+    async def connect_user(user_id: uuid.UUID):
+        token = create_access_token({"sub": str(user_id)})
+        user_sockets[user_id] = await open_socket(f"{args.url}/ws/user?token={token}", sockets, semaphore)
+        for chat_id in memberships[user_id]:
+            if random.random() < args.chat_socket_ratio:
+                chat_sockets[user_id][chat_id] = await open_socket(
+                    f"{args.url}/ws/{chat_id}?token={token}", sockets, semaphore
+                )
+
+    await asyncio.gather(*(connect_user(user_id) for user_id in user_ids))
+    connect_s = time.perf_counter() - started
+    connected = process_sample(args.server_pid)
+
+    receivers = []
+    for user_id in user_ids:
+        receivers.append(asyncio.create_task(receive_loop(user_sockets[user_id], user_id, stats)))
+        for ws in chat_sockets[user_id].values():
+            receivers.append(asyncio.create_task(receive_loop(ws, user_id, stats)))
+
+    deadline = time.perf_counter() + args.duration
+    load_started = time.perf_counter()
+    await asyncio.gather(*(
+        sender(user_sockets[user_id], chat_sockets[user_id], memberships[user_id], args.rate, deadline, stats)
+        for user_id in user_ids if memberships[user_id]
+    ))
+    # Ждем доставки последних сообщений
+    await asyncio.sleep(2.0)
+    elapsed = time.perf_counter() - load_started
+    loaded = process_sample(args.server_pid)
+
+    for ws in sockets:
+        await ws.close()
+    for task in receivers:
+        task.cancel()
+    await asyncio.gather(*receivers, return_exceptions=True)
+
+    latencies_ms = [latency * 1000 for latency in stats.latencies]
+    result = {
+        "commit": git_commit(),
+        "started_at": datetime.utcnow().isoformat(),
+        "params": {key: (str(value) if isinstance(value, Path) else value) for key, value in vars(args).items()},
+        "connections": len(sockets),
+        "connect_s": connect_s,
+        "sent": stats.sent,
+        "delivered": stats.delivered,
+        "errors": stats.errors,
+        "sent_per_s": stats.sent / elapsed,
+        "delivered_per_s": stats.delivered / elapsed,
+        "latency_ms": {
+            "p50": percentile(latencies_ms, 0.5),
+            "p90": percentile(latencies_ms, 0.9),
+            "p99": percentile(latencies_ms, 0.99),
+            "max": max(latencies_ms, default=0.0),
+            "mean": statistics.fmean(latencies_ms) if latencies_ms else 0.0,
+        },
+    }
+    if baseline and connected and loaded:
+        result["server"] = {
+            "cpu_percent": (loaded[0] - connected[0]) / elapsed * 100,
+            "cpu_ms_per_delivery": (loaded[0] - connected[0]) * 1000 / max(stats.delivered, 1),
+            "rss_bytes": loaded[1],
+            "rss_bytes_per_connection": (connected[1] - baseline[1]) / max(len(sockets), 1),
+        }
+
+    output = args.output or RESULTS_DIR / f"ws_load-{result['commit']}-{int(time.time())}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    print(f"saved to {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
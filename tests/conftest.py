@@ -0,0 +1,41 @@
+import asyncio
+import os
+
+import asyncpg
+import pytest
+
+from app.core.config import settings
+
+# Тесты с базой пересоздают таблицы, поэтому работают только с отдельной базой
+TEST_DATABASE = os.environ.get("TEST_POSTGRES_DB", "messenger_test")
+
+
+async def _can_connect() -> bool:
+    try:
+        connection = await asyncpg.connect(settings.ASYNCPG_DSN, timeout=2)
+    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError):
+        return False
+    await connection.close()
+    return True
+
+
+@pytest.fixture(scope="session")
+def database():
+    """DSN тестовой базы TEST_POSTGRES_DB; без доступного PostgreSQL тест пропускается.
+
+    Настройки приложения и переменные окружения (для дочерних процессов)
+    на время сессии указывают на тестовую базу.
+    """
+    previous = settings.POSTGRES_DB, os.environ.get("POSTGRES_DB")
+    settings.POSTGRES_DB = TEST_DATABASE
+    os.environ["POSTGRES_DB"] = TEST_DATABASE
+    try:
+        if not asyncio.run(_can_connect()):
+            pytest.skip(f"PostgreSQL database {TEST_DATABASE} is not available at {settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}")
+        yield settings.ASYNCPG_DSN
+    finally:
+        settings.POSTGRES_DB = previous[0]
+        if previous[1] is None:
+            os.environ.pop("POSTGRES_DB", None)
+        else:
+            os.environ["POSTGRES_DB"] = previous[1]
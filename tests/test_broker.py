@@ -0,0 +1,269 @@
+import asyncio
+import json
+import multiprocessing
+import time
+import uuid
+from typing import Any, Dict, List
+
+import pytest
+
+from app.core import broker as broker_module
+from app.core.broker import InMemoryBroker, PostgresBroker
+
+WORKERS = 3
+TIMEOUT = 10.0
+
+
+class FakeTransaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeConnection:
+    """Соединение asyncpg, которое запоминает отправленные уведомления"""
+
+    def __init__(self, closed: bool = False, fail: bool = False):
+        self.closed = closed
+        self.fail = fail
+        self.payloads: List[str] = []
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+    def transaction(self):
+        return FakeTransaction()
+
+    async def execute(self, query: str, channel: str, payload: str):
+        if self.fail:
+            # Так ведет себя разорванное соединение: оно закрывается и бросает исключение
+            self.closed = True
+            raise ConnectionError("connection was closed")
+        self.payloads.append(payload)
+
+
+def make_broker(received: List[Dict[str, Any]]) -> PostgresBroker:
+    broker = PostgresBroker("postgresql://unused", "test")
+
+    async def handler(event):
+        received.append(event)
+
+    broker.bind(handler)
+    return broker
+
+
+async def notify(broker: PostgresBroker, payloads: List[str]):
+    for payload in payloads:
+        broker._on_notify(None, 0, broker.channel, payload)
+    # Обработчик запускается отдельной задачей
+    await asyncio.sleep(0)
+
+
+async def test_in_memory_broker_delivers_locally():
+    received = []
+    broker = InMemoryBroker()
+
+    async def handler(event):
+        received.append(event)
+
+    broker.bind(handler)
+    await broker.publish({"type": "user", "user_id": "1"})
+    assert received == [{"type": "user", "user_id": "1"}]
+
+
+async def test_large_event_is_split_and_reassembled():
+    sent, received = [], []
+    sender, listener = make_broker(sent), make_broker(received)
+    sender.publisher = FakeConnection()
+    event = {"type": "message", "data": {"text": "x" * 20000}}
+
+    await sender.publish(event)
+    assert sent == [event]
+    assert len(sender.publisher.payloads) == 3
+
+    await notify(listener, sender.publisher.payloads)
+    assert received == [event]
+    assert listener.pending_parts == {}
+
+
+async def test_own_notifications_are_skipped():
+    sent = []
+    broker = make_broker(sent)
+    broker.publisher = FakeConnection()
+    await broker.publish({"type": "user", "user_id": "1"})
+
+    await notify(broker, broker.publisher.payloads)
+    assert sent == [{"type": "user", "user_id": "1"}]
+
+
+async def test_publish_reopens_closed_publisher(monkeypatch):
+    sent = []
+    broker = make_broker(sent)
+    broker.publisher = FakeConnection(fail=True)
+    fresh = FakeConnection()
+
+    async def connect_publisher():
+        broker.publisher = fresh
+
+    monkeypatch.setattr(broker, "_connect_publisher", connect_publisher)
+    await broker.publish({"type": "user", "user_id": "1"})
+    assert len(fresh.payloads) == 1
+
+    # Следующая публикация идет через новое соединение без переподключения
+    await broker.publish({"type": "user", "user_id": "2"})
+    assert len(fresh.payloads) == 2
+
+
+async def test_publish_gives_up_after_failed_reconnect(monkeypatch):
+    broker = make_broker([])
+    broker.publisher = FakeConnection(closed=True)
+    attempts = []
+
+    async def connect_publisher():
+        attempts.append(1)
+        raise OSError("connection refused")
+
+    monkeypatch.setattr(broker, "_connect_publisher", connect_publisher)
+    await broker.publish({"type": "user", "user_id": "1"})
+    assert len(attempts) == 2
+
+
+async def test_incomplete_event_expires(monkeypatch):
+    sent, received = [], []
+    sender, listener = make_broker(sent), make_broker(received)
+    sender.publisher = FakeConnection()
+    await sender.publish({"type": "message", "data": {"text": "x" * 20000}})
+    first, *rest = sender.publisher.payloads
+
+    now = time.monotonic()
+    monkeypatch.setattr(broker_module.time, "monotonic", lambda: now)
+    await notify(listener, [first])
+    assert len(listener.pending_parts) == 1
+
+    # Остальные части так и не пришли; сборка следующего события удаляет устаревшее
+    now += PostgresBroker.PENDING_PARTS_TTL
+    sender.publisher.payloads.clear()
+    await sender.publish({"type": "message", "data": {"text": "y" * 20000}})
+    await notify(listener, sender.publisher.payloads[:1])
+    assert len(listener.pending_parts) == 1
+    assert received == []
+
+
+async def test_pending_events_are_limited(monkeypatch):
+    listener = make_broker([])
+    monkeypatch.setattr(PostgresBroker, "PENDING_PARTS_LIMIT", 2)
+    await notify(listener, [f"other:{event_id}:0:2:{{" for event_id in ("a", "b", "c")])
+    assert list(listener.pending_parts) == ["b", "c"]
+
+
+async def test_malformed_payloads_are_ignored():
+    received = []
+    listener = make_broker(received)
+    await notify(listener, ["garbage", "other:a:x:2:{}", "other:a:5:2:{}"])
+    assert received == []
+    assert listener.pending_parts == {}
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, data: str):
+        self.frames.append(json.loads(data))
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+async def run_worker(index: int, chat_id: uuid.UUID, ready, go, results):
+    from app.api.websockets import ConnectionManager
+    from app.core.config import settings
+
+    manager = ConnectionManager(PostgresBroker(settings.ASYNCPG_DSN, settings.BROKER_CHANNEL))
+    await manager.start()
+    websocket = RecordingWebSocket()
+    await manager.connect(websocket, uuid.uuid4(), chat_id)
+    ready.release()
+
+    # Ждем, пока все процессы подпишутся на канал
+    while not go.is_set():
+        await asyncio.sleep(0.01)
+
+    if index == 0:
+        await manager.broadcast_to_chat({"type": "message", "data": {"text": "ping"}}, chat_id)
+        await manager.broadcast_to_chat({"type": "message", "data": {"text": "x" * 20000}}, chat_id)
+
+    deadline = time.monotonic() + TIMEOUT
+    while len(websocket.frames) < 2 and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+    results.put((index, [len(frame["data"]["text"]) for frame in websocket.frames]))
+    await manager.stop()
+
+
+def worker(index, chat_id, ready, go, results):
+    asyncio.run(run_worker(index, chat_id, ready, go, results))
+
+
+def test_events_reach_every_process(database):
+    """Сообщение одного процесса доходит до сокетов всех процессов, включая крупное"""
+    context = multiprocessing.get_context("spawn")
+    chat_id = uuid.uuid4()
+    ready = context.Semaphore(0)
+    go = context.Event()
+    results = context.Queue()
+
+    processes = [
+        context.Process(target=worker, args=(index, chat_id, ready, go, results))
+        for index in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for _ in processes:
+            assert ready.acquire(timeout=TIMEOUT)
+        go.set()
+        received = dict(results.get(timeout=TIMEOUT * 2) for _ in processes)
+    finally:
+        for process in processes:
+            process.join(timeout=TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+
+    assert received == {index: [4, 20000] for index in range(WORKERS)}
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+async def test_resync_reloads_membership(monkeypatch):
+    from app.api import websockets
+    from app.api.websockets import ConnectionManager
+    from app.db.repositories import ChatRepository
+
+    user_id, kept, left, joined = (uuid.uuid4() for _ in range(4))
+
+    async def get_chat_ids_for_users(self, user_ids):
+        return {user_id: {kept, joined}}
+
+    monkeypatch.setattr(websockets, "async_session", FakeSession)
+    monkeypatch.setattr(ChatRepository, "get_chat_ids_for_users", get_chat_ids_for_users)
+    manager = ConnectionManager()
+    connection = await manager.connect_user(RecordingWebSocket(), user_id, [kept, left])
+    chat_socket = RecordingWebSocket()
+    await manager.connect(chat_socket, user_id, left)
+
+    # Пока слушатель был отключен, пользователя убрали из одного чата и добавили в другой
+    await manager._handle_event({"type": "resync"})
+    assert connection.chats == {kept, joined}
+    assert set(manager.chat_subscribers) == {kept, joined}
+    assert left not in manager.chat_connections
+    await asyncio.sleep(0)
+    assert chat_socket.closed_with == 1008
@@ -0,0 +1,73 @@
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.security import get_current_user
+from app.db.base import get_db
+from app.db.models import ChatType
+from app.db.repositories import ChatRepository, MessageRepository
+from app.main import app
+from app.schemas.user import CurrentUser
+
+USER = CurrentUser(id=uuid.uuid4(), name="Alice", email="alice@example.com")
+OTHER = SimpleNamespace(id=uuid.uuid4(), name="Bob", email="bob@example.com")
+TIMESTAMP = datetime(2026, 1, 1, 12, 0)
+
+
+def chat(name=None):
+    return SimpleNamespace(id=uuid.uuid4(), name=name, type=ChatType.PERSONAL, members=[USER, OTHER])
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """GET /chats/with-last-message с репозиториями, считающими обращения"""
+    chats = [chat("active"), chat("quiet")]
+    last = SimpleNamespace(id=uuid.uuid4(), sender_id=OTHER.id, sender_name=OTHER.name, text="привет", timestamp=TIMESTAMP, is_read=False)
+    calls = []
+
+    async def get_user_chats(self, user_id):
+        calls.append("get_user_chats")
+        return chats
+
+    async def get_last_messages_for_user(self, user_id):
+        calls.append("get_last_messages_for_user")
+        return {chats[0].id: last}
+
+    async def get_unread_counts_for_user(self, user_id):
+        calls.append("get_unread_counts_for_user")
+        return {chats[0].id: 3}
+
+    monkeypatch.setattr(ChatRepository, "get_user_chats", get_user_chats)
+    monkeypatch.setattr(MessageRepository, "get_last_messages_for_user", get_last_messages_for_user)
+    monkeypatch.setattr(MessageRepository, "get_unread_counts_for_user", get_unread_counts_for_user)
+    app.dependency_overrides[get_current_user] = lambda: USER
+    app.dependency_overrides[get_db] = lambda: None
+    yield TestClient(app), chats, last, calls
+    app.dependency_overrides.clear()
+
+
+def test_chat_list_with_last_message(client):
+    http, chats, last, calls = client
+    response = http.get("/api/v1/chats/with-last-message")
+    assert response.status_code == 200
+    active, quiet = response.json()
+
+    assert active["id"] == str(chats[0].id)
+    assert active["unread_count"] == 3
+    assert active["last_message"] == {
+        "id": str(last.id),
+        "sender_id": str(OTHER.id),
+        "sender_name": "Bob",
+        "text": "привет",
+        "timestamp": TIMESTAMP.isoformat(),
+        "is_read": False,
+    }
+    assert [member["name"] for member in active["members"]] == ["Alice", "Bob"]
+    # Чат без сообщений попадает в список с пустым последним сообщением
+    assert quiet["last_message"] is None
+    assert quiet["unread_count"] == 0
+    # Число запросов не зависит от числа чатов
+    assert sorted(calls) == ["get_last_messages_for_user", "get_unread_counts_for_user", "get_user_chats"]
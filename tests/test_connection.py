@@ -0,0 +1,183 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from app.api.websockets import ConnectionManager
+from app.core.config import settings
+from app.core.encoding import Frame
+
+QUEUE_SIZE = 2
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
+        self.closed_with = None
+
+    async def send_text(self, data: str):
+        self.frames.append(json.loads(data))
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+@pytest.fixture
+async def manager(monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_QUEUE_SIZE", QUEUE_SIZE)
+    manager = ConnectionManager()
+    yield manager
+    # Писатели зависших сокетов не должны пережить тест
+    for user_id, chats in list(manager.active_connections.items()):
+        for chat_id in list(chats):
+            manager.disconnect(user_id, chat_id)
+    for user_id in list(manager.user_connections):
+        manager.disconnect_user(user_id)
+    await asyncio.sleep(0)
+
+
+class StalledWebSocket(RecordingWebSocket):
+    """Сокет, отправка в который не завершается: получатель медленный"""
+
+    async def send_text(self, data: str):
+        await asyncio.Event().wait()
+
+
+async def connect(manager: ConnectionManager, start: bool = True):
+    websocket = StalledWebSocket() if start else RecordingWebSocket()
+    chat_id = uuid.uuid4()
+    connection = await manager.connect(websocket, uuid.uuid4(), chat_id, start=start)
+    return websocket, chat_id, connection
+
+
+def fill(connection, count: int):
+    return [connection.enqueue(Frame({"n": n})) for n in range(count)]
+
+
+def queued(connection):
+    return [frame.data["n"] for frame in list(connection.queue._queue)]
+
+
+async def test_drop_oldest_keeps_newest_frames(manager, monkeypatch):
+    monkeypatch.setattr(settings, "WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+    _, _, connection = await connect(manager)
+    assert fill(connection, 4) == [True, True, True, True]
+    assert queued(connection) == [2, 3]
+    assert connection.dropped == 2
+    assert manager.get_stats()["dropped_messages"] == 2
+
+
+async def test_drop_new_keeps_queued_frames(manager, monkeypatch):
+    monkeypatch.setattr(settings, "WS_SLOW_CONSUMER_POLICY", "drop_new")
+    _, _, connection = await connect(manager)
+    assert fill(connection, 3) == [True, True, False]
+    assert queued(connection) == [0, 1]
+    assert connection.dropped == 1
+
+
+async def test_disconnect_evicts_slow_consumer(manager, monkeypatch):
+    monkeypatch.setattr(settings, "WS_SLOW_CONSUMER_POLICY", "disconnect")
+    websocket, chat_id, connection = await connect(manager)
+    assert fill(connection, 3) == [True, True, False]
+    await asyncio.sleep(0)
+    assert connection.closed
+    assert chat_id not in manager.chat_connections
+    assert websocket.closed_with == 1013
+    assert manager.get_stats()["evicted_connections"] == 1
+
+
+async def test_writer_sends_prelude_before_queued_frames(manager):
+    websocket, _, connection = await connect(manager, start=False)
+    fill(connection, 2)
+    connection.start(Frame({"n": "prelude"}))
+    await asyncio.sleep(0.01)
+    assert [frame["n"] for frame in websocket.frames] == ["prelude", 0, 1]
+    connection.close()
+
+
+async def test_backlog_before_start_is_not_evicted(manager, monkeypatch):
+    # Пока загружается повтор, события копятся сверх размера очереди
+    monkeypatch.setattr(settings, "WS_SLOW_CONSUMER_POLICY", "disconnect")
+    websocket, chat_id, connection = await connect(manager, start=False)
+    assert all(fill(connection, QUEUE_SIZE * 3))
+    assert manager.get_stats()["queue_depth_total"] == QUEUE_SIZE * 3
+
+    connection.start(Frame({"n": "prelude"}))
+    await asyncio.sleep(0.01)
+    assert [frame["n"] for frame in websocket.frames] == ["prelude"] + list(range(QUEUE_SIZE * 3))
+    assert not connection.closed
+    assert manager.get_stats()["evicted_connections"] == 0
+    connection.close()
+
+
+async def test_backlog_limit_applies_policy(manager, monkeypatch):
+    monkeypatch.setattr(settings, "WS_START_BACKLOG_SIZE", 3)
+    monkeypatch.setattr(settings, "WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+    websocket, _, connection = await connect(manager, start=False)
+    fill(connection, 5)
+    connection.start()
+    await asyncio.sleep(0.01)
+    assert [frame["n"] for frame in websocket.frames] == [2, 3, 4]
+    assert connection.dropped == 2
+    connection.close()
+
+
+def test_unknown_policy_fails_at_settings_load(monkeypatch):
+    from pydantic import ValidationError
+
+    from app.core.config import Settings
+
+    monkeypatch.setenv("WS_SLOW_CONSUMER_POLICY", "drop_olde")
+    with pytest.raises(ValidationError):
+        Settings()
+
+
+async def test_chat_message_reaches_only_members(manager):
+    chat_id, other_chat_id = uuid.uuid4(), uuid.uuid4()
+    member, outsider = RecordingWebSocket(), RecordingWebSocket()
+    await manager.connect_user(member, uuid.uuid4(), [chat_id])
+    await manager.connect_user(outsider, uuid.uuid4(), [other_chat_id])
+
+    await manager.broadcast_to_chat({"type": "message", "data": {"text": "hi"}}, chat_id)
+    await asyncio.sleep(0.01)
+    assert member.frames == [{"type": "message", "data": {"text": "hi", "chat_id": str(chat_id)}}]
+    assert outsider.frames == []
+
+
+async def test_removed_member_stops_receiving_chat(manager):
+    chat_id, user_id = uuid.uuid4(), uuid.uuid4()
+    global_socket, chat_socket = RecordingWebSocket(), RecordingWebSocket()
+    await manager.connect_user(global_socket, user_id, [chat_id])
+    await manager.connect(chat_socket, user_id, chat_id)
+
+    await manager.remove_chat_members(chat_id, [user_id])
+    await manager.broadcast_to_chat({"type": "message", "data": {"text": "hi"}}, chat_id)
+    await asyncio.sleep(0.01)
+    assert global_socket.frames == []
+    assert chat_socket.frames == []
+    # Сокет чата закрывается с кодом нарушения политики, а не остается висеть
+    assert chat_socket.closed_with == 1008
+    assert chat_id not in manager.chat_connections
+    assert chat_id not in manager.chat_subscribers
+
+
+async def test_broadcast_message_fills_recent_buffer(manager, monkeypatch):
+    from datetime import datetime
+
+    from app.api import websockets
+    from app.services.recent_messages import RecentMessages
+
+    buffer = RecentMessages(per_chat=5, max_chats=10, max_bytes=10 ** 6, ttl=60)
+    monkeypatch.setattr(websockets, "recent_messages", buffer)
+    chat_id, sender_id = uuid.uuid4(), uuid.uuid4()
+    buffer.begin_load(chat_id)
+    buffer.end_load(chat_id, [], complete=True)
+
+    result = {
+        "id": uuid.uuid4(), "chat_id": chat_id, "sender_id": sender_id,
+        "sender": {"id": sender_id, "name": "Alice", "email": "alice@example.com"},
+        "text": "hi", "timestamp": datetime(2026, 1, 1, 12, 0), "is_read": False,
+    }
+    await manager.broadcast_message(result, "Alice")
+    assert buffer.latest(chat_id, 1) == [result]
@@ -0,0 +1,32 @@
+import json
+import uuid
+from datetime import datetime
+
+from app.core.encoding import Frame, json_codec
+
+EVENT = {
+    "type": "message",
+    "data": {
+        "id": str(uuid.uuid4()),
+        "sender_id": str(uuid.uuid4()),
+        "sender_name": "Имя",
+        "text": "привет",
+        "timestamp": str(datetime(2026, 1, 1, 12, 0, 0, 123456)),
+        "is_read": False,
+    },
+}
+
+
+def test_json_codec_round_trip():
+    assert json.loads(json_codec.encode(EVENT)) == EVENT
+    assert json_codec.decode({"text": json_codec.encode(EVENT)}) == EVENT
+
+
+def test_frame_is_encoded_once(monkeypatch):
+    calls = []
+    encode = json_codec.encode
+    monkeypatch.setattr(json_codec, "encode", lambda data: calls.append(1) or encode(data))
+    frame = Frame(EVENT)
+    # Один кадр рассылается всем получателям: повторные отправки берут готовые байты
+    assert frame.encode(json_codec) == frame.encode(json_codec)
+    assert len(calls) == 1
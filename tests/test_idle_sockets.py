@@ -0,0 +1,16 @@
+import os
+
+from benchmarks.idle_sockets import SOCKETS, run
+
+# Полный прогон на 10 000 сокетах занимает минуты, поэтому включается явно
+FULL_RUN = os.environ.get("IDLE_SOCKETS_FULL") == "1"
+
+
+async def test_idle_sockets_do_not_hold_pooled_connections(database):
+    if FULL_RUN:
+        failures, timings = await run(sockets_count=SOCKETS, rest_requests=200, active_count=100)
+    else:
+        failures, timings = await run(sockets_count=500, rest_requests=50, active_count=20)
+    assert failures == []
+    # Каждое подключение берет соединение из пула не больше одного раза
+    assert timings["checkouts_per_socket"] <= 1
@@ -0,0 +1,14 @@
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from benchmarks.loading_profiles import measure_profiles
+
+
+async def test_login_auth_and_chat_list_stay_within_budget(database):
+    engine = create_async_engine(settings.DATABASE_URL)
+    try:
+        results = await measure_profiles(engine)
+    finally:
+        await engine.dispose()
+
+    assert [row for row in results if not row["ok"]] == []
@@ -0,0 +1,42 @@
+import uuid
+
+import pytest
+
+from app.api.websockets import ConnectionManager
+from app.services.membership import membership_cache, remember_chat_members
+
+CHAT = uuid.uuid4()
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    membership_cache.clear()
+    yield
+    membership_cache.clear()
+
+
+async def test_created_chat_stays_cached_after_members_event():
+    # Так создается чат: сервис записывает состав, эндпоинт публикует событие
+    members = [uuid.uuid4(), uuid.uuid4()]
+    remember_chat_members(CHAT, members)
+    await ConnectionManager().add_chat_members(CHAT, members)
+    assert membership_cache.get(CHAT) == frozenset(members)
+
+
+async def test_members_event_invalidates_stale_entry():
+    member, newcomer = uuid.uuid4(), uuid.uuid4()
+    remember_chat_members(CHAT, [member])
+    await ConnectionManager().add_chat_members(CHAT, [newcomer])
+    assert membership_cache.get(CHAT) is None
+
+
+async def test_removal_invalidates_entry_with_removed_member():
+    member, leaving = uuid.uuid4(), uuid.uuid4()
+    manager = ConnectionManager()
+    remember_chat_members(CHAT, [member])
+    await manager.remove_chat_members(CHAT, [leaving])
+    assert membership_cache.get(CHAT) == frozenset([member])
+
+    remember_chat_members(CHAT, [member, leaving])
+    await manager.remove_chat_members(CHAT, [leaving])
+    assert membership_cache.get(CHAT) is None
@@ -0,0 +1,95 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from app.services.message_ingestion import IngestorStopped, MessageIngestor
+
+
+class RecordingIngestor(MessageIngestor):
+    """Ингестор, который вместо базы запоминает пакеты"""
+
+    def __init__(self, **kwargs):
+        super().__init__(session_factory=None, **kwargs)
+        self.inserted: List[List[dict]] = []
+        self.release = asyncio.Event()
+        self.release.set()
+        self.failing_texts = set()
+
+    async def _insert(self, values: List[dict]):
+        await self.release.wait()
+        if any(item["text"] in self.failing_texts for item in values):
+            raise ValueError("bad row")
+        self.inserted.append(values)
+        return [SimpleNamespace(**item) for item in values]
+
+
+def submit(ingestor: MessageIngestor, text: str):
+    return asyncio.create_task(ingestor.submit(uuid.uuid4(), uuid.uuid4(), text))
+
+
+async def test_concurrent_messages_share_a_batch():
+    ingestor = RecordingIngestor(window_ms=50, batch_size=10)
+    tasks = [submit(ingestor, f"m{i}") for i in range(5)]
+    rows = await asyncio.gather(*tasks)
+    assert [row.text for row in rows] == [f"m{i}" for i in range(5)]
+    assert len(ingestor.inserted) == 1
+    await ingestor.stop()
+
+
+async def test_batch_is_limited_by_size():
+    ingestor = RecordingIngestor(window_ms=50, batch_size=2)
+    await asyncio.gather(*[submit(ingestor, f"m{i}") for i in range(5)])
+    assert [len(batch) for batch in ingestor.inserted] == [2, 2, 1]
+    await ingestor.stop()
+
+
+async def test_failed_row_does_not_reject_batch():
+    ingestor = RecordingIngestor(window_ms=50, batch_size=10)
+    ingestor.failing_texts = {"bad"}
+    tasks = [submit(ingestor, text) for text in ("ok1", "bad", "ok2")]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert results[0].text == "ok1" and results[2].text == "ok2"
+    assert isinstance(results[1], ValueError)
+    await ingestor.stop()
+
+
+async def test_stop_waits_for_batch_in_flight():
+    ingestor = RecordingIngestor(window_ms=0, batch_size=10)
+    ingestor.release.clear()
+    first = submit(ingestor, "in flight")
+    await asyncio.sleep(0.01)
+    # Пакет уже записывается; следующее сообщение ждет в очереди
+    second = submit(ingestor, "queued")
+    await asyncio.sleep(0)
+
+    stopping = asyncio.create_task(ingestor.stop())
+    await asyncio.sleep(0.01)
+    assert not stopping.done()
+    ingestor.release.set()
+    await stopping
+
+    assert (await first).text == "in flight"
+    assert (await second).text == "queued"
+    assert [item["text"] for batch in ingestor.inserted for item in batch] == ["in flight", "queued"]
+
+
+async def test_submit_after_stop_is_rejected():
+    ingestor = RecordingIngestor()
+    await submit(ingestor, "m")
+    await ingestor.stop()
+    with pytest.raises(IngestorStopped):
+        await ingestor.submit(uuid.uuid4(), uuid.uuid4(), "late")
+
+
+async def test_cancelled_worker_fails_waiting_senders():
+    ingestor = RecordingIngestor(window_ms=0)
+    ingestor.release.clear()
+    pending = submit(ingestor, "m")
+    await asyncio.sleep(0.01)
+    ingestor.worker.cancel()
+    with pytest.raises(IngestorStopped):
+        await asyncio.wait_for(pending, 1)
+    await ingestor.stop()
@@ -0,0 +1,26 @@
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.core.pagination import decode_cursor, encode_cursor
+
+TIMESTAMP = datetime(2026, 1, 1, 12, 0, 0, 123456)
+MESSAGE_ID = uuid.uuid4()
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(TIMESTAMP, MESSAGE_ID)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (TIMESTAMP, MESSAGE_ID)
+
+
+def test_missing_cursor_decodes_to_none():
+    assert decode_cursor(None) is None
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor(TIMESTAMP, MESSAGE_ID)[:-4], "////"])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
@@ -0,0 +1,36 @@
+from datetime import datetime
+
+import asyncpg
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.db.partitions import recent_window_start
+from benchmarks.dataset import reset_schema
+from benchmarks.query_plans import HISTORY_DAYS, check_partitions, check_plans, seed_recent
+
+
+async def test_hot_path_queries_use_indexes(database):
+    engine = create_async_engine(settings.DATABASE_URL)
+    try:
+        await reset_schema(engine, history_days=HISTORY_DAYS)
+        raw = await asyncpg.connect(database)
+        try:
+            dataset = await seed_recent(raw)
+            plans = await check_plans(engine, raw, dataset)
+            partitions = await check_partitions(engine, raw, dataset)
+        finally:
+            await raw.close()
+    finally:
+        await engine.dispose()
+
+    assert "MessageRepository.search" in plans
+    assert "ChatRepository.get_member_ids" in plans
+    assert {name: scans for name, scans in plans.items() if scans} == {}
+    # Горячие запросы читают только текущую и предыдущую секции
+    assert "MessageRepository.get_last_messages_for_user" in partitions
+    assert {name: old for name, old in partitions.items() if old} == {}
+
+
+def test_recent_window_starts_at_previous_month():
+    assert recent_window_start(datetime(2026, 3, 31, 23, 59)) == datetime(2026, 2, 1)
+    assert recent_window_start(datetime(2026, 1, 1)) == datetime(2025, 12, 1)
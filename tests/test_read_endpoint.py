@@ -0,0 +1,97 @@
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.security import get_current_user
+from app.db.base import get_db
+from app.db.repositories import MessageRepository
+from app.main import app
+from app.schemas.user import CurrentUser
+from app.services import message_service
+
+USER = CurrentUser(id=uuid.uuid4(), name="Alice", email="alice@example.com")
+CHAT = uuid.uuid4()
+OTHER_CHAT = uuid.uuid4()
+READ_AT = datetime(2026, 1, 1, 12, 30)
+
+
+def message(chat_id=CHAT):
+    return SimpleNamespace(id=uuid.uuid4(), chat_id=chat_id, timestamp=datetime(2026, 1, 1, 12, 0))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """POST /chats/{chat_id}/read с репозиторием, записывающим отметки в список"""
+    messages = {}
+    marks = []
+
+    async def is_chat_member(db, chat_id, user_id):
+        return chat_id in (CHAT, OTHER_CHAT)
+
+    async def get_by_id(self, message_id):
+        return messages.get(message_id)
+
+    async def get_last_message(self, chat_id):
+        return next((item for item in reversed(list(messages.values())) if item.chat_id == chat_id), None)
+
+    async def mark_read_up_to(self, chat_id, user_id, timestamp, message_id):
+        marks.append((chat_id, user_id, timestamp, message_id))
+        return SimpleNamespace(last_read_message_id=message_id, updated_at=READ_AT), []
+
+    monkeypatch.setattr(message_service, "is_chat_member", is_chat_member)
+    monkeypatch.setattr(MessageRepository, "get_by_id", get_by_id)
+    monkeypatch.setattr(MessageRepository, "get_last_message", get_last_message)
+    monkeypatch.setattr(MessageRepository, "mark_read_up_to", mark_read_up_to)
+    app.dependency_overrides[get_current_user] = lambda: USER
+    app.dependency_overrides[get_db] = lambda: None
+    yield TestClient(app), messages, marks
+    app.dependency_overrides.clear()
+
+
+def test_read_up_to_message_is_one_mark(client):
+    http, messages, marks = client
+    first, second = message(), message()
+    messages.update({first.id: first, second.id: second})
+
+    response = http.post(f"/api/v1/chats/{CHAT}/read", json={"message_id": str(first.id)})
+    assert response.status_code == 200
+    assert response.json() == {
+        "chat_id": str(CHAT),
+        "user_id": str(USER.id),
+        "last_read_message_id": str(first.id),
+        "read_at": READ_AT.isoformat(),
+    }
+    assert marks == [(CHAT, USER.id, first.timestamp, first.id)]
+
+
+def test_read_without_message_marks_up_to_last(client):
+    http, messages, marks = client
+    first, last = message(), message()
+    messages.update({first.id: first, last.id: last})
+
+    response = http.post(f"/api/v1/chats/{CHAT}/read")
+    assert response.status_code == 200
+    assert response.json()["last_read_message_id"] == str(last.id)
+    assert marks == [(CHAT, USER.id, last.timestamp, last.id)]
+
+
+def test_read_in_empty_chat_marks_nothing(client):
+    http, _, marks = client
+    response = http.post(f"/api/v1/chats/{CHAT}/read")
+    assert response.status_code == 200
+    assert response.json()["last_read_message_id"] is None
+    assert marks == []
+
+
+def test_message_from_another_chat_is_rejected(client):
+    http, messages, marks = client
+    foreign = message(OTHER_CHAT)
+    messages[foreign.id] = foreign
+
+    response = http.post(f"/api/v1/chats/{CHAT}/read", json={"message_id": str(foreign.id)})
+    assert response.status_code == 400
+    assert http.post(f"/api/v1/chats/{uuid.uuid4()}/read").status_code == 400
+    assert marks == []
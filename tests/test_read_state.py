@@ -0,0 +1,56 @@
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.services.message_service import MessageService
+
+NOW = datetime(2026, 1, 1, 12, 0)
+USER = uuid.uuid4()
+OTHER = uuid.uuid4()
+CHAT = uuid.uuid4()
+
+
+class FakeRepository:
+    def __init__(self, read_state=None):
+        self.read_state = read_state
+        self.reads = 0
+
+    async def get_read_state(self, chat_id, user_id):
+        self.reads += 1
+        return self.read_state
+
+
+def make_service(read_state=None) -> MessageService:
+    service = MessageService(None)
+    service.repository = FakeRepository(read_state)
+    return service
+
+
+def message(sender_id, minutes: int, is_read: bool = False):
+    return {"id": uuid.uuid4(), "sender_id": sender_id, "timestamp": NOW + timedelta(minutes=minutes), "is_read": is_read}
+
+
+async def test_page_without_foreign_messages_skips_read_state():
+    service = make_service()
+    assert not await service._has_unread(CHAT, USER, [message(USER, 1), message(USER, 0)])
+    assert service.repository.reads == 0
+
+
+async def test_first_read_marks_page():
+    service = make_service()
+    assert await service._has_unread(CHAT, USER, [message(OTHER, 0)])
+
+
+async def test_page_behind_own_watermark_is_not_marked_again():
+    # Общий флаг is_read остается False, пока сообщение не прочитал отстающий участник
+    page = [message(OTHER, 1), message(OTHER, 0)]
+    newest = page[0]
+    service = make_service(SimpleNamespace(last_read_at=newest["timestamp"], last_read_message_id=newest["id"]))
+    assert not await service._has_unread(CHAT, USER, page)
+
+
+async def test_newer_foreign_message_is_marked():
+    page = [message(OTHER, 2), message(OTHER, 1)]
+    older = page[1]
+    service = make_service(SimpleNamespace(last_read_at=older["timestamp"], last_read_message_id=older["id"]))
+    assert await service._has_unread(CHAT, USER, page)
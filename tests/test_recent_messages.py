@@ -0,0 +1,141 @@
+import uuid
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.services.recent_messages import ChatBuffer, RecentMessages, buffer_allowed
+
+NOW = datetime(2026, 1, 1, 12, 0)
+CHAT = uuid.uuid4()
+
+
+def message(minutes: float, text: str = "text"):
+    return {"id": uuid.uuid4(), "chat_id": CHAT, "timestamp": NOW + timedelta(minutes=minutes), "text": text, "is_read": False}
+
+
+def make_buffer(**kwargs) -> RecentMessages:
+    options = {"per_chat": 5, "max_chats": 10, "max_bytes": 10 ** 6, "ttl": 60}
+    options.update(kwargs)
+    return RecentMessages(**options)
+
+
+def load(buffer: RecentMessages, messages, complete: bool = False):
+    buffer.begin_load(CHAT)
+    buffer.end_load(CHAT, messages, complete=complete)
+
+
+def test_chat_buffer_keeps_order_and_capacity():
+    history = [message(i) for i in range(3)]
+    buffer = ChatBuffer(3, history, complete=True)
+    late = message(1.5)
+    buffer.add(late)
+    # Вставка по позиции вытесняет самое старое сообщение, и история становится неполной
+    assert [item["id"] for item in buffer.messages] == [history[1]["id"], late["id"], history[2]["id"]]
+    assert not buffer.complete
+    # Сообщение старше всего заполненного буфера не добавляется
+    assert buffer.add(message(-10)) == 0
+
+
+def test_older_message_makes_full_buffer_incomplete():
+    history = [message(i) for i in range(3)]
+    buffer = ChatBuffer(3, history, complete=True)
+    assert buffer.add(message(-10)) == 0
+    assert not buffer.complete
+
+
+def test_latest_serves_loaded_tail_and_appends():
+    buffer = make_buffer()
+    history = [message(i) for i in range(3)]
+    load(buffer, history, complete=True)
+    new = message(10)
+    buffer.append(CHAT, new)
+    latest = buffer.latest(CHAT, 2)
+    assert [item["id"] for item in latest] == [new["id"], history[2]["id"], history[1]["id"]]
+
+
+def test_latest_misses_when_buffer_is_too_short():
+    buffer = make_buffer()
+    load(buffer, [message(i) for i in range(3)], complete=False)
+    assert buffer.latest(CHAT, 5) is None
+    assert buffer.latest(CHAT, 2) is not None
+
+
+def test_after_requires_cursor_inside_buffer():
+    buffer = make_buffer()
+    history = [message(i) for i in range(3)]
+    load(buffer, history, complete=False)
+    newer = buffer.after(CHAT, (history[0]["timestamp"], history[0]["id"]), 10)
+    assert [item["id"] for item in newer] == [history[1]["id"], history[2]["id"]]
+    assert buffer.after(CHAT, (NOW - timedelta(days=1), uuid.uuid4()), 10) is None
+
+
+def test_write_during_load_discards_stale_result():
+    buffer = make_buffer()
+    buffer.begin_load(CHAT)
+    buffer.append(CHAT, message(5))
+    buffer.end_load(CHAT, [message(i) for i in range(3)], complete=True)
+    assert buffer.latest(CHAT, 1) is None
+
+
+def test_foreign_message_is_inserted():
+    buffer = make_buffer()
+    history = [message(i) for i in range(3)]
+    load(buffer, history, complete=True)
+    # Сообщение, уже добавленное своим процессом, не дублируется
+    buffer.observe(CHAT, history[2])
+    foreign = message(10)
+    buffer.observe(CHAT, foreign)
+    latest = buffer.latest(CHAT, 5)
+    assert [item["id"] for item in latest] == [foreign["id"], history[2]["id"], history[1]["id"], history[0]["id"]]
+
+
+def test_foreign_message_older_than_incomplete_buffer_invalidates():
+    buffer = make_buffer()
+    load(buffer, [message(i) for i in range(3)], complete=False)
+    buffer.observe(CHAT, message(1.5))
+    assert buffer.latest(CHAT, 1) is not None
+    buffer.observe(CHAT, message(-10))
+    assert buffer.latest(CHAT, 1) is None
+
+
+def test_mark_read_updates_flags():
+    buffer = make_buffer()
+    history = [message(i) for i in range(3)]
+    load(buffer, history, complete=True)
+    buffer.mark_read(CHAT, [history[0]["id"]])
+    latest = buffer.latest(CHAT, 3)
+    assert [item["is_read"] for item in latest] == [False, False, True]
+
+
+def test_expired_buffer_is_reloaded():
+    buffer = make_buffer(ttl=0)
+    load(buffer, [message(0)], complete=True)
+    assert buffer.latest(CHAT, 1) is None
+
+
+def test_least_recently_used_chat_is_evicted():
+    buffer = make_buffer(max_chats=1)
+    other = uuid.uuid4()
+    load(buffer, [message(0)], complete=True)
+    buffer.begin_load(other)
+    buffer.end_load(other, [message(0)], complete=True)
+    assert buffer.latest(CHAT, 1) is None
+    assert buffer.latest(other, 1) is not None
+    assert buffer.evictions == 1
+
+
+def test_disabled_buffer_never_answers():
+    buffer = make_buffer(enabled=False)
+    load(buffer, [message(0)], complete=True)
+    buffer.append(CHAT, message(1))
+    assert buffer.latest(CHAT, 1) is None
+    assert buffer.stats()["chats"] == 0
+
+
+def test_buffer_requires_cross_process_broker_with_several_workers(monkeypatch):
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "BROKER_BACKEND", "memory")
+    assert buffer_allowed()
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 4)
+    assert not buffer_allowed()
+    monkeypatch.setattr(settings, "BROKER_BACKEND", "postgres")
+    assert buffer_allowed()
@@ -0,0 +1,28 @@
+import json
+import uuid
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core import responses
+from app.core.responses import FastJSONResponse
+from app.schemas.chat import ChatType
+
+PAYLOAD = {
+    "id": uuid.uuid4(),
+    "type": ChatType.GROUP,
+    "timestamp": datetime(2026, 1, 1, 12, 0, 0, 123456),
+    "members": [{"id": uuid.uuid4(), "name": "Имя"}],
+    "last_message": None,
+}
+
+
+def test_matches_standard_encoding():
+    body = FastJSONResponse(PAYLOAD).body
+    assert json.loads(body) == jsonable_encoder(PAYLOAD)
+
+
+def test_falls_back_without_orjson(monkeypatch):
+    monkeypatch.setattr(responses, "orjson", None)
+    body = FastJSONResponse(PAYLOAD).body
+    assert json.loads(body) == jsonable_encoder(PAYLOAD)
@@ -0,0 +1,77 @@
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.pagination import decode_search_cursor, encode_cursor, encode_search_cursor
+from app.services.message_service import MessageService
+
+NOW = datetime(2026, 1, 1, 12, 0)
+USER = uuid.uuid4()
+CHAT = uuid.uuid4()
+
+
+def message(minutes: int):
+    sender = SimpleNamespace(id=USER, name="Alice", email="alice@example.com")
+    return SimpleNamespace(
+        id=uuid.uuid4(), chat_id=CHAT, sender_id=USER, sender=sender,
+        text="привет", timestamp=NOW + timedelta(minutes=minutes), is_read=False
+    )
+
+
+class FakeRepository:
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    async def search(self, user_id, query, chat_id, cursor, limit):
+        self.calls.append((user_id, query, chat_id, cursor, limit))
+        return self.results[:limit]
+
+
+def make_service(results) -> MessageService:
+    service = MessageService(None)
+    service.repository = FakeRepository(results)
+    return service
+
+
+def test_search_cursor_round_trip_keeps_exact_rank():
+    rank = 0.1 + 0.2
+    assert decode_search_cursor(encode_search_cursor(rank, NOW, CHAT)) == (rank, NOW, CHAT)
+    assert decode_search_cursor(None) is None
+
+
+def test_history_cursor_is_not_a_search_cursor():
+    with pytest.raises(ValueError):
+        decode_search_cursor(encode_cursor(NOW, CHAT))
+
+
+async def test_results_are_ranked_and_paged():
+    results = [(message(3), 0.9), (message(2), 0.5), (message(1), 0.1)]
+    service = make_service(results)
+    page = await service.search_messages(USER, "  привет ", chat_id=CHAT, limit=2)
+
+    # Запрашивается на одну строку больше страницы, чтобы узнать о следующей
+    assert service.repository.calls == [(USER, "привет", CHAT, None, 3)]
+    assert [item["rank"] for item in page["messages"]] == [0.9, 0.5]
+    assert page["total"] == 2
+    last, rank = results[1]
+    assert decode_search_cursor(page["next_cursor"]) == (rank, last.timestamp, last.id)
+
+    # Следующая страница продолжает с курсора последнего результата
+    await service.search_messages(USER, "привет", cursor=page["next_cursor"], limit=2)
+    assert service.repository.calls[-1][3] == (rank, last.timestamp, last.id)
+
+
+async def test_last_page_has_no_cursor():
+    page = await make_service([(message(1), 0.4)]).search_messages(USER, "привет", limit=2)
+    assert page["total"] == 1
+    assert page["next_cursor"] is None
+
+
+async def test_empty_query_and_bad_cursor_are_errors():
+    service = make_service([])
+    assert "error" in await service.search_messages(USER, "   ")
+    assert "error" in await service.search_messages(USER, "привет", cursor=encode_cursor(NOW, CHAT))
+    assert service.repository.calls == []
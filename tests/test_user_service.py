@@ -0,0 +1,56 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.security import get_password_hash, principal_cache
+from app.schemas.user import CurrentUser, PasswordChange, UserUpdate
+from app.services.user_service import UserService
+
+USER_ID = uuid.uuid4()
+OTHER_ID = uuid.uuid4()
+
+
+class FakeRepository:
+    def __init__(self):
+        self.user = SimpleNamespace(id=USER_ID, name="Alice", email="alice@example.com", password=get_password_hash("secret"))
+
+    async def get_by_id(self, user_id):
+        return self.user if user_id == USER_ID else None
+
+    async def get_by_email(self, email):
+        return self.user if email == self.user.email else None
+
+    async def update(self, user_id, **values):
+        for name, value in values.items():
+            setattr(self.user, name, value)
+        return self.user
+
+
+@pytest.fixture
+def service():
+    principal_cache.clear()
+    principal_cache.set("alice-token", CurrentUser(id=USER_ID, name="Alice", email="alice@example.com"))
+    principal_cache.set("other-token", CurrentUser(id=OTHER_ID, name="Bob", email="bob@example.com"))
+    service = UserService(None)
+    service.repository = FakeRepository()
+    yield service
+    principal_cache.clear()
+
+
+async def test_update_drops_cached_principal(service):
+    result = await service.update_user(USER_ID, UserUpdate(name="Alicia"))
+    assert result["name"] == "Alicia"
+    assert principal_cache.get("alice-token") is None
+    assert principal_cache.get("other-token") is not None
+
+
+async def test_password_change_drops_cached_principal(service):
+    result = await service.change_password(USER_ID, PasswordChange(current_password="wrong", new_password="new"))
+    assert "error" in result
+    assert principal_cache.get("alice-token") is not None
+
+    result = await service.change_password(USER_ID, PasswordChange(current_password="secret", new_password="new"))
+    assert "error" not in result
+    assert principal_cache.get("alice-token") is None
+    assert principal_cache.get("other-token") is not None
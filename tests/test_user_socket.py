@@ -0,0 +1,158 @@
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import websockets
+from app.api.websockets import ConnectionManager
+from app.core import security
+from app.db.repositories import ChatRepository
+from app.services.chat_service import ChatService
+from app.services.message_service import MessageService
+
+USER = SimpleNamespace(id=uuid.uuid4(), name="Alice", email="alice@example.com")
+CHAT = uuid.uuid4()
+OTHER_CHAT = uuid.uuid4()
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Эндпоинты /ws/* с базой, замененной заглушками сервисов"""
+    monkeypatch.setattr(websockets, "manager", ConnectionManager())
+    monkeypatch.setattr(websockets, "async_session", FakeSession)
+
+    async def get_user_from_token(token, db):
+        return USER if token == "valid" else None
+
+    async def get_user_chat_ids(self, user_id):
+        return [CHAT]
+
+    async def is_member(self, chat_id, user_id):
+        return chat_id in (CHAT, OTHER_CHAT)
+
+    async def create_message(self, sender_id, message_data, sender=None):
+        return {
+            "id": uuid.uuid4(),
+            "chat_id": message_data.chat_id,
+            "sender_id": sender_id,
+            "sender": {"id": sender.id, "name": sender.name, "email": sender.email},
+            "text": message_data.text,
+            "timestamp": datetime(2026, 1, 1, 12, 0),
+            "is_read": False,
+        }
+
+    async def mark_chat_as_read(self, chat_id, user_id, message_id=None):
+        return {"chat_id": chat_id, "user_id": user_id, "last_read_message_id": message_id}
+
+    monkeypatch.setattr(security, "get_user_from_token", get_user_from_token)
+    monkeypatch.setattr(ChatRepository, "get_user_chat_ids", get_user_chat_ids)
+    monkeypatch.setattr(ChatService, "is_member", is_member)
+    monkeypatch.setattr(MessageService, "create_message", create_message)
+    monkeypatch.setattr(MessageService, "mark_chat_as_read", mark_chat_as_read)
+
+    app = FastAPI()
+    app.include_router(websockets.router)
+    return TestClient(app)
+
+
+def connect(client, path: str = "/ws/user?token=valid"):
+    websocket = client.websocket_connect(path)
+    socket = websocket.__enter__()
+    assert socket.receive_json()["status"] == "connected"
+    return websocket, socket
+
+
+def receive_until_reply(socket, request_id: str):
+    """Кадры сокета до ответа с заданным request_id включительно"""
+    frames = []
+    while not frames or frames[-1].get("request_id") != request_id:
+        frames.append(socket.receive_json())
+    return frames
+
+
+def test_replies_go_to_the_requesting_socket(client):
+    first_context, first = connect(client)
+    second_context, second = connect(client)
+    try:
+        first.send_json({"type": "send", "chat_id": str(CHAT), "text": "from first", "request_id": "a"})
+        first_frames = receive_until_reply(first, "a")
+        # Второе устройство получает рассылку, но не ответ на чужой кадр
+        assert second.receive_json()["data"]["text"] == "from first"
+
+        second.send_json({"type": "send", "chat_id": str(CHAT), "text": "from second", "request_id": "b"})
+        second_frames = receive_until_reply(second, "b")
+        assert first.receive_json()["data"]["text"] == "from second"
+    finally:
+        second_context.__exit__(None, None, None)
+        first_context.__exit__(None, None, None)
+
+    assert [frame.get("type") for frame in first_frames] == ["message", "sent"]
+    assert [frame.get("type") for frame in second_frames] == ["message", "sent"]
+    assert {frame.get("request_id") for frame in first_frames} == {None, "a"}
+    assert {frame.get("request_id") for frame in second_frames} == {None, "b"}
+    assert websockets.manager.user_connections == {}
+
+
+def test_subscription_belongs_to_one_socket(client):
+    first_context, first = connect(client)
+    second_context, second = connect(client)
+    try:
+        first.send_json({"type": "subscribe", "chat_id": str(OTHER_CHAT), "request_id": "s"})
+        assert first.receive_json() == {"type": "subscribed", "chat_id": str(OTHER_CHAT), "request_id": "s"}
+
+        assert len(websockets.manager.chat_subscribers[OTHER_CHAT]) == 1
+        assert len(websockets.manager.chat_subscribers[CHAT]) == 2
+
+        first.send_json({"type": "unsubscribe", "chat_id": str(OTHER_CHAT), "request_id": "u"})
+        assert first.receive_json() == {"type": "unsubscribed", "chat_id": str(OTHER_CHAT), "request_id": "u"}
+        assert OTHER_CHAT not in websockets.manager.chat_subscribers
+    finally:
+        second_context.__exit__(None, None, None)
+        first_context.__exit__(None, None, None)
+
+
+def test_read_and_invalid_frames(client):
+    context, socket = connect(client)
+    message_id = str(uuid.uuid4())
+    try:
+        socket.send_json({"type": "read", "chat_id": str(CHAT), "message_id": message_id, "request_id": "r"})
+        assert socket.receive_json() == {
+            "type": "read", "chat_id": str(CHAT), "last_read_message_id": message_id, "request_id": "r"
+        }
+
+        socket.send_json({"type": "typing", "chat_id": str(CHAT), "request_id": "t"})
+        reply = socket.receive_json()
+        assert reply["request_id"] == "t"
+        assert "error" in reply
+
+        socket.send_json(["not", "an", "object"])
+        assert "error" in socket.receive_json()
+    finally:
+        context.__exit__(None, None, None)
+
+
+def test_chat_socket_replies_to_its_own_connection(client):
+    context, socket = connect(client, f"/ws/{CHAT}?token=valid")
+    other_context, other = connect(client, f"/ws/{CHAT}?token=valid")
+    try:
+        socket.send_json({"type": "read", "request_id": "r"})
+        assert socket.receive_json()["type"] == "read"
+
+        other.send_json({"text": "hello"})
+        # Оба устройства пользователя остаются подключены к чату и получают рассылку
+        assert other.receive_json()["data"]["text"] == "hello"
+        assert socket.receive_json()["data"]["text"] == "hello"
+    finally:
+        other_context.__exit__(None, None, None)
+        context.__exit__(None, None, None)
@@ -0,0 +1,77 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.encoding import (
+    CODECS, COMPACT_KEYS, EXPANDED_KEYS, JSON_PROTOCOL, MSGPACK_PROTOCOL, Frame, json_codec, negotiate
+)
+
+msgpack = pytest.importorskip("msgpack")
+
+MESSAGE_ID = uuid.uuid4()
+SENDER_ID = uuid.uuid4()
+TIMESTAMP = datetime(2026, 1, 1, 12, 0, 0, 123456)
+EVENT = {
+    "type": "message",
+    "data": {
+        "id": str(MESSAGE_ID),
+        "sender_id": str(SENDER_ID),
+        "sender_name": "Имя",
+        "text": "привет",
+        "timestamp": str(TIMESTAMP),
+        "is_read": False,
+        "cursor": "abc",
+    },
+}
+
+
+def test_compact_keys_are_unique():
+    assert len(set(COMPACT_KEYS.values())) == len(COMPACT_KEYS)
+    # Короткий ключ не должен совпадать с полным именем поля: иначе разворачивание неоднозначно
+    assert not set(EXPANDED_KEYS) & set(COMPACT_KEYS)
+
+
+def test_msgpack_frame_uses_short_keys_and_binary_values():
+    codec = CODECS[MSGPACK_PROTOCOL]
+    raw = msgpack.unpackb(codec.encode(EVENT))
+    data = raw["d"]
+    assert raw["t"] == "message"
+    assert data["i"] == MESSAGE_ID.bytes
+    assert data["s"] == SENDER_ID.bytes
+    assert data["ts"] == (TIMESTAMP - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+    assert data["n"] == "Имя"
+
+
+def test_msgpack_decode_expands_keys_and_uuids():
+    codec = CODECS[MSGPACK_PROTOCOL]
+    frame = msgpack.packb({"t": "read", "c": uuid.UUID(int=1).bytes, "mi": MESSAGE_ID.bytes, "q": 7})
+    assert codec.decode({"bytes": frame}) == {
+        "type": "read", "chat_id": str(uuid.UUID(int=1)), "message_id": str(MESSAGE_ID), "request_id": 7
+    }
+
+
+def test_msgpack_decode_rejects_text_and_garbage():
+    codec = CODECS[MSGPACK_PROTOCOL]
+    with pytest.raises(ValueError):
+        codec.decode({"text": "{}"})
+    with pytest.raises(ValueError):
+        codec.decode({"bytes": b"\xc1"})
+
+
+def test_json_codec_rejects_binary_frames():
+    with pytest.raises(ValueError):
+        json_codec.decode({"bytes": b"{}"})
+
+
+def test_negotiate_follows_client_preference():
+    assert negotiate([MSGPACK_PROTOCOL, JSON_PROTOCOL]) == (CODECS[MSGPACK_PROTOCOL], MSGPACK_PROTOCOL)
+    assert negotiate(["unknown", JSON_PROTOCOL]) == (json_codec, JSON_PROTOCOL)
+    assert negotiate([]) == (json_codec, None)
+
+
+def test_frame_keeps_one_encoding_per_codec():
+    frame = Frame(EVENT)
+    encoded = frame.encode(CODECS[MSGPACK_PROTOCOL])
+    assert frame.encode(CODECS[MSGPACK_PROTOCOL]) is encoded
+    assert frame.encode(json_codec) != encoded